@@ -2,9 +2,16 @@
 Celery configuration and tasks for Therapeutic Companion
 """
 import os
-from celery import Celery
+import sys
+import json
+import time
+import resource
+from functools import wraps
+from celery import Celery, group, current_task
+from celery.exceptions import Retry
+from celery.signals import worker_init, worker_process_init
 from datetime import datetime, timedelta
-import smtplib
+import smtp_delivery
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from celery.schedules import crontab
@@ -17,6 +24,14 @@ celery = Celery(
     backend=os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
 )
 
+# One queue per mail lane so urgent mail never waits behind a reminder backlog.
+# Workers consume all of them by default; see startup_celery.sh.
+MAIL_QUEUES = {
+    'critical': 'mail_critical',
+    'transactional': 'mail_transactional',
+    'bulk': 'mail_bulk',
+}
+
 # Celery configuration
 celery.conf.update(
     task_serializer='json',
@@ -28,14 +43,33 @@ celery.conf.update(
     task_reject_on_worker_lost=True,
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=50,
+    task_routes={
+        'celery_app.send_email_task': {'queue': MAIL_QUEUES['transactional']},
+        'celery_app.process_email_queue_task': {'queue': MAIL_QUEUES['bulk']},
+        'celery_app.process_email_queue_batch_task': {'queue': MAIL_QUEUES['bulk']},
+    },
     beat_schedule={
         'send-daily-reminders': {
             'task': 'celery_app.send_daily_reminders',
-            'schedule': crontab(minute=0), # Run every hour
+            'schedule': 60.0,  # Run every minute; only due reminders are read
+        },
+        'process-email-queue-critical': {
+            'task': 'celery_app.process_email_queue_task',
+            'schedule': 15.0,  # Run every 15 seconds
+            'args': ('critical',),
+            'options': {'queue': MAIL_QUEUES['critical']},
         },
-        'process-email-queue': {
+        'process-email-queue-transactional': {
+            'task': 'celery_app.process_email_queue_task',
+            'schedule': 30.0,  # Run every 30 seconds
+            'args': ('transactional',),
+            'options': {'queue': MAIL_QUEUES['transactional']},
+        },
+        'process-email-queue-bulk': {
             'task': 'celery_app.process_email_queue_task',
             'schedule': 60.0,  # Run every minute
+            'args': ('bulk',),
+            'options': {'queue': MAIL_QUEUES['bulk']},
         },
         'process-email-queue-batch': {
             'task': 'celery_app.process_email_queue_batch_task',
@@ -49,24 +83,152 @@ celery.conf.update(
             'task': 'celery_app.send_weekly_reports',
             'schedule': crontab(minute=0),  # Run every hour
         },
+        'reconcile-therapist-stats': {
+            'task': 'celery_app.reconcile_therapist_stats',
+            'schedule': crontab(minute='*/30'),  # Run every 30 minutes
+        },
+        'caseload-triage-scan': {
+            'task': 'celery_app.run_triage_scan_task',
+            'schedule': crontab(minute=15),  # Run every hour
+        },
+        'check-client-inactivity': {
+            'task': 'celery_app.check_client_inactivity',
+            'schedule': crontab(hour=7, minute=0),  # Run daily
+        },
+        'relay-outbox': {
+            'task': 'celery_app.relay_outbox_task',
+            'schedule': 5.0,  # Run every 5 seconds
+        },
+        'prune-outbox': {
+            'task': 'celery_app.prune_outbox_task',
+            'schedule': crontab(hour=1, minute=30),  # Run daily
+        },
     }
 )
 
 
+# ============= WORKER BOOTSTRAP =============
+# Tasks import their models and domain functions from new_backend. Each worker
+# child imports it once, when it starts, with APP_ROLE=worker so the web-only
+# setup (CSRF, Talisman, rate limiting, RabbitMQ/ClickHouse probes, database
+# initialisation) is skipped; the import inside each task is then a
+# sys.modules lookup.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+
+def bootstrap_worker():
+    """Import the backend in worker mode once per process and return its Flask app"""
+    os.environ['APP_ROLE'] = 'worker'
+    inherited = 'new_backend' in sys.modules
+    started = time.perf_counter()
+    import new_backend
+
+    if inherited:
+        # Loaded before fork: pooled connections belong to the parent, never reuse them
+        with new_backend.app.app_context():
+            new_backend.db.engine.dispose(close=False)
+    elapsed = time.perf_counter() - started
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"[CELERY] Worker {os.getpid()} ready in {elapsed * 1000:.0f} ms, max RSS {max_rss_mb:.0f} MB")
+    return new_backend.app
+
+
+@worker_init.connect
+def set_worker_role(**kwargs):
+    # Inherited by pool children; also covers the solo pool, which has no children
+    os.environ['APP_ROLE'] = 'worker'
+
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    bootstrap_worker()
+
+
+# ============= PERIODIC TASK GUARD =============
+
+def single_run(slot_seconds, lease_seconds=600):
+    """Run a Beat task at most once per schedule slot and never two at a time.
+
+    Wraps the task body (put it under @celery.task) with a lease on the task
+    name from periodic_task_lock, renewed every lease_seconds/3 while the body
+    runs. A firing that finds the lock held (an overrunning run, or a second
+    Beat) or its slot already run is skipped. Every firing is recorded in
+    periodic_task_runs with its outcome and duration.
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__name__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            from new_backend import app, db, PeriodicTaskRun, periodic_task_lock
+
+            task_id = current_task.request.id if current_task else None
+            worker = f"{current_task.request.hostname if current_task else ''}:{os.getpid()}"
+            lease, reason = periodic_task_lock.acquire(name, slot_seconds, lease_seconds)
+
+            def record(**fields):
+                try:
+                    with app.app_context():
+                        if run_id is None:
+                            run = PeriodicTaskRun(task_name=name, slot=slot, worker=worker, task_id=task_id,
+                                                  **fields)
+                            db.session.add(run)
+                        else:
+                            run = PeriodicTaskRun.query.get(run_id)
+                            for field, value in fields.items():
+                                setattr(run, field, value)
+                            if fields.get('status') != 'running':
+                                PeriodicTaskRun.query.filter(
+                                    PeriodicTaskRun.task_name == name,
+                                    PeriodicTaskRun.started_at < datetime.utcnow() - PeriodicTaskRun.RETENTION
+                                ).delete(synchronize_session=False)
+                        db.session.commit()
+                        return run.id
+                except Exception as e:
+                    # History is best effort; never let it stop or fail the task itself
+                    print(f"[CELERY] Could not record periodic run of {name}: {e}")
+                    return run_id
+
+            run_id = None
+            if lease is None:
+                slot = datetime.utcfromtimestamp(periodic_task_lock.slot_start(slot_seconds))
+                print(f"[CELERY] Skipping {name}: {'already running' if reason == 'held' else 'slot already run'}")
+                record(status='skipped', error_message=reason, finished_at=datetime.utcnow(), duration_ms=0)
+                return {'skipped': True, 'reason': reason}
+
+            slot = lease.slot
+            run_id = record(status='running')
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                lease.release()
+                record(status='failed', error_message=str(e)[:2000], lease_lost=lease.lost,
+                       finished_at=datetime.utcnow(), duration_ms=int((time.perf_counter() - started) * 1000))
+                raise
+            lease.release()
+            failed = isinstance(result, dict) and 'error' in result
+            record(status='failed' if failed else 'succeeded', lease_lost=lease.lost,
+                   result=json.loads(json.dumps(result if isinstance(result, dict) else {'value': result},
+                                                default=str)),
+                   error_message=str(result['error']) if failed else None,
+                   finished_at=datetime.utcnow(), duration_ms=int((time.perf_counter() - started) * 1000))
+            return result
+
+        return wrapper
+
+    return decorator
+
+
 @celery.task(bind=True, max_retries=3)
 def send_reminder_test(self, email, client_id=None):
     """Test task to send a reminder email"""
     try:
-        # Import Flask app and models at the top of the task
-        import sys
-        import os
-        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-
         from new_backend import app, db, User, Client, Reminder, generate_unsubscribe_token
 
         # Email configuration from environment
-        smtp_server = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
-        smtp_port = int(os.environ.get('SMTP_PORT', 587))
         smtp_username = os.environ.get('SYSTEM_EMAIL')
         smtp_password = os.environ.get('SYSTEM_EMAIL_PASSWORD')
 
@@ -224,11 +386,7 @@ def send_reminder_test(self, email, client_id=None):
             msg.attach(MIMEText(html_body, 'html'))
 
         # Send email
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(smtp_username, smtp_password)
-        server.send_message(msg)
-        server.quit()
+        smtp_delivery.send_message(msg)
 
         return {'success': True, 'message': f'Test email sent to {email} in language: {reminder_lang}'}
 
@@ -254,39 +412,72 @@ def generate_unsubscribe_token(user_id, email_type='all'):
 
 
 @celery.task
+@single_run(slot_seconds=60, lease_seconds=120)
 def send_daily_reminders():
-    """Send daily reminder emails to all clients with active reminders"""
-    import sys
-    import os
-    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    """Queue reminder emails for every daily check-in reminder that is due.
 
+    Runs every minute. Due reminders come off the idx_reminders_due index in
+    batches locked with SKIP LOCKED, so overlapping runs never double-send,
+    and each one is moved to its next fire time in the client's own zone.
+    """
     from new_backend import app, db, Client, Reminder, User, EmailQueue, generate_unsubscribe_token
+    from email_templates import DAILY_REMINDER
+    from reminder_schedule import fire_spec, next_fire_at, MAX_LATENESS
+    from sqlalchemy import insert, update, or_
+    from collections import Counter
+
+    batch_size = 500
 
     with app.app_context():
         try:
-            # Get current UTC time and hour
             utc_now = datetime.utcnow()
-            current_utc_hour = utc_now.hour
-
-            print(f"[CELERY] Running send_daily_reminders at {utc_now} UTC (hour: {current_utc_hour})")
-
-            # Find all active reminders for this UTC hour
-            reminders = db.session.query(Reminder).join(Client).filter(
-                Reminder.is_active == True,
-                Reminder.reminder_type == 'daily_checkin',
-                db.extract('hour', Reminder.reminder_time) == current_utc_hour
-            ).all()
-
-            print(f"[CELERY] Found {len(reminders)} reminders for UTC hour {current_utc_hour}")
+            base_url = os.environ.get('APP_BASE_URL', 'https://therapy-companion.onrender.com')
 
             queued_count = 0
+            scheduled_count = 0
+            late_count = 0
+            languages = Counter()
+
+            while True:
+                # Reminders without a fire time yet (saved before the scheduler) are only scheduled
+                due = db.session.query(
+                    Reminder.id, Reminder.next_fire_at, Reminder.timezone,
+                    Reminder.local_reminder_time, Reminder.reminder_time,
+                    Reminder.reminder_email, Reminder.reminder_language,
+                    Client.client_name, Client.client_serial, User.id, User.email
+                ).outerjoin(Client, Reminder.client_id == Client.id).outerjoin(
+                    User, Client.user_id == User.id
+                ).filter(
+                    Reminder.is_active == True,
+                    Reminder.reminder_type == 'daily_checkin',
+                    or_(Reminder.next_fire_at <= utc_now, Reminder.next_fire_at.is_(None))
+                ).order_by(Reminder.next_fire_at.nullsfirst()).limit(batch_size).with_for_update(
+                    of=Reminder, skip_locked=True
+                ).all()
+
+                if not due:
+                    break
+
+                queued = []
+                schedule = []
+
+                for (reminder_id, fire_at, zone_name, local_time, utc_time, reminder_email,
+                     reminder_language, client_name, client_serial, user_id, user_email) in due:
+                    upcoming = next_fire_at(*fire_spec(zone_name, local_time, utc_time), utc_now)
+                    schedule.append({'id': reminder_id, 'next_fire_at': upcoming})
+
+                    if fire_at is None:
+                        scheduled_count += 1
+                        continue
+                    if utc_now - fire_at > MAX_LATENESS:
+                        late_count += 1
+                        continue
 
-            for reminder in reminders:
-                try:
-                    client = reminder.client
-                    if client and client.user:
+                    try:
                         # Determine which email to use for sending
-                        email_to_use = reminder.reminder_email if reminder.reminder_email else client.user.email
+                        email_to_use = reminder_email if reminder_email else user_email
+                        if not email_to_use:
+                            continue
 
                         # Skip ONLY if the email we're actually sending to is a test email
                         if (email_to_use.endswith('example.com') or
@@ -295,188 +486,68 @@ def send_daily_reminders():
                             print(f"[CELERY] Skipping test email: {email_to_use}")
                             continue
 
-                        # Check if we've sent recently (to avoid duplicates)
-                        if reminder.last_sent:
-                            minutes_since = (utc_now - reminder.last_sent).total_seconds() / 60
-                            if minutes_since < 30:  # Don't send if sent in last 30 minutes
-                                print(f"[CELERY] Skipping {client.user.email} - sent {minutes_since:.1f} minutes ago")
-                                continue
-
-                        # Queue the email
-                        base_url = os.environ.get('APP_BASE_URL', 'https://therapy-companion.onrender.com')
-
-                        # Get reminder language
-                        reminder_lang = reminder.reminder_language if reminder.reminder_language else 'en'
-
-                        # Complete translation dictionary including HTML content
-                        translations = {
-                            'en': {
-                                'subject': "Daily Check-in Reminder - Therapeutic Companion",
-                                'greeting': "Hello",
-                                'reminder_text': "This is your daily reminder to complete your therapy check-in.",
-                                'progress_text': "Your therapist is tracking your progress, and your daily input is valuable for your treatment.",
-                                'login_text': "Click here to log in and complete today's check-in:",
-                                'button_text': "Complete Today's Check-in",
-                                'client_id': "Client ID",
-                                'already_completed': "If you've already completed today's check-in, please disregard this message.",
-                                'regards': "Best regards,\nYour Therapy Team",
-                                'title': "Daily Check-in Reminder",
-                                'unsubscribe_text': "To unsubscribe, click",  # ADD THIS
-                                'unsubscribe_here': "here"
-                            },
-                            'he': {
-                                'subject': "תזכורת יומית לצ'ק-אין - מלווה טיפולי",
-                                'greeting': "שלום",
-                                'reminder_text': "זוהי התזכורת היומית שלך להשלים את הצ'ק-אין הטיפולי שלך.",
-                                'progress_text': "המטפל שלך עוקב אחר ההתקדמות שלך, והקלט היומי שלך חשוב לטיפול שלך.",
-                                'login_text': "לחץ כאן כדי להתחבר ולהשלים את הצ'ק-אין של היום:",
-                                'button_text': "השלם את הצ'ק-אין של היום",
-                                'client_id': "מספר מטופל",
-                                'already_completed': "אם כבר השלמת את הצ'ק-אין של היום, אנא התעלם מהודעה זו.",
-                                'regards': "בברכה,\nצוות הטיפול שלך",
-                                'title': "תזכורת יומית לצ'ק-אין",
-                                'unsubscribe_text': "להפסקת הרישום, לחץ",  # ADD THIS
-                                'unsubscribe_here': "כאן"
-                            },
-                            'ru': {
-                                'subject': "Ежедневное напоминание об отметке - Терапевтический Компаньон",
-                                'greeting': "Здравствуйте",
-                                'reminder_text': "Это ваше ежедневное напоминание о необходимости заполнить терапевтическую отметку.",
-                                'progress_text': "Ваш терапевт отслеживает ваш прогресс, и ваши ежедневные данные важны для вашего лечения.",
-                                'login_text': "Нажмите здесь, чтобы войти и заполнить сегодняшнюю отметку:",
-                                'button_text': "Заполнить сегодняшнюю отметку",
-                                'client_id': "ID клиента",
-                                'already_completed': "Если вы уже заполнили сегодняшнюю отметку, пожалуйста, игнорируйте это сообщение.",
-                                'regards': "С наилучшими пожеланиями,\nВаша терапевтическая команда",
-                                'title': "Ежедневное напоминание об отметке",
-                                'unsubscribe_text': "Чтобы отписаться, нажмите",  # ADD THIS
-                                 'unsubscribe_here': "здесь"
-                            },
-                            'ar': {
-                                'subject': "تذكير يومي بتسجيل الحضور - الرفيق العلاجي",
-                                'greeting': "مرحباً",
-                                'reminder_text': "هذا تذكيرك اليومي لإكمال تسجيل الحضور العلاجي الخاص بك.",
-                                'progress_text': "معالجك يتتبع تقدمك، ومدخلاتك اليومية قيمة لعلاجك.",
-                                'login_text': "انقر هنا لتسجيل الدخول وإكمال تسجيل حضور اليوم:",
-                                'button_text': "أكمل تسجيل حضور اليوم",
-                                'client_id': "معرف العميل",
-                                'already_completed': "إذا كنت قد أكملت بالفعل تسجيل حضور اليوم، يرجى تجاهل هذه الرسالة.",
-                                'regards': "مع أطيب التحيات،\nفريق العلاج الخاص بك",
-                                'title': "تذكير يومي بتسجيل الحضور",
-                                'unsubscribe_text': "لإلغاء الاشتراك، انقر",  # ADD THIS
-                                'unsubscribe_here': "هنا"
-                            }
-                        }
-
-                        # Get the appropriate translation
-                        trans = translations.get(reminder_lang, translations['en'])
-
-                        # Create plain text body
-
-                        unsubscribe_token = generate_unsubscribe_token(client.user.id, 'reminders')
-                        unsubscribe_url = f"{base_url}/api/unsubscribe/{unsubscribe_token}"
-
-
-                        body = f"""{trans['greeting']},
-
-{trans['reminder_text']}
-
-{trans['progress_text']}
-
-{trans['login_text']}
-{base_url}/login.html
-
-{trans['client_id']}: {client.client_name if client.client_name else client.client_serial}
-
-{trans['unsubscribe_text']} {trans['unsubscribe_here']}: {unsubscribe_url}
-
-{trans['already_completed']}
-
-{trans['regards']}"""
-
-                        # Create PROPERLY TRANSLATED HTML body
-                        html_body = f"""
-<html>
-<head>
-    <meta charset="utf-8">
-</head>
-<body style="font-family: Arial, sans-serif; color: #333; direction: {'rtl' if reminder_lang in ['he', 'ar'] else 'ltr'};">
-    <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-        <h2 style="color: #2c3e50;">{trans['title']}</h2>
-        <p>{trans['greeting']},</p>
-        <p>{trans['reminder_text']}</p>
-        <p>{trans['progress_text']}</p>
-        <div style="text-align: center; margin: 40px 0;">
-            <a href="{base_url}/login.html"
-               style="background-color: #4CAF50; color: white; padding: 15px 40px;
-                      text-decoration: none; border-radius: 5px; display: inline-block;
-                      font-weight: bold; font-size: 16px;">
-                {trans['button_text']}
-            </a>
-        </div>
-        <p style="color: #666; font-size: 14px; text-align: center;">
-                    {trans['unsubscribe_text']} <a href="{unsubscribe_url}" style="color: #666;">{trans['unsubscribe_here']}</a>
-                </p>
-        <p style="color: #666; font-size: 14px;">{trans['client_id']}: {client.client_name if client.client_name else client.client_serial}</p>
-        <p style="color: #666; font-size: 14px;">
-            {trans['already_completed']}
-        </p>
-        <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;">
-        <p style="color: #999; font-size: 12px;">
-            {trans['regards'].replace(chr(10), '<br>')}
-        </p>
-    </div>
-</body>
-</html>
-"""
+                        # Tokens are bound to the user, so each recipient still gets their own
+                        unsubscribe_token = generate_unsubscribe_token(user_id, 'reminders')
+                        reminder_lang = reminder_language if reminder_language else 'en'
 
-                        # Create email queue entry
-                        email_queue = EmailQueue(
-                            to_email=email_to_use,
-                            subject=trans['subject'],
-                            body=body,
-                            html_body=html_body,
-                            status='pending'
+                        # The template is compiled once per language; this only fills the per-client slots
+                        subject, body, html_body = DAILY_REMINDER.render(
+                            reminder_lang, base_url,
+                            client_label=client_name if client_name else client_serial,
+                            unsubscribe_url=f"{base_url}/api/unsubscribe/{unsubscribe_token}"
                         )
-                        db.session.add(email_queue)
 
-                        # Update last_sent
-                        reminder.last_sent = utc_now
-                        queued_count += 1
-                        print(f"[CELERY] Queued reminder for {email_to_use} in language: {reminder_lang}")
+                        queued.append({
+                            'to_email': email_to_use,
+                            'subject': subject,
+                            'body': body,
+                            'html_body': html_body,
+                            'status': 'pending',
+                            'priority': 'bulk',
+                            'attempts': 0,
+                            'created_at': utc_now
+                        })
+                        schedule[-1]['last_sent'] = utc_now
+                        languages[reminder_lang] += 1
 
-                except Exception as e:
-                    print(f"[CELERY] Failed to queue reminder for client {reminder.client.client_serial}: {e}")
+                    except Exception as e:
+                        print(f"[CELERY] Failed to queue reminder for client {client_serial}: {e}")
 
-            db.session.commit()
+                # One multi-row insert for the queue; the schedule moves forward in the same transaction
+                if queued:
+                    db.session.execute(insert(EmailQueue), queued)
+                db.session.execute(update(Reminder), schedule)
+                db.session.commit()
+                queued_count += len(queued)
+
+                if len(due) < batch_size:
+                    break
 
             result_message = f'[CELERY] Queued {queued_count} daily reminders'
-            print(result_message)
+            if queued_count or scheduled_count or late_count:
+                print(f"{result_message} by language: {dict(languages)}, "
+                      f"scheduled {scheduled_count} new, skipped {late_count} late")
 
             # Trigger email processing
-            process_email_queue_task.delay()
+            if queued_count:
+                process_email_queue_task.apply_async(args=['bulk'], queue=MAIL_QUEUES['bulk'])
 
-            return {'message': result_message, 'queued': queued_count}
+            return {'message': result_message, 'queued': queued_count,
+                    'scheduled': scheduled_count, 'late': late_count}
 
         except Exception as e:
+            db.session.rollback()
             print(f"[CELERY] Error: {str(e)}")
             return {'error': str(e)}
 
 
 @celery.task
+@single_run(slot_seconds=3600)
 def send_weekly_reports():
-    """Send weekly reports to therapists"""
-    import sys
-    import os
-    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-
-    from new_backend import app, db, Therapist, Reminder, Client, create_weekly_report_pdf
-    from datetime import datetime, date, timedelta
-    import smtplib
-    from email.mime.text import MIMEText
-    from email.mime.multipart import MIMEMultipart
-    from email.mime.base import MIMEBase
-    from email import encoders
+    """Dispatch one weekly report subtask per therapist whose report is due this hour"""
+    from new_backend import app, db, Therapist, Reminder, WeeklyReportDelivery, weekly_report_window
+    from sqlalchemy import or_, and_
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
 
     with app.app_context():
         try:
@@ -491,140 +562,214 @@ def send_weekly_reports():
             print(f"[CELERY] Checking weekly reports for day {current_day_sunday_format} hour {current_hour}")
 
             # Find all active weekly report reminders for this day and hour
-            reminders = db.session.query(Reminder).join(Therapist, Reminder.client_id == Therapist.id).filter(
+            therapist_ids = [therapist_id for (therapist_id,) in db.session.query(Reminder.client_id).join(
+                Therapist, Reminder.client_id == Therapist.id
+            ).filter(
                 Reminder.is_active == True,
                 Reminder.reminder_type == 'weekly_report',
                 Reminder.day_of_week == current_day_sunday_format,
                 db.extract('hour', Reminder.reminder_time) == current_hour
-            ).all()
+            ).distinct()]
+
+            week_start = weekly_report_window(now.date())[0]
+
+            # The unique (therapist, week) key means a second run this hour dispatches nothing new
+            dispatch = []
+            if therapist_ids:
+                dispatch = [delivery_id for (delivery_id,) in db.session.execute(
+                    pg_insert(WeeklyReportDelivery).values([
+                        {'therapist_id': therapist_id, 'week_start': week_start, 'status': 'pending',
+                         'clients_total': 0, 'clients_rendered': 0, 'attempts': 0, 'created_at': now}
+                        for therapist_id in therapist_ids
+                    ]).on_conflict_do_nothing(
+                        index_elements=['therapist_id', 'week_start']
+                    ).returning(WeeklyReportDelivery.id)
+                )]
+
+            # Deliveries whose subtask was lost (broker restart, worker killed mid-render) go out again
+            stale = now - WeeklyReportDelivery.STALE_AFTER
+            dispatch += [delivery_id for (delivery_id,) in db.session.query(WeeklyReportDelivery.id).filter(
+                WeeklyReportDelivery.week_start == week_start,
+                or_(
+                    and_(WeeklyReportDelivery.status == 'pending', WeeklyReportDelivery.created_at < stale),
+                    and_(WeeklyReportDelivery.status == 'rendering', WeeklyReportDelivery.started_at < stale)
+                )
+            )]
+            db.session.commit()
 
-            print(f"[CELERY] Found {len(reminders)} weekly reports to send")
+            # Each therapist renders on whichever worker is free, so a large caseload only delays itself
+            for delivery_id in dispatch:
+                send_weekly_report_task.delay(delivery_id)
 
-            sent_count = 0
+            print(f"[CELERY] Dispatched {len(dispatch)} weekly reports for {len(therapist_ids)} due therapists")
+            return {'message': f'Dispatched {len(dispatch)} weekly reports', 'due': len(therapist_ids),
+                    'dispatched': len(dispatch)}
 
-            for reminder in reminders:
-                try:
-                    # Get therapist
-                    therapist = Therapist.query.get(reminder.client_id)
-                    if not therapist or not therapist.user:
-                        continue
+        except Exception as e:
+            db.session.rollback()
+            print(f"[CELERY] Error in send_weekly_reports: {str(e)}")
+            return {'error': str(e)}
 
-                    # Get ALL active clients for this therapist
-                    active_clients = therapist.clients.filter_by(is_active=True).all()
-                    if not active_clients:
-                        print(f"[CELERY] No active clients for therapist {therapist.id}")
-                        continue
 
-                    # Calculate week dates
-                    # Get previous 7 days
-                    today = date.today()
-                    week_end = today - timedelta(days=1)  # Yesterday
-                    week_start = week_end - timedelta(days=6)  # 7 days before yesterday
-
-                    # For the week number, use the week of the middle day of the period
-                    middle_day = week_start + timedelta(days=3)
-                    year = middle_day.year
-                    week_num = middle_day.isocalendar()[1]
-
-                    # Determine email
-                    email_to_use = reminder.reminder_email if reminder.reminder_email else therapist.user.email
-
-                    # Create email
-                    msg = MIMEMultipart()
-                    msg['From'] = os.environ.get('SYSTEM_EMAIL')
-                    msg['To'] = email_to_use
-
-                    # Translated subjects
-                    subjects = {
-                        'en': f"Weekly Therapy Report - Past 7 Days ({week_start.strftime('%b %d')} - {week_end.strftime('%b %d, %Y')})",
-                        'he': f"דוח טיפולי - 7 הימים האחרונים ({week_start.strftime('%d/%m')} - {week_end.strftime('%d/%m/%Y')})",
-                        'ru': f"Терапевтический отчет - Последние 7 дней ({week_start.strftime('%d.%m')} - {week_end.strftime('%d.%m.%Y')})",
-                        'ar': f"التقرير العلاجي - آخر 7 أيام ({week_start.strftime('%d/%m')} - {week_end.strftime('%d/%m/%Y')})"
-                    }
-                    lang = reminder.reminder_language or 'en'
-                    msg['Subject'] = subjects.get(lang, subjects['en'])
-
-                    # Translated body
-                    bodies = {
-                        'en': "Weekly checkin time. Reminder to see how your clients are doing.",
-                        'he': "זמן סיכום שבועי. תזכורת לבדוק איך מסתדרים המטופלים שלך.",
-                        'ru': "Время еженедельной проверки. Напоминание проверить, как дела у ваших клиентов.",
-                        'ar': "وقت الفحص الأسبوعي. تذكير لمعرفة كيف حال عملائك."
-                    }
-                    body = bodies.get(lang, bodies['en'])
-                    msg.attach(MIMEText(body, 'plain', 'utf-8'))
-
-                    # Attach PDF for EACH client
-                    attachment_count = 0
-                    for client in active_clients:
-                        try:
-                            # Generate PDF for this client
-                            pdf_buffer = create_weekly_report_pdf(
-                                client, therapist, week_start, week_end, week_num, year, lang
-                            )
-
-                            # Attach PDF
-                            pdf_attachment = MIMEBase('application', 'pdf')
-                            pdf_attachment.set_payload(pdf_buffer.read())
-                            encoders.encode_base64(pdf_attachment)
-                            # Sanitize client name for filename (remove spaces and special characters)
-                            safe_name = client.client_name.replace(' ', '_').replace('/', '_').replace('\\',
-                                                                                                       '_') if client.client_name else client.client_serial
-                            pdf_attachment.add_header(
-                                'Content-Disposition',
-                                f'attachment; filename=report_{safe_name}_{week_start.strftime("%Y%m%d")}_{week_end.strftime("%Y%m%d")}.pdf'
-                            )
-                            msg.attach(pdf_attachment)
-                            attachment_count += 1
-
-                        except Exception as e:
-                            print(f"[CELERY] Failed to generate PDF for client {client.client_serial}: {e}")
-
-                    if attachment_count == 0:
-                        print(f"[CELERY] No PDFs generated for therapist {therapist.id}, skipping email")
-                        continue
+@celery.task(bind=True, max_retries=3)
+def send_weekly_report_task(self, delivery_id):
+    """Render and send one therapist's weekly report; running it twice sends at most once"""
+    from new_backend import (app, db, Therapist, Reminder, WeeklyReportDelivery, create_weekly_report_pdf,
+                             weekly_report_window, mail_rate_limiter)
+    from sqlalchemy import update, or_, and_
+    from email.mime.base import MIMEBase
+    from email import encoders
+
+    def settle(status, **values):
+        db.session.execute(
+            update(WeeklyReportDelivery).where(WeeklyReportDelivery.id == delivery_id).values(status=status, **values),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
 
-                    # Send email
-                    smtp_server = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
-                    smtp_port = int(os.environ.get('SMTP_PORT', 587))
-                    smtp_username = os.environ.get('SYSTEM_EMAIL')
-                    smtp_password = os.environ.get('SYSTEM_EMAIL_PASSWORD')
+    with app.app_context():
+        now = datetime.utcnow()
+        stale = now - WeeklyReportDelivery.STALE_AFTER
+
+        # Claim the delivery; a duplicate or late subtask finds it sent or in progress and stops here
+        claimed = db.session.execute(
+            update(WeeklyReportDelivery).where(
+                WeeklyReportDelivery.id == delivery_id,
+                or_(
+                    WeeklyReportDelivery.status.in_(('pending', 'failed')),
+                    and_(WeeklyReportDelivery.status == 'rendering', WeeklyReportDelivery.started_at < stale)
+                )
+            ).values(
+                status='rendering', started_at=now, attempts=WeeklyReportDelivery.attempts + 1,
+                task_id=self.request.id, error_message=None, clients_rendered=0
+            ).returning(WeeklyReportDelivery.therapist_id, WeeklyReportDelivery.week_start),
+            execution_options={'synchronize_session': False}
+        ).first()
+        db.session.commit()
+        if claimed is None:
+            return {'success': True, 'message': f'Weekly report {delivery_id} already sent or in progress'}
+
+        therapist_id, week_start = claimed
 
-                    server = smtplib.SMTP(smtp_server, smtp_port)
-                    server.starttls()
-                    server.login(smtp_username, smtp_password)
-                    server.send_message(msg)
-                    server.quit()
+        try:
+            therapist = Therapist.query.get(therapist_id)
+            if not therapist or not therapist.user:
+                settle('skipped', finished_at=now, error_message='Therapist not found')
+                return {'skipped': True}
 
-                    # Update last sent
-                    reminder.last_sent = now
-                    sent_count += 1
-                    print(f"[CELERY] Sent weekly report to {email_to_use} with {attachment_count} PDFs")
+            reminder = Reminder.query.filter_by(client_id=therapist.id, reminder_type='weekly_report').first()
+
+            # Get ALL active clients for this therapist
+            active_clients = therapist.clients.filter_by(is_active=True).all()
+            if not active_clients:
+                print(f"[CELERY] No active clients for therapist {therapist.id}")
+                settle('skipped', finished_at=now, error_message='No active clients')
+                return {'skipped': True}
+
+            # The window is fixed by the delivery row, so a retry after midnight reports the same week
+            week_start, week_end, week_num, year = weekly_report_window(week_start + timedelta(days=7))
+
+            granted, wait = mail_rate_limiter.acquire('transactional', 1)
+            if not granted:
+                settle('pending', attempts=WeeklyReportDelivery.attempts - 1)
+                raise self.retry(countdown=max(1, wait))
+
+            # Determine email
+            email_to_use = reminder.reminder_email if reminder and reminder.reminder_email else therapist.user.email
+            lang = reminder.reminder_language if reminder and reminder.reminder_language else 'en'
+
+            # Create email
+            msg = MIMEMultipart()
+            msg['From'] = os.environ.get('SYSTEM_EMAIL')
+            msg['To'] = email_to_use
+
+            # Translated subjects
+            subjects = {
+                'en': f"Weekly Therapy Report - Past 7 Days ({week_start.strftime('%b %d')} - {week_end.strftime('%b %d, %Y')})",
+                'he': f"דוח טיפולי - 7 הימים האחרונים ({week_start.strftime('%d/%m')} - {week_end.strftime('%d/%m/%Y')})",
+                'ru': f"Терапевтический отчет - Последние 7 дней ({week_start.strftime('%d.%m')} - {week_end.strftime('%d.%m.%Y')})",
+                'ar': f"التقرير العلاجي - آخر 7 أيام ({week_start.strftime('%d/%m')} - {week_end.strftime('%d/%m/%Y')})"
+            }
+            msg['Subject'] = subjects.get(lang, subjects['en'])
+
+            # Translated body
+            bodies = {
+                'en': "Weekly checkin time. Reminder to see how your clients are doing.",
+                'he': "זמן סיכום שבועי. תזכורת לבדוק איך מסתדרים המטופלים שלך.",
+                'ru': "Время еженедельной проверки. Напоминание проверить, как дела у ваших клиентов.",
+                'ar': "وقت الفحص الأسبوعي. تذكير لمعرفة كيف حال عملائك."
+            }
+            msg.attach(MIMEText(bodies.get(lang, bodies['en']), 'plain', 'utf-8'))
+
+            settle('rendering', clients_total=len(active_clients))
+
+            # Attach PDF for EACH client
+            attachment_count = 0
+            for client in active_clients:
+                try:
+                    # Generate PDF for this client
+                    pdf_buffer = create_weekly_report_pdf(
+                        client, therapist, week_start, week_end, week_num, year, lang
+                    )
+
+                    # Attach PDF
+                    pdf_attachment = MIMEBase('application', 'pdf')
+                    pdf_attachment.set_payload(pdf_buffer.read())
+                    pdf_buffer.close()
+                    encoders.encode_base64(pdf_attachment)
+                    # Sanitize client name for filename (remove spaces and special characters)
+                    safe_name = client.client_name.replace(' ', '_').replace('/', '_').replace('\\',
+                                                                                               '_') if client.client_name else client.client_serial
+                    pdf_attachment.add_header(
+                        'Content-Disposition',
+                        f'attachment; filename=report_{safe_name}_{week_start.strftime("%Y%m%d")}_{week_end.strftime("%Y%m%d")}.pdf'
+                    )
+                    msg.attach(pdf_attachment)
+                    attachment_count += 1
 
                 except Exception as e:
-                    print(f"[CELERY] Failed to send weekly report to therapist {therapist.id}: {e}")
+                    print(f"[CELERY] Failed to generate PDF for client {client.client_serial}: {e}")
 
-            db.session.commit()
+                settle('rendering', clients_rendered=WeeklyReportDelivery.clients_rendered + 1)
+
+            if attachment_count == 0:
+                print(f"[CELERY] No PDFs generated for therapist {therapist.id}, skipping email")
+                settle('failed', finished_at=datetime.utcnow(), error_message='No PDFs could be generated')
+                return {'error': 'No PDFs generated'}
 
-            return {'message': f'Sent {sent_count} weekly reports'}
+            smtp_delivery.send_message(msg)
+
+            finished = datetime.utcnow()
+            if reminder:
+                reminder.last_sent = finished
+            settle('sent', finished_at=finished)
+            print(f"[CELERY] Sent weekly report to {email_to_use} with {attachment_count} PDFs")
+            return {'success': True, 'therapist_id': therapist_id, 'attachments': attachment_count}
+
+        except Retry:
+            raise
 
         except Exception as e:
-            print(f"[CELERY] Error in send_weekly_reports: {str(e)}")
+            db.session.rollback()
+            print(f"[CELERY] Failed to send weekly report to therapist {therapist_id}: {e}")
+            settle('failed', error_message=str(e)[:1000], finished_at=datetime.utcnow())
+            if self.request.retries < self.max_retries:
+                raise self.retry(exc=e, countdown=120 * (2 ** self.request.retries))
             return {'error': str(e)}
 
 
 @celery.task(bind=True, max_retries=3)
 def send_weekly_report_batch_task(self, therapist_id, batch_size=10):
     """Send weekly report in batches for therapists with many clients"""
+    from new_backend import app, Therapist, Reminder, create_weekly_report_pdf
+
     try:
         with app.app_context():
-            from models import Therapist, Reminder, Client
             from datetime import datetime, date, timedelta
             from email.mime.multipart import MIMEMultipart
             from email.mime.text import MIMEText
             from email.mime.base import MIMEBase
             from email import encoders
-            import smtplib
             import time
 
             therapist = Therapist.query.get(therapist_id)
@@ -691,7 +836,6 @@ def send_weekly_report_batch_task(self, therapist_id, batch_size=10):
 
                 # Generate PDFs for this batch
                 attachment_count = 0
-                from new_backend import create_weekly_report_pdf
 
                 for client in batch:
                     try:
@@ -718,12 +862,8 @@ def send_weekly_report_batch_task(self, therapist_id, batch_size=10):
                         app.logger.error(f"Failed to generate PDF for client {client.client_serial}: {e}")
 
                 if attachment_count > 0:
-                    # Send this batch
-                    server = smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT'])
-                    server.starttls()
-                    server.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
-                    server.send_message(msg)
-                    server.quit()
+                    # Send this batch over the same pooled session as the previous parts
+                    smtp_delivery.send_message(msg)
                     total_sent += attachment_count
 
                     # Delay between batches to avoid overwhelming email server
@@ -741,196 +881,185 @@ def send_weekly_report_batch_task(self, therapist_id, batch_size=10):
 
 
 @celery.task(bind=True, max_retries=3)
-def send_email_task(self, email_queue_id):
-    """Send a single email and update its status in the database"""
-    import sys
-    import os
-    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-    from new_backend import app, db, EmailQueue
+def send_email_task(self, email_queue_id, priority='transactional'):
+    """Send a single queued email now instead of waiting for the next queue drain"""
+    from new_backend import app, EmailQueueConsumer, mail_rate_limiter, email_circuit_breaker
 
     with app.app_context():
-        try:
-            # Get the email from the queue
-            email = EmailQueue.query.get(email_queue_id)
-            if not email:
-                return {'error': f'Email with ID {email_queue_id} not found'}
-
-            # Skip if already sent
-            if email.status == 'sent':
-                return {'success': True, 'message': 'Email already sent'}
-
-            smtp_server = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
-            smtp_port = int(os.environ.get('SMTP_PORT', 587))
-            smtp_username = os.environ.get('SYSTEM_EMAIL')
-            smtp_password = os.environ.get('SYSTEM_EMAIL_PASSWORD')
-
-            if not smtp_username or not smtp_password:
-                email.status = 'failed'
-                email.error_message = 'Email configuration missing'
-                db.session.commit()
-                return {'error': 'Email configuration missing'}
-
-            # Create the email message
-            msg = MIMEMultipart('alternative')
-            msg['From'] = smtp_username
-            msg['To'] = email.to_email
-            msg['Subject'] = email.subject
-
-            # Add both plain text and HTML parts with UTF-8 encoding
-            msg.attach(MIMEText(email.body, 'plain', 'utf-8'))
-            if email.html_body:
-                msg.attach(MIMEText(email.html_body, 'html', 'utf-8'))
-
-            # Send the email
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.starttls()
-            server.login(smtp_username, smtp_password)
-            server.send_message(msg)
-            server.quit()
-
-            # CRITICAL: Mark as sent and update timestamp
-            email.status = 'sent'
-            email.sent_at = datetime.utcnow()
-            email.attempts = (email.attempts or 0) + 1
-            db.session.commit()
-
-            print(f"[CELERY] Successfully sent email to {email.to_email}")
-            return {'success': True, 'email': email.to_email}
-
-
-        except Exception as e:
+        if not os.environ.get('SYSTEM_EMAIL') or not os.environ.get('SYSTEM_EMAIL_PASSWORD'):
+            return {'error': 'Email configuration missing'}
 
-            # Update status on failure
+        # Bulk mail paused after a provider 4xx stays queued for the bulk drain
+        if mail_rate_limiter.paused_for(priority):
+            return {'deferred': True, 'message': 'Bulk lane is backing off'}
 
-            try:
+        # While the breaker is open the row stays pending for the lane drain
+        permit = email_circuit_breaker.can_attempt_call()
+        if not permit:
+            return {'deferred': True, 'message': 'Email circuit breaker is open'}
 
-                with app.app_context():
+        granted, wait = mail_rate_limiter.acquire(priority, 1)
+        if not granted:
+            if self.request.retries >= self.max_retries:
+                return {'deferred': True, 'message': 'Rate limited, left for the lane drain'}
+            raise self.retry(countdown=max(1, wait))
 
-                    email = EmailQueue.query.get(email_queue_id)
+        # Claiming first means a concurrent queue drain can never send the same row
+        consumer = EmailQueueConsumer(lane=priority)
+        row = consumer.claim_one(email_queue_id)
+        if row is None:
+            mail_rate_limiter.refund(1)
+            return {'success': True, 'message': 'Email already sent or claimed by another worker'}
 
-                    if email:
+        sent, failed = consumer.deliver([row], permit)
+        if failed:
+            print(f"[CELERY] Failed to send email {email_queue_id}")
+            # The row is back to pending (or failed for good); retry sooner than the next drain
+            if row.attempts < EmailQueueConsumer.MAX_ATTEMPTS:
+                raise self.retry(countdown=60 * (2 ** self.request.retries))
+            return {'error': f'Email {email_queue_id} failed after {row.attempts} attempts'}
 
-                        # If max retries reached, mark as failed
+        print(f"[CELERY] Successfully sent email to {row.to_email}")
+        return {'success': True, 'email': row.to_email}
 
-                        if self.request.retries >= self.max_retries - 1:
 
-                            email.status = 'failed'
+@celery.task
+def process_email_queue_task(lane=None):
+    """Drain pending emails of one lane (or any lane) in leased, rate-limited batches"""
+    from new_backend import app, EmailQueueConsumer
 
-                            email.error_message = str(e)
+    with app.app_context():
+        try:
+            # Rows held by a crashed worker come back on their own once the lease expires
+            totals = EmailQueueConsumer(lane=lane).drain(batch_size=50)
+            if totals['claimed'] or totals['retry_in']:
+                print(f"[CELERY] Email queue drain ({lane or 'any'}): {totals}")
+            return {'processed': totals['claimed'], 'sent': totals['sent'], 'failed': totals['failed'],
+                    'retry_in': totals['retry_in']}
 
-                        else:
+        except Exception as e:
+            return {'error': str(e)}
 
-                            # Otherwise, reset to pending for retry
 
-                            email.status = 'pending'
+@celery.task
+@single_run(slot_seconds=86400)
+def cleanup_old_emails():
+    """Clean up old sent emails from the queue"""
+    from new_backend import app, db, EmailQueue
 
-                            email.error_message = f"Retry {self.request.retries + 1}: {str(e)}"
+    with app.app_context():
+        try:
+            # Delete emails older than 7 days
+            old_date = datetime.utcnow() - timedelta(days=7)
+            deleted = EmailQueue.query.filter(
+                EmailQueue.status == 'sent',
+                EmailQueue.sent_at < old_date
+            ).delete()
 
-                        email.attempts = (email.attempts or 0) + 1
+            db.session.commit()
 
-                        email.last_attempt_at = datetime.utcnow()
+            return {'deleted': deleted}
 
-                        db.session.commit()
+        except Exception as e:
+            return {'error': str(e)}
 
-            except:
 
-                pass
+@celery.task
+@single_run(slot_seconds=1800)
+def reconcile_therapist_stats():
+    """Recount cached therapist dashboard statistics and repair any drift"""
+    from new_backend import app, therapist_stats
 
-            print(f"[CELERY] Failed to send email {email_queue_id}: {str(e)}")
+    with app.app_context():
+        try:
+            checked = 0
+            drifted = {}
+            for therapist_id in therapist_stats.cached_therapist_ids():
+                diff = therapist_stats.reconcile(therapist_id)
+                checked += 1
+                if diff:
+                    drifted[therapist_id] = diff
+                    print(f"[CELERY] Therapist {therapist_id} stats drifted: {diff}")
 
-            # Retry with exponential backoff
+            return {'checked': checked, 'drifted': len(drifted)}
 
-            raise self.retry(exc=e, countdown=60 * (2 ** self.request.retries))
+        except Exception as e:
+            print(f"[CELERY] Error reconciling therapist stats: {e}")
+            return {'error': str(e)}
 
 
 @celery.task
-def process_email_queue_task():
-    """Process pending emails from the queue"""
-    import sys
-    import os
-    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-
-    from new_backend import app, db, EmailQueue
-    from datetime import datetime, timedelta
+def refresh_client_insights_task(client_id):
+    """Recompute a client's stored insights after new check-ins (debounced by the caller)"""
+    from new_backend import (app, db, redis_client, ClientInsight, refresh_client_insights,
+                             INSIGHT_DEFAULT_DAYS)
 
     with app.app_context():
         try:
-            # FIRST: Reset any stuck 'processing' emails older than 10 minutes
-            ten_minutes_ago = datetime.utcnow() - timedelta(minutes=10)
-            stuck_emails = EmailQueue.query.filter(
-                EmailQueue.status == 'processing',
-                EmailQueue.last_attempt_at < ten_minutes_ago
-            ).all()
-
-            for email in stuck_emails:
-                email.status = 'pending'
-                email.attempts = (email.attempts or 0) + 1
-                print(f"[CELERY] Reset stuck email {email.id} to pending")
-
-            if stuck_emails:
-                db.session.commit()
-                print(f"[CELERY] Reset {len(stuck_emails)} stuck emails")
+            # Clear the debounce marker first so check-ins arriving mid-refresh queue another run
+            redis_client.delete(f"insights_refresh:{client_id}")
 
-            # Get pending emails
-            pending_emails = EmailQueue.query.filter_by(
-                status='pending'
-            ).filter(
-                EmailQueue.attempts < 3
-            ).order_by(
-                EmailQueue.created_at.asc()
-            ).limit(50).all()  # Process up to 50 at a time
+            windows = [row[0] for row in db.session.query(ClientInsight.window_days).filter_by(
+                client_id=client_id).distinct()] or [INSIGHT_DEFAULT_DAYS]
+            active = {days: refresh_client_insights([client_id], days) for days in windows}
+            db.session.commit()
 
-            for email in pending_emails:
-                # Send each email as a separate Celery task
-                send_email_task.delay(email.id)
+            print(f"[CELERY] Refreshed insights for client {client_id}: {active}")
+            return {'client_id': client_id, 'active': active}
 
-                # Mark as processing with timestamp
-                email.status = 'processing'
-                email.attempts = (email.attempts or 0) + 1
-                email.last_attempt_at = datetime.utcnow()
+        except Exception as e:
+            db.session.rollback()
+            print(f"[CELERY] Error refreshing insights for client {client_id}: {e}")
+            return {'error': str(e)}
+
+
+@celery.task
+def triage_therapists_task(therapist_ids):
+    """Rank the active clients of a chunk of therapists"""
+    from new_backend import app, db, run_triage_scan
 
+    with app.app_context():
+        try:
+            started = time.perf_counter()
+            ranked = run_triage_scan(therapist_ids)
             db.session.commit()
+            elapsed = time.perf_counter() - started
 
-            return {'processed': len(pending_emails),
-                    'reset_stuck': len(stuck_emails) if 'stuck_emails' in locals() else 0}
+            print(f"[CELERY] Triage ranked {ranked} clients for {len(therapist_ids)} therapists "
+                  f"in {elapsed:.2f}s")
+            return {'therapists': len(therapist_ids), 'clients': ranked, 'seconds': round(elapsed, 3)}
 
         except Exception as e:
+            db.session.rollback()
+            print(f"[CELERY] Error triaging therapists {therapist_ids}: {e}")
             return {'error': str(e)}
 
 
 @celery.task
-def cleanup_old_emails():
-    """Clean up old sent emails from the queue"""
-    import sys
-    import os
-    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-
-    from new_backend import app, db, EmailQueue
+@single_run(slot_seconds=3600)
+def run_triage_scan_task():
+    """Fan the caseload triage scan out across therapists as a Celery group"""
+    from new_backend import app, triage_therapist_ids, TRIAGE_THERAPISTS_PER_TASK
 
     with app.app_context():
         try:
-            # Delete emails older than 7 days
-            old_date = datetime.utcnow() - timedelta(days=7)
-            deleted = EmailQueue.query.filter(
-                EmailQueue.status == 'sent',
-                EmailQueue.sent_at < old_date
-            ).delete()
+            therapist_ids = triage_therapist_ids()
+            chunks = [therapist_ids[i:i + TRIAGE_THERAPISTS_PER_TASK]
+                      for i in range(0, len(therapist_ids), TRIAGE_THERAPISTS_PER_TASK)]
+            if chunks:
+                group(triage_therapists_task.s(chunk) for chunk in chunks).apply_async()
 
-            db.session.commit()
-
-            return {'deleted': deleted}
+            print(f"[CELERY] Triage scan queued for {len(therapist_ids)} therapists in {len(chunks)} tasks")
+            return {'therapists': len(therapist_ids), 'tasks': len(chunks)}
 
         except Exception as e:
+            print(f"[CELERY] Error queueing triage scan: {e}")
             return {'error': str(e)}
 
 
 @celery.task
 def process_email_queue_batch_task():
     """Process email queue in batches for better performance"""
-    import sys
-    import os
-    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-
     from new_backend import process_email_queue_batch
 
     try:
@@ -940,19 +1069,70 @@ def process_email_queue_batch_task():
         return {'error': str(e)}
 
 
+@celery.task
+def relay_outbox_task():
+    """Deliver committed outbox events (check-in side effects) to their consumers"""
+    from new_backend import app, outbox_relay
+
+    with app.app_context():
+        try:
+            delivered = outbox_relay.relay()
+            if any(delivered.values()):
+                print(f"[CELERY] Outbox relay delivered {delivered}")
+            return {'success': True, 'delivered': delivered}
+        except Exception as e:
+            print(f"[CELERY] Outbox relay failed: {e}")
+            return {'error': str(e)}
 
 
 @celery.task
-def check_client_inactivity():
-    """Check for inactive clients and notify therapists"""
-    import sys
-    import os
-    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+@single_run(slot_seconds=86400)
+def prune_outbox_task():
+    """Delete outbox events every consumer has processed"""
+    from new_backend import app, outbox_relay
+
+    with app.app_context():
+        try:
+            deleted = outbox_relay.prune()
+            print(f"[CELERY] Pruned {deleted} outbox events")
+            return {'success': True, 'deleted': deleted}
+        except Exception as e:
+            return {'error': str(e)}
 
+
+@celery.task
+@single_run(slot_seconds=86400)
+def check_client_inactivity():
+    """Send each therapist a digest of clients who stopped checking in"""
     from new_backend import check_client_inactivity as check_inactivity_func
 
     try:
         count = check_inactivity_func()
+        print(f"[CELERY] Sent {count} inactivity digests")
         return {'success': True, 'notifications_sent': count}
     except Exception as e:
-        return {'error': str(e)}
\ No newline at end of file
+        return {'error': str(e)}
+
+
+# ============= BOOTSTRAP BENCHMARK =============
+
+def run_bootstrap_benchmark(runs=3):
+    """Cold import time and peak RSS of new_backend as the web app and as a worker child"""
+    import subprocess
+
+    probe = ("import time, resource; started = time.perf_counter(); import new_backend; "
+             "print(time.perf_counter() - started, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)")
+    for role in ('web', 'worker'):
+        env = dict(os.environ, APP_ROLE=role)
+        samples = []
+        for _ in range(runs):
+            result = subprocess.run([sys.executable, '-c', probe], cwd=BASE_DIR, env=env,
+                                    capture_output=True, text=True, check=True)
+            elapsed, max_rss = result.stdout.split()[-2:]
+            samples.append((float(elapsed), int(max_rss) / 1024))
+        best = min(samples)
+        print(f"  {role:<6}: import {best[0] * 1000:8.1f} ms, max RSS {best[1]:6.1f} MB (best of {runs})")
+
+
+if __name__ == '__main__':
+    run_bootstrap_benchmark(*(int(arg) for arg in sys.argv[1:2]))
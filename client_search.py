@@ -0,0 +1,244 @@
+"""
+In-memory trigram search over a therapist's clients.
+
+Used when Elasticsearch is down and Postgres has no pg_trgm extension.
+Trigrams are extracted the same way pg_trgm does it, so similarity scores
+and ranking match the database backend:
+
+  1. serial prefix matches, found by bisecting a sorted serial list
+  2. substring matches on serial or name
+  3. fuzzy matches whose trigram similarity reaches the threshold
+
+Substring candidates come from intersecting the query's posting lists,
+so a search looks at only the clients that can match, not the whole caseload.
+"""
+import re
+import time
+import threading
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+
+SIMILARITY_THRESHOLD = 0.3  # pg_trgm.similarity_threshold default
+
+_WORD_RE = re.compile(r'[^\W_]+')
+
+
+def trigrams(text):
+    """pg_trgm-compatible trigram set: lowercase words padded with two leading and one trailing space"""
+    grams = set()
+    for word in _WORD_RE.findall((text or '').lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(left, right):
+    """Share of trigrams two strings have in common, as pg_trgm's similarity()"""
+    return _gram_similarity(trigrams(left), trigrams(right))
+
+
+def _gram_similarity(left, right):
+    if not left or not right:
+        return 0.0
+    common = len(left & right)
+    return common / (len(left) + len(right) - common)
+
+
+def _inner_trigrams(text):
+    """Unpadded trigrams every string containing text as a substring must also have"""
+    grams = set()
+    for word in _WORD_RE.findall(text.lower()):
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+class NgramIndex:
+    """Trigram postings plus a sorted serial list for one therapist's clients.
+
+    Entries are (client_id, client_serial, client_name, payload); payload is
+    returned untouched with each hit.
+    """
+
+    def __init__(self, entries=()):
+        self.entries = {}
+        self.postings = defaultdict(set)
+        self.serials = []
+        for entry in entries:
+            self.add(*entry)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, client_id, client_serial, client_name, payload=None):
+        if client_id in self.entries:
+            self.remove(client_id)
+        serial = (client_serial or '').upper()
+        name = client_name or ''
+        grams = trigrams(serial), trigrams(name)
+        self.entries[client_id] = (serial, name.lower(), grams, payload)
+        for gram in grams[0] | grams[1]:
+            self.postings[gram].add(client_id)
+        # Serials are matched on prefix, so keep them ordered for bisect
+        position = bisect_left(self.serials, (serial, client_id))
+        self.serials.insert(position, (serial, client_id))
+
+    def remove(self, client_id):
+        entry = self.entries.pop(client_id, None)
+        if not entry:
+            return
+        serial, _, grams, _ = entry
+        for gram in grams[0] | grams[1]:
+            ids = self.postings.get(gram)
+            if ids:
+                ids.discard(client_id)
+                if not ids:
+                    del self.postings[gram]
+        position = bisect_left(self.serials, (serial, client_id))
+        if position < len(self.serials) and self.serials[position] == (serial, client_id):
+            del self.serials[position]
+
+    def serial_prefix(self, prefix):
+        """Client ids whose serial starts with prefix, in serial order"""
+        prefix = prefix.upper()
+        matches = []
+        for serial, client_id in self.serials[bisect_left(self.serials, (prefix,)):]:
+            if not serial.startswith(prefix):
+                break
+            matches.append(client_id)
+        return matches
+
+    def _substring_candidates(self, query):
+        inner = _inner_trigrams(query)
+        if not inner:
+            return set(self.entries)
+        candidates = None
+        for gram in inner:
+            ids = self.postings.get(gram, ())
+            candidates = set(ids) if candidates is None else candidates & ids
+            if not candidates:
+                return set()
+        return candidates
+
+    def _fuzzy_candidates(self, query_grams):
+        candidates = set()
+        for gram in query_grams:
+            candidates |= self.postings.get(gram, set())
+        return candidates
+
+    def search(self, query, limit=20, threshold=SIMILARITY_THRESHOLD, predicate=None):
+        """Return [(client_id, score, payload)] best first; predicate(payload) filters hits"""
+        query = query.strip()
+        if not query:
+            return []
+        lowered = query.lower()
+        query_grams = trigrams(query)
+
+        ranked = {}
+        for client_id in self.serial_prefix(query):
+            ranked[client_id] = 0
+
+        for client_id in self._substring_candidates(query) - ranked.keys():
+            serial, name, _, _ = self.entries[client_id]
+            if lowered in serial.lower() or lowered in name:
+                ranked[client_id] = 1
+
+        scores = {}
+        for client_id in self._fuzzy_candidates(query_grams):
+            serial_grams, name_grams = self.entries[client_id][2]
+            score = max(_gram_similarity(query_grams, serial_grams), _gram_similarity(query_grams, name_grams))
+            scores[client_id] = score
+            if client_id not in ranked and score >= threshold:
+                ranked[client_id] = 2
+
+        hits = []
+        for client_id, tier in ranked.items():
+            payload = self.entries[client_id][3]
+            if predicate and not predicate(payload):
+                continue
+            hits.append((tier, -scores.get(client_id, 0.0), self.entries[client_id][0], client_id, payload))
+        hits.sort(key=lambda hit: hit[:3])
+        return [(client_id, -negative_score, payload)
+                for _, negative_score, _, client_id, payload in hits[:limit]]
+
+
+class IndexCache:
+    """Small per-process LRU of NgramIndex objects keyed by therapist, each kept for ttl seconds"""
+
+    def __init__(self, max_entries=256, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached and now - cached[0] < self.ttl:
+                self._entries.move_to_end(key)
+                return cached[1]
+
+        index = build()
+        with self._lock:
+            self._entries[key] = (now, index)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def _completion_keys(serial, name):
+    """Lowercased keys a client can be completed from: serial, full name and every later name word"""
+    keys = {serial.lower()} if serial else set()
+    words = (name or '').lower().split()
+    for i in range(len(words)):
+        keys.add(' '.join(words[i:]))
+    return keys
+
+
+class PrefixIndex:
+    """Sorted completion keys for one therapist's clients, answered with bisect.
+
+    Clients are (client_id, client_serial, client_name, is_active). A client
+    matches when the prefix starts its serial, its name or any word of its
+    name; results come back in key order with each client once.
+    """
+
+    def __init__(self, clients=()):
+        self.clients = {}
+        pairs = []
+        for client_id, serial, name, is_active in clients:
+            self.clients[client_id] = (serial, name, bool(is_active))
+            pairs.extend((key, client_id) for key in _completion_keys(serial, name))
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.ids = [client_id for _, client_id in pairs]
+
+    def __len__(self):
+        return len(self.clients)
+
+    def complete(self, prefix, limit=10, active_only=False):
+        """[(client_id, client_serial, client_name, is_active)] for up to limit clients"""
+        prefix = ' '.join(prefix.lower().split())
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        for position in range(bisect_left(self.keys, prefix), len(self.keys)):
+            if not self.keys[position].startswith(prefix):
+                break
+            client_id = self.ids[position]
+            if client_id in seen:
+                continue
+            seen.add(client_id)
+            serial, name, is_active = self.clients[client_id]
+            if active_only and not is_active:
+                continue
+            results.append((client_id, serial, name, is_active))
+            if len(results) >= limit:
+                break
+        return results
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Concurrency tests for the email queue consumer.
+Runs several consumers against the real database at once and checks that
+every row is claimed exactly once, that expired leases are handed over and
+that rows abandoned on their last attempt are failed.
+Needs the same DATABASE_URL as the app; rows use @example.invalid addresses
+and are deleted afterwards.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from new_backend import app, db, EmailQueue, EmailQueueConsumer
+    BACKEND_AVAILABLE = True
+except ImportError:
+    BACKEND_AVAILABLE = False
+    print("Warning: Could not import from new_backend. Tests will be limited.")
+
+TEST_DOMAIN = '@example.invalid'
+
+
+# Color codes for terminal output
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    YELLOW = '\033[93m'
+    BLUE = '\033[94m'
+    CYAN = '\033[96m'
+    RESET = '\033[0m'
+
+
+class EmailQueueTester:
+    """Test SKIP LOCKED claiming and lease handover"""
+
+    def __init__(self, rows=500, workers=8, batch_size=25):
+        self.rows = rows
+        self.workers = workers
+        self.batch_size = batch_size
+        self.test_results = []
+
+    def print_header(self, text):
+        """Print a formatted header"""
+        print(f"\n{Colors.CYAN}{'=' * 60}{Colors.RESET}")
+        print(f"{Colors.CYAN}{text.center(60)}{Colors.RESET}")
+        print(f"{Colors.CYAN}{'=' * 60}{Colors.RESET}\n")
+
+    def record(self, name, passed, detail=''):
+        self.test_results.append((name, passed))
+        color = Colors.GREEN if passed else Colors.RED
+        mark = '✓' if passed else '✗'
+        print(f"{color}{mark} {name}{Colors.RESET} {detail}")
+
+    def seed(self, count, tag):
+        with app.app_context():
+            db.session.add_all([
+                EmailQueue(
+                    to_email=f"queue-{tag}-{i}{TEST_DOMAIN}",
+                    subject=f"Queue test {tag} {i}",
+                    body='Queue test',
+                    status='pending',
+                    attempts=0
+                )
+                for i in range(count)
+            ])
+            db.session.commit()
+            return {row.id for row in EmailQueue.query.filter(
+                EmailQueue.to_email.like(f"queue-{tag}-%{TEST_DOMAIN}")
+            ).all()}
+
+    def cleanup(self):
+        with app.app_context():
+            EmailQueue.query.filter(EmailQueue.to_email.like(f"%{TEST_DOMAIN}")).delete(synchronize_session=False)
+            db.session.commit()
+
+    def test_concurrent_claims(self):
+        """Many consumers draining at once never claim the same row twice"""
+        print(f"{Colors.YELLOW}Testing concurrent claims ({self.workers} workers, {self.rows} rows){Colors.RESET}")
+        seeded = self.seed(self.rows, 'concurrent')
+        claimed = []
+        lock = threading.Lock()
+        errors = []
+
+        def work():
+            try:
+                with app.app_context():
+                    consumer = EmailQueueConsumer()
+                    while True:
+                        rows = [row for row in consumer.claim(self.batch_size) if row.id in seeded]
+                        if not rows:
+                            break
+                        ids = [row.id for row in rows]
+                        consumer.mark_sent(ids)
+                        db.session.commit()
+                        with lock:
+                            claimed.extend(ids)
+            except Exception as e:
+                errors.append(e)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=work) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        duplicates = [email_id for email_id, count in Counter(claimed).items() if count > 1]
+        self.record('No worker errors', not errors, str(errors[:1]) if errors else '')
+        self.record('No row claimed twice', not duplicates, f"({len(duplicates)} duplicates)")
+        self.record('Every row claimed', set(claimed) >= seeded,
+                    f"({len(seeded & set(claimed))}/{len(seeded)} in {elapsed:.2f}s)")
+
+    def test_lease_expiry(self):
+        """An expired lease can be re-claimed and the stale consumer can no longer settle it"""
+        print(f"\n{Colors.YELLOW}Testing lease expiry{Colors.RESET}")
+        seeded = self.seed(1, 'lease')
+        email_id = next(iter(seeded))
+
+        with app.app_context():
+            stale = EmailQueueConsumer(lease_seconds=1)
+            first = stale.claim_one(email_id)
+            self.record('First consumer claims the row', first is not None)
+
+            fresh = EmailQueueConsumer()
+            self.record('Row is not claimable while leased', fresh.claim_one(email_id) is None)
+
+            time.sleep(1.5)
+            second = fresh.claim_one(email_id)
+            self.record('Row is re-claimed after the lease expires', second is not None)
+            self.record('Attempts count both claims', second is not None and second.attempts == 2,
+                        f"(attempts={second.attempts if second else None})")
+
+            settled = stale.mark_sent([email_id])
+            db.session.commit()
+            self.record('Stale consumer cannot settle the row', settled == 0)
+
+            settled = fresh.mark_sent([email_id])
+            db.session.commit()
+            self.record('Current lease holder settles the row', settled == 1)
+
+    def test_exhausted_lease(self):
+        """A row whose worker died on its last attempt is failed by the next drain"""
+        print(f"\n{Colors.YELLOW}Testing exhausted lease{Colors.RESET}")
+        seeded = self.seed(1, 'exhausted')
+        email_id = next(iter(seeded))
+
+        with app.app_context():
+            EmailQueue.query.filter_by(id=email_id).update({'attempts': EmailQueueConsumer.MAX_ATTEMPTS - 1})
+            db.session.commit()
+            dead = EmailQueueConsumer(lease_seconds=1)
+            self.record('Last attempt is claimed', dead.claim_one(email_id) is not None)
+
+            time.sleep(1.5)
+            fresh = EmailQueueConsumer()
+            self.record('Exhausted row is not re-claimed', fresh.claim_one(email_id) is None)
+            fresh.fail_exhausted()
+            row = db.session.get(EmailQueue, email_id)
+            self.record('Exhausted row is failed once its lease expires', row.status == 'failed',
+                        f"(status={row.status})")
+
+    def run_all_tests(self):
+        """Run all email queue tests"""
+        self.print_header("EMAIL QUEUE CONSUMER TESTS")
+
+        if not BACKEND_AVAILABLE:
+            print(f"{Colors.RED}Cannot run queue tests - backend not available{Colors.RESET}")
+            print("Make sure new_backend.py and its dependencies are available")
+            return
+
+        try:
+            self.test_concurrent_claims()
+            self.test_lease_expiry()
+            self.test_exhausted_lease()
+        finally:
+            self.cleanup()
+
+        passed = sum(1 for _, ok in self.test_results if ok)
+        color = Colors.GREEN if passed == len(self.test_results) else Colors.RED
+        print(f"\n{color}{passed}/{len(self.test_results)} checks passed{Colors.RESET}")
+
+
+if __name__ == "__main__":
+    tester = EmailQueueTester(*(int(arg) for arg in sys.argv[1:3]))
+    tester.run_all_tests()
@@ -0,0 +1,253 @@
+"""
+Pre-compiled multilingual e-mail templates.
+
+A template is a subject, a plain-text body and an HTML body written with
+str.format placeholders. The first time a (template, language, base URL)
+combination is used in a process, every placeholder that does not change
+between recipients (translated strings, text direction, links built from the
+base URL) is filled in and the result is split into literal fragments around
+the few per-recipient slots that remain. Rendering a message is then a
+single join over those fragments.
+
+Per-recipient values are HTML-escaped in the HTML body only; translations
+and static values are trusted template content.
+
+Benchmark against per-recipient f-string formatting:
+
+    python email_templates.py [recipients]
+"""
+import html
+import threading
+from string import Formatter
+
+_formatter = Formatter()
+
+
+class CompiledTemplate:
+    """Literal fragments interleaved with slot names: fragments[0] slot[0] fragments[1] ... slot[n-1] fragments[n]"""
+
+    __slots__ = ('fragments', 'slots', 'escape')
+
+    def __init__(self, source, static, escape=False):
+        fragments = ['']
+        slots = []
+        for literal, field, spec, conversion in _formatter.parse(source):
+            fragments[-1] += literal
+            if field is None:
+                continue
+            if field in static:
+                value = _formatter.convert_field(static[field], conversion)
+                fragments[-1] += _formatter.format_field(value, spec or '')
+            else:
+                slots.append(field)
+                fragments.append('')
+        self.fragments = tuple(fragments)
+        self.slots = tuple(slots)
+        self.escape = escape
+
+    def render(self, values):
+        parts = [self.fragments[0]]
+        for slot, fragment in zip(self.slots, self.fragments[1:]):
+            value = '' if values.get(slot) is None else str(values[slot])
+            parts.append(html.escape(value) if self.escape else value)
+            parts.append(fragment)
+        return ''.join(parts)
+
+
+class EmailTemplate:
+    """One message in every supported language, compiled lazily per (language, base_url)"""
+
+    def __init__(self, name, subject, text, html_body, translations, default_language='en'):
+        self.name = name
+        self.sources = (subject, text, html_body)
+        self.translations = translations
+        self.default_language = default_language
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def static_context(self, language, base_url):
+        context = dict(self.translations[language])
+        context['base_url'] = base_url
+        context['direction'] = 'rtl' if language in RTL_LANGUAGES else 'ltr'
+        context['regards_html'] = context.get('regards', '').replace('\n', '<br>')
+        return context
+
+    def compiled(self, language, base_url):
+        if language not in self.translations:
+            language = self.default_language
+        key = (language, base_url)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            static = self.static_context(language, base_url)
+            subject, text, html_body = self.sources
+            compiled = (
+                CompiledTemplate(subject, static),
+                CompiledTemplate(text, static),
+                CompiledTemplate(html_body, static, escape=True),
+            )
+            with self._lock:
+                compiled = self._compiled.setdefault(key, compiled)
+        return compiled
+
+    def render(self, language, base_url, **values):
+        """(subject, body, html_body) for one recipient"""
+        subject, text, html_body = self.compiled(language, base_url)
+        return subject.render(values), text.render(values), html_body.render(values)
+
+
+RTL_LANGUAGES = ('he', 'ar')
+
+# ============= DAILY CHECK-IN REMINDER =============
+
+DAILY_REMINDER_TRANSLATIONS = {
+    'en': {
+        'subject': "Daily Check-in Reminder - Therapeutic Companion",
+        'greeting': "Hello",
+        'reminder_text': "This is your daily reminder to complete your therapy check-in.",
+        'progress_text': "Your therapist is tracking your progress, and your daily input is valuable for your treatment.",
+        'login_text': "Click here to log in and complete today's check-in:",
+        'button_text': "Complete Today's Check-in",
+        'client_id': "Client ID",
+        'already_completed': "If you've already completed today's check-in, please disregard this message.",
+        'regards': "Best regards,\nYour Therapy Team",
+        'title': "Daily Check-in Reminder",
+        'unsubscribe_text': "To unsubscribe, click",
+        'unsubscribe_here': "here"
+    },
+    'he': {
+        'subject': "תזכורת יומית לצ'ק-אין - מלווה טיפולי",
+        'greeting': "שלום",
+        'reminder_text': "זוהי התזכורת היומית שלך להשלים את הצ'ק-אין הטיפולי שלך.",
+        'progress_text': "המטפל שלך עוקב אחר ההתקדמות שלך, והקלט היומי שלך חשוב לטיפול שלך.",
+        'login_text': "לחץ כאן כדי להתחבר ולהשלים את הצ'ק-אין של היום:",
+        'button_text': "השלם את הצ'ק-אין של היום",
+        'client_id': "מספר מטופל",
+        'already_completed': "אם כבר השלמת את הצ'ק-אין של היום, אנא התעלם מהודעה זו.",
+        'regards': "בברכה,\nצוות הטיפול שלך",
+        'title': "תזכורת יומית לצ'ק-אין",
+        'unsubscribe_text': "להפסקת הרישום, לחץ",
+        'unsubscribe_here': "כאן"
+    },
+    'ru': {
+        'subject': "Ежедневное напоминание об отметке - Терапевтический Компаньон",
+        'greeting': "Здравствуйте",
+        'reminder_text': "Это ваше ежедневное напоминание о необходимости заполнить терапевтическую отметку.",
+        'progress_text': "Ваш терапевт отслеживает ваш прогресс, и ваши ежедневные данные важны для вашего лечения.",
+        'login_text': "Нажмите здесь, чтобы войти и заполнить сегодняшнюю отметку:",
+        'button_text': "Заполнить сегодняшнюю отметку",
+        'client_id': "ID клиента",
+        'already_completed': "Если вы уже заполнили сегодняшнюю отметку, пожалуйста, игнорируйте это сообщение.",
+        'regards': "С наилучшими пожеланиями,\nВаша терапевтическая команда",
+        'title': "Ежедневное напоминание об отметке",
+        'unsubscribe_text': "Чтобы отписаться, нажмите",
+        'unsubscribe_here': "здесь"
+    },
+    'ar': {
+        'subject': "تذكير يومي بتسجيل الحضور - الرفيق العلاجي",
+        'greeting': "مرحباً",
+        'reminder_text': "هذا تذكيرك اليومي لإكمال تسجيل الحضور العلاجي الخاص بك.",
+        'progress_text': "معالجك يتتبع تقدمك، ومدخلاتك اليومية قيمة لعلاجك.",
+        'login_text': "انقر هنا لتسجيل الدخول وإكمال تسجيل حضور اليوم:",
+        'button_text': "أكمل تسجيل حضور اليوم",
+        'client_id': "معرف العميل",
+        'already_completed': "إذا كنت قد أكملت بالفعل تسجيل حضور اليوم، يرجى تجاهل هذه الرسالة.",
+        'regards': "مع أطيب التحيات،\nفريق العلاج الخاص بك",
+        'title': "تذكير يومي بتسجيل الحضور",
+        'unsubscribe_text': "لإلغاء الاشتراك، انقر",
+        'unsubscribe_here': "هنا"
+    }
+}
+
+# Per-recipient slots: client_label, unsubscribe_url
+DAILY_REMINDER_TEXT = """{greeting},
+
+{reminder_text}
+
+{progress_text}
+
+{login_text}
+{base_url}/login.html
+
+{client_id}: {client_label}
+
+{unsubscribe_text} {unsubscribe_here}: {unsubscribe_url}
+
+{already_completed}
+
+{regards}"""
+
+DAILY_REMINDER_HTML = """
+<html>
+<head>
+    <meta charset="utf-8">
+</head>
+<body style="font-family: Arial, sans-serif; color: #333; direction: {direction};">
+    <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+        <h2 style="color: #2c3e50;">{title}</h2>
+        <p>{greeting},</p>
+        <p>{reminder_text}</p>
+        <p>{progress_text}</p>
+        <div style="text-align: center; margin: 40px 0;">
+            <a href="{base_url}/login.html"
+               style="background-color: #4CAF50; color: white; padding: 15px 40px;
+                      text-decoration: none; border-radius: 5px; display: inline-block;
+                      font-weight: bold; font-size: 16px;">
+                {button_text}
+            </a>
+        </div>
+        <p style="color: #666; font-size: 14px; text-align: center;">
+                    {unsubscribe_text} <a href="{unsubscribe_url}" style="color: #666;">{unsubscribe_here}</a>
+                </p>
+        <p style="color: #666; font-size: 14px;">{client_id}: {client_label}</p>
+        <p style="color: #666; font-size: 14px;">
+            {already_completed}
+        </p>
+        <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;">
+        <p style="color: #999; font-size: 12px;">
+            {regards_html}
+        </p>
+    </div>
+</body>
+</html>
+"""
+
+DAILY_REMINDER = EmailTemplate(
+    'daily_reminder', '{subject}', DAILY_REMINDER_TEXT, DAILY_REMINDER_HTML, DAILY_REMINDER_TRANSLATIONS
+)
+
+
+# ============= BENCHMARK =============
+
+def run_benchmark(recipients=5000):
+    import time
+
+    base_url = 'https://therapy-companion.onrender.com'
+    languages = list(DAILY_REMINDER_TRANSLATIONS)
+    people = [(languages[i % len(languages)], f"CLT-{i:06d}", f"{base_url}/api/unsubscribe/token{i}")
+              for i in range(recipients)]
+
+    def formatted(language, label, url):
+        static = DAILY_REMINDER.static_context(language, base_url)
+        values = dict(static, client_label=label, unsubscribe_url=url)
+        return (static['subject'], DAILY_REMINDER_TEXT.format(**values),
+                DAILY_REMINDER_HTML.format(**dict(values, client_label=html.escape(label))))
+
+    started = time.perf_counter()
+    expected = [formatted(*person) for person in people]
+    naive = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rendered = [DAILY_REMINDER.render(language, base_url, client_label=label, unsubscribe_url=url)
+                for language, label, url in people]
+    compiled = time.perf_counter() - started
+
+    print(f"{recipients} daily reminders in {len(languages)} languages")
+    print(f"  format per recipient: {naive * 1000:8.1f} ms ({naive / recipients * 1e6:.1f} us each)")
+    print(f"  compiled fragments:   {compiled * 1000:8.1f} ms ({compiled / recipients * 1e6:.1f} us each), "
+          f"identical output: {rendered == expected}")
+
+
+if __name__ == '__main__':
+    import sys
+
+    run_benchmark(*(int(arg) for arg in sys.argv[1:2]))
@@ -7,7 +7,7 @@ from pathlib import Path
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from new_backend import app, db, TrackingCategory, ensure_default_categories, fix_existing_clients, EmailQueue
+from new_backend import app, db, TrackingCategory, ensure_default_categories, fix_existing_clients, EmailQueue, ClientDailyRollup, Reminder
 from sqlalchemy import text
 
 
@@ -348,6 +348,153 @@ def add_category_response_constraint():
             print(f"Error adding category constraint: {e}")
             db.session.rollback()
 
+def add_category_response_unique_indexes():
+    """Deduplicate category responses and add the unique indexes used by check-in upserts"""
+    with app.app_context():
+        for column, index_name in (('category_id', 'uq_category_resp_default'),
+                                   ('custom_category_id', 'uq_category_resp_custom')):
+            try:
+                # Keep the newest row for each (client, category, day) before enforcing uniqueness
+                db.session.execute(text(f"""
+                    DELETE FROM category_responses a
+                    USING category_responses b
+                    WHERE a.{column} IS NOT NULL
+                    AND a.client_id = b.client_id
+                    AND a.{column} = b.{column}
+                    AND a.response_date = b.response_date
+                    AND a.id < b.id
+                """))
+                db.session.execute(text(f"""
+                    CREATE UNIQUE INDEX IF NOT EXISTS {index_name}
+                    ON category_responses(client_id, {column}, response_date)
+                    WHERE {column} IS NOT NULL
+                """))
+                db.session.commit()
+                print(f"✓ Unique index {index_name} ready")
+            except Exception as e:
+                print(f"Error adding unique index {index_name}: {e}")
+                db.session.rollback()
+
+
+
+def add_client_search_indexes():
+    """Enable pg_trgm and add the indexes behind database client search"""
+    with app.app_context():
+        # Serial prefix lookups only need a pattern-ops btree, so add it even without pg_trgm
+        try:
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_clients_therapist_serial_prefix
+                ON clients(therapist_id, client_serial text_pattern_ops)
+            """))
+            db.session.commit()
+            print("✓ Client serial prefix index ready")
+        except Exception as e:
+            print(f"Error adding client serial prefix index: {e}")
+            db.session.rollback()
+
+        try:
+            db.session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_clients_serial_trgm
+                ON clients USING gin (client_serial gin_trgm_ops)
+            """))
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_clients_name_trgm
+                ON clients USING gin ((coalesce(client_name, '')) gin_trgm_ops)
+            """))
+            db.session.commit()
+            print("✓ Trigram client search indexes ready")
+        except Exception as e:
+            # Managed databases may not allow the extension; search falls back to in-memory n-grams
+            print(f"pg_trgm unavailable, client search will use the in-memory index: {e}")
+            db.session.rollback()
+
+
+def add_email_queue_leases():
+    """Add the lease columns queue consumers use to claim email_queue rows"""
+    with app.app_context():
+        try:
+            db.session.execute(text("ALTER TABLE email_queue ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP"))
+            db.session.execute(text("ALTER TABLE email_queue ADD COLUMN IF NOT EXISTS leased_by VARCHAR(100)"))
+            # Rows stuck in processing from the old scheme become reclaimable once this lease runs out
+            db.session.execute(text("""
+                UPDATE email_queue
+                SET lease_expires_at = COALESCE(last_attempt_at, created_at) + interval '10 minutes'
+                WHERE status = 'processing' AND lease_expires_at IS NULL
+            """))
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_email_queue_claim
+                ON email_queue(created_at)
+                WHERE status IN ('pending', 'processing')
+            """))
+            db.session.commit()
+            print("✓ Email queue lease columns ready")
+        except Exception as e:
+            print(f"Error adding email queue lease columns: {e}")
+            db.session.rollback()
+
+
+def add_email_queue_priority():
+    """Add the mail lane column and an index for per-lane claims"""
+    with app.app_context():
+        try:
+            # Existing rows take the default, so queued mail keeps going out on the transactional lane
+            db.session.execute(text(
+                "ALTER TABLE email_queue ADD COLUMN IF NOT EXISTS priority VARCHAR(20) DEFAULT 'transactional'"
+            ))
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_email_queue_lane_claim
+                ON email_queue(priority, created_at)
+                WHERE status IN ('pending', 'processing')
+            """))
+            db.session.commit()
+            print("✓ Email queue priority lanes ready")
+        except Exception as e:
+            print(f"Error adding email queue priority column: {e}")
+            db.session.rollback()
+
+
+def add_reminder_schedule_columns():
+    """Add the reminder zone and next-fire columns, index them, and schedule existing reminders"""
+    with app.app_context():
+        try:
+            db.session.execute(text("ALTER TABLE reminders ADD COLUMN IF NOT EXISTS timezone VARCHAR(64)"))
+            db.session.execute(text("ALTER TABLE reminders ADD COLUMN IF NOT EXISTS next_fire_at TIMESTAMP"))
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_reminders_due
+                ON reminders(next_fire_at)
+                WHERE is_active AND reminder_type = 'daily_checkin'
+            """))
+            db.session.commit()
+
+            # Existing reminders have no zone, so they keep firing at their stored UTC time
+            pending = Reminder.query.filter(
+                Reminder.is_active == True,
+                Reminder.reminder_type == 'daily_checkin',
+                Reminder.next_fire_at.is_(None)
+            ).all()
+            for reminder in pending:
+                reminder.schedule_next()
+            db.session.commit()
+            print(f"✓ Reminder schedule ready ({len(pending)} reminders scheduled)")
+        except Exception as e:
+            print(f"Error adding reminder schedule columns: {e}")
+            db.session.rollback()
+
+
+def backfill_daily_rollups():
+    """Populate client_daily_rollups from existing category responses on first deploy"""
+    with app.app_context():
+        try:
+            if ClientDailyRollup.query.first() is None:
+                ClientDailyRollup.rebuild()
+                db.session.commit()
+                print(f"✓ Backfilled {ClientDailyRollup.query.count()} daily rollups")
+            else:
+                print("✓ Daily rollups already populated")
+        except Exception as e:
+            print(f"Error backfilling daily rollups: {e}")
+            db.session.rollback()
 
 
 def initialize_database():
@@ -501,6 +648,12 @@ if __name__ == '__main__':
         create_custom_categories_table()
 
         add_category_response_constraint()
+        add_category_response_unique_indexes()
+        backfill_daily_rollups()
+        add_client_search_indexes()
+        add_email_queue_leases()
+        add_email_queue_priority()
+        add_reminder_schedule_columns()
         # Fix any existing reminder timezone issues
         fix_reminder_timezone_issue()
 
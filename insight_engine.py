@@ -0,0 +1,385 @@
+"""
+Vectorised insight engine for client check-in windows.
+
+A window is held as dense NumPy arrays (client x day x metric) so every rule
+runs as whole-array operations, for one client or a whole caseload at once.
+Rules are registered declaratively with @insight_rule; each returns a
+RuleOutcome of per-client arrays and the registry turns fired rules into the
+insight dicts served by the therapist API.
+
+Run this module directly for a synthetic benchmark:
+
+    python insight_engine.py [clients] [days]
+    python insight_engine.py triage [clients] [days] [caseload]
+"""
+from collections import namedtuple
+from datetime import timedelta
+
+import numpy as np
+
+METRICS = ('emotional', 'medication', 'sleep')
+EMOTIONAL, MEDICATION, SLEEP = range(len(METRICS))
+
+MIN_CHECKINS = 5
+PRIORITY_ORDER = {'critical': 0, 'warning': 1, 'info': 2}
+
+RuleOutcome = namedtuple('RuleOutcome', ['fired', 'priority', 'values'])
+
+
+class WindowBatch:
+    """Check-in metrics for many clients over the same date window.
+
+    values has shape (clients, days, metrics) with NaN for missing answers;
+    present marks the days that have a check-in at all.
+    """
+
+    def __init__(self, client_ids, start_date, days, values, present):
+        self.client_ids = list(client_ids)
+        self.start_date = start_date
+        self.days = days
+        self.values = values
+        self.present = present
+
+    @classmethod
+    def from_rows(cls, client_ids, rows, start_date, days):
+        """Build a batch from (client_id, checkin_date, emotional, medication, sleep) rows"""
+        client_ids = list(client_ids)
+        index = {client_id: position for position, client_id in enumerate(client_ids)}
+        values = np.full((len(client_ids), days, len(METRICS)), np.nan)
+        present = np.zeros((len(client_ids), days), dtype=bool)
+
+        rows = [row for row in rows if row[0] in index and 0 <= (row[1] - start_date).days < days]
+        if rows:
+            client_pos = np.fromiter((index[row[0]] for row in rows), dtype=np.intp, count=len(rows))
+            day_pos = np.fromiter(((row[1] - start_date).days for row in rows), dtype=np.intp, count=len(rows))
+            metrics = np.array([[np.nan if value is None else value for value in row[2:2 + len(METRICS)]]
+                                for row in rows], dtype=float)
+            values[client_pos, day_pos] = metrics
+            present[client_pos, day_pos] = True
+        return cls(client_ids, start_date, days, values, present)
+
+    def metric(self, position):
+        """(clients, days) array of one metric, NaN on days without a check-in"""
+        return np.where(self.present, self.values[:, :, position], np.nan)
+
+    @property
+    def checkin_counts(self):
+        return self.present.sum(axis=1)
+
+    def halves(self):
+        """Masks splitting each client's check-ins into first and second half by count"""
+        rank = np.cumsum(self.present, axis=1) - 1
+        midpoint = (self.checkin_counts // 2)[:, None]
+        return self.present & (rank < midpoint), self.present & (rank >= midpoint)
+
+
+def _masked_mean(values, mask):
+    counts = mask.sum(axis=1)
+    totals = np.where(mask, values, 0.0).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, totals / np.maximum(counts, 1), np.nan), counts
+
+
+def _last_n(mask, n):
+    """Keep only the last n True entries of each row of mask"""
+    from_end = np.cumsum(mask[:, ::-1], axis=1)[:, ::-1]
+    return mask & (from_end <= n)
+
+
+# ============= RULE REGISTRY =============
+
+InsightRule = namedtuple('InsightRule', [
+    'name', 'evaluate', 'title', 'description', 'recommendation', 'trend',
+    'trend_description', 'describe'
+])
+
+RULES = []
+
+
+def insight_rule(name, title, description, recommendation, trend, trend_description, describe):
+    """Register a rule.
+
+    The decorated function takes a WindowBatch and returns a RuleOutcome whose
+    arrays are indexed by client; describe(values, i) returns the
+    (description_params, trend_params) for client i.
+    """
+
+    def decorator(func):
+        RULES[:] = [rule for rule in RULES if rule.name != name]
+        RULES.append(InsightRule(name, func, title, description, recommendation, trend,
+                                 trend_description, describe))
+        return func
+
+    return decorator
+
+
+def _emotional_halves(batch):
+    emotional = batch.metric(EMOTIONAL)
+    valid = ~np.isnan(emotional) & (emotional != 0)
+    first, second = batch.halves()
+    avg_first, n_first = _masked_mean(emotional, valid & first)
+    avg_second, n_second = _masked_mean(emotional, valid & second)
+    return emotional, valid & second, avg_first, n_first, avg_second, n_second
+
+
+@insight_rule(
+    'emotional',
+    title='therapist.declining_emotional_state',
+    description='therapist.emotional_decline_desc',
+    recommendation='therapist.schedule_session_rec',
+    trend='declining',
+    trend_description='therapist.from_to_trend',
+    describe=lambda v, i: ({'percent': int(v['decline'][i])},
+                           {'from': f"{v['avg_first'][i]:.1f}", 'to': f"{v['avg_second'][i]:.1f}"})
+)
+def emotional_decline(batch):
+    _, _, avg_first, n_first, avg_second, n_second = _emotional_halves(batch)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        decline = np.where(avg_first > 0, (avg_first - avg_second) / avg_first * 100, 0.0)
+    fired = (n_first > 0) & (n_second > 0) & (decline > 20)
+    priority = np.where(decline > 30, 'critical', 'warning')
+    return RuleOutcome(fired, priority, {'decline': decline, 'avg_first': avg_first, 'avg_second': avg_second})
+
+
+@insight_rule(
+    'engagement',
+    title='therapist.inconsistent_engagement',
+    description='therapist.inconsistent_desc',
+    recommendation='therapist.discuss_barriers_rec',
+    trend='stable',
+    trend_description='therapist.checkins_in_days',
+    describe=lambda v, i: ({'days': int(v['avg_gap'][i])},
+                           {'count': int(v['count'][i]), 'days': int(v['window'][i])})
+)
+def inconsistent_engagement(batch):
+    counts = batch.checkin_counts
+    day_index = np.arange(batch.days)
+    first_day = np.where(batch.present, day_index, batch.days).min(axis=1)
+    last_day = np.where(batch.present, day_index, -1).max(axis=1)
+    # The mean of consecutive gaps telescopes to the overall span over (n - 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_gap = np.where(counts > 1, (last_day - first_day) / np.maximum(counts - 1, 1), 0.0)
+    fired = (counts > 1) & (avg_gap > 3)
+    return RuleOutcome(fired, np.full(len(counts), 'warning'),
+                       {'avg_gap': avg_gap, 'count': counts, 'window': np.full(len(counts), batch.days - 1)})
+
+
+@insight_rule(
+    'medication',
+    title='therapist.medication_concerns',
+    description='therapist.medication_desc',
+    recommendation='therapist.discuss_medication_rec',
+    trend='declining',
+    trend_description='therapist.non_adherent_percent',
+    describe=lambda v, i: ({'days': int(v['non_adherent'][i])},
+                           {'percent': int(v['non_adherent'][i] / v['window'][i] * 100)})
+)
+def medication_adherence(batch):
+    medication = batch.metric(MEDICATION)
+    valid = ~np.isnan(medication)
+    recorded = valid.sum(axis=1)
+    non_adherent = (valid & (medication < 3)).sum(axis=1)
+    fired = (recorded > 0) & (non_adherent > recorded * 0.3)
+    priority = np.where(non_adherent < 10, 'warning', 'critical')
+    return RuleOutcome(fired, priority,
+                       {'non_adherent': non_adherent, 'window': np.full(len(recorded), batch.days - 1)})
+
+
+@insight_rule(
+    'progress',
+    title='therapist.positive_progress',
+    description='therapist.improvement_desc',
+    recommendation='therapist.acknowledge_progress_rec',
+    trend='improving',
+    trend_description='therapist.averaging_score',
+    describe=lambda v, i: ({'percent': int(v['improvement'][i])}, {'score': f"{v['avg_second'][i]:.1f}"})
+)
+def positive_progress(batch):
+    _, _, avg_first, n_first, avg_second, n_second = _emotional_halves(batch)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        improvement = np.where(avg_first > 0, (avg_second - avg_first) / avg_first * 100, 0.0)
+    fired = (n_first > 0) & (n_second > 0) & (improvement > 0)
+    return RuleOutcome(fired, np.full(len(fired), 'info'),
+                       {'improvement': improvement, 'avg_second': avg_second})
+
+
+@insight_rule(
+    'crisis',
+    title='therapist.potential_crisis',
+    description='therapist.crisis_desc',
+    recommendation='therapist.immediate_outreach_rec',
+    trend='declining',
+    trend_description='therapist.urgent_attention',
+    describe=lambda v, i: ({}, {})
+)
+def potential_crisis(batch):
+    emotional, valid_second, avg_first, n_first, _, n_second = _emotional_halves(batch)
+    last_three = _last_n(valid_second, 3)
+    all_low = (last_three & (emotional <= 2)).sum(axis=1) == 3
+    fired = (n_second >= 3) & all_low & (n_first > 0) & (avg_first > 3)
+    return RuleOutcome(fired, np.full(len(fired), 'critical'), {})
+
+
+@insight_rule(
+    'sleep',
+    title='therapist.sleep_concerns',
+    description='therapist.sleep_desc',
+    recommendation='therapist.sleep_hygiene_rec',
+    trend='stable',
+    trend_description='therapist.persistent_sleep',
+    describe=lambda v, i: ({'days': int(v['poor_days'][i])}, {})
+)
+def sleep_quality(batch):
+    sleep = batch.metric(SLEEP)
+    valid = ~np.isnan(sleep)
+    last_week = _last_n(valid, 7)
+    poor_days = (last_week & (sleep <= 2)).sum(axis=1)
+    fired = (valid.sum(axis=1) >= 7) & (poor_days >= 4)
+    return RuleOutcome(fired, np.full(len(fired), 'warning'), {'poor_days': poor_days})
+
+
+# ============= EVALUATION =============
+
+def evaluate_rules(batch, rules=None):
+    """Run every rule over the batch; returns {rule_name: RuleOutcome}"""
+    enough_data = batch.checkin_counts >= MIN_CHECKINS
+    outcomes = {}
+    for rule in rules or RULES:
+        outcome = rule.evaluate(batch)
+        outcomes[rule.name] = RuleOutcome(outcome.fired & enough_data, outcome.priority, outcome.values)
+    return outcomes
+
+
+def build_insights(batch, rules=None):
+    """Return {client_id: [insight dict, ...]} sorted by priority for every client in the batch"""
+    rules = rules or RULES
+    outcomes = evaluate_rules(batch, rules)
+    insights = {client_id: [] for client_id in batch.client_ids}
+
+    for rule in rules:
+        outcome = outcomes[rule.name]
+        for i in np.flatnonzero(outcome.fired):
+            description_params, trend_params = rule.describe(outcome.values, i)
+            client_id = batch.client_ids[i]
+            insights[client_id].append({
+                'rule': rule.name,
+                'client_id': client_id,
+                'priority': str(outcome.priority[i]),
+                'title': rule.title,
+                'description': rule.description,
+                'description_params': description_params,
+                'recommendation': rule.recommendation,
+                'trend': rule.trend,
+                'trend_description': rule.trend_description,
+                'trend_params': trend_params
+            })
+
+    for client_insights in insights.values():
+        client_insights.sort(key=lambda insight: PRIORITY_ORDER.get(insight['priority'], 3))
+    return insights
+
+
+# ============= TRIAGE =============
+
+PRIORITY_WEIGHTS = {'critical': 100, 'warning': 10, 'info': 0}
+
+
+def triage_scores(batch, outcomes=None):
+    """Attention score per client: fired rules weighted by priority.
+
+    Returns (score, critical, warning, fired) where fired is a
+    (clients, rules) boolean matrix in RULES order.
+    """
+    outcomes = outcomes or evaluate_rules(batch)
+    clients = len(batch.client_ids)
+    score = np.zeros(clients, dtype=np.int64)
+    critical = np.zeros(clients, dtype=np.int64)
+    warning = np.zeros(clients, dtype=np.int64)
+    fired = np.zeros((clients, len(outcomes)), dtype=bool)
+
+    for column, outcome in enumerate(outcomes.values()):
+        priority = np.broadcast_to(outcome.priority, (clients,))
+        is_critical = outcome.fired & (priority == 'critical')
+        is_warning = outcome.fired & (priority == 'warning')
+        score += is_critical * PRIORITY_WEIGHTS['critical'] + is_warning * PRIORITY_WEIGHTS['warning']
+        critical += is_critical
+        warning += is_warning
+        fired[:, column] = outcome.fired
+    return score, critical, warning, fired
+
+
+def rank_within_groups(groups, score, tiebreak):
+    """1-based rank of each client inside its group, highest score first, then lowest tiebreak"""
+    groups = np.asarray(groups)
+    order = np.lexsort((np.asarray(tiebreak), -np.asarray(score), groups))
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    group_start = np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order)) - group_start + 1
+    return rank
+
+
+# ============= BENCHMARK =============
+
+def synthetic_batch(clients, days, seed=0, start_date=None):
+    """Random check-in windows with realistic gaps, for benchmarks"""
+    from datetime import date
+
+    rng = np.random.default_rng(seed)
+    start_date = start_date or date.today() - timedelta(days=days - 1)
+    present = rng.random((clients, days)) < rng.uniform(0.2, 1.0, size=(clients, 1))
+    values = rng.integers(1, 6, size=(clients, days, len(METRICS))).astype(float)
+    values[rng.random(values.shape) < 0.1] = np.nan
+    values[~present] = np.nan
+    return WindowBatch(range(1, clients + 1), start_date, days, values, present)
+
+
+def run_benchmark(clients=1000, days=31):
+    import time
+
+    batch = synthetic_batch(clients, days)
+
+    started = time.perf_counter()
+    batched = build_insights(batch)
+    batched_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i, client_id in enumerate(batch.client_ids):
+        single = WindowBatch([client_id], batch.start_date, days,
+                             batch.values[i:i + 1], batch.present[i:i + 1])
+        build_insights(single)
+    single_seconds = time.perf_counter() - started
+
+    fired = sum(len(items) for items in batched.values())
+    print(f"{clients} clients x {days} days, {len(RULES)} rules, {fired} insights")
+    print(f"  whole batch:       {batched_seconds * 1000:8.1f} ms")
+    print(f"  one client a time: {single_seconds * 1000:8.1f} ms "
+          f"({single_seconds / clients * 1000:.3f} ms per client)")
+
+
+def run_triage_benchmark(clients=10000, days=31, caseload=50):
+    """Time the full triage pass (rules, scores, per-therapist ranks) at growing sizes"""
+    import time
+
+    print(f"Triage scan, {days}-day windows, {caseload} clients per therapist")
+    for size in sorted({max(clients // 10, 1), max(clients // 2, 1), clients}):
+        batch = synthetic_batch(size, days, seed=size)
+        therapists = np.arange(size) // caseload
+
+        started = time.perf_counter()
+        score, _, _, _ = triage_scores(batch)
+        rank_within_groups(therapists, score, batch.client_ids)
+        seconds = time.perf_counter() - started
+
+        print(f"  {size:>7} clients: {seconds * 1000:8.1f} ms "
+              f"({size / seconds:,.0f} clients/s)")
+
+
+if __name__ == '__main__':
+    import sys
+
+    if sys.argv[1:2] == ['triage']:
+        run_triage_benchmark(*(int(arg) for arg in sys.argv[2:5]))
+    else:
+        run_benchmark(*(int(arg) for arg in sys.argv[1:3]))
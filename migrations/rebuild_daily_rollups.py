@@ -0,0 +1,22 @@
+"""
+Rebuild the per-client daily rollups (category values, mean mood, flags)
+from category_responses. Safe to re-run; pass client ids to limit the rebuild.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from new_backend import app, db, ClientDailyRollup
+
+
+def rebuild_daily_rollups(client_ids=None):
+    """Recompute daily rollups for the given clients (all clients by default)"""
+    with app.app_context():
+        ClientDailyRollup.rebuild(client_ids)
+        db.session.commit()
+        print(f"Daily rollups now hold {ClientDailyRollup.query.count()} rows")
+
+
+if __name__ == '__main__':
+    ids = [int(arg) for arg in sys.argv[1:]] or None
+    rebuild_daily_rollups(ids)
@@ -0,0 +1,37 @@
+"""
+Rebuild the per-client engagement summaries (streaks, last check-in, rolling counts)
+from daily_checkins. Safe to re-run; use --verify to compare stored summaries
+against a full recount without writing anything.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from new_backend import app, db, Client, ClientEngagement, verify_engagement_summary
+
+
+def rebuild_engagement_summaries():
+    """Recompute every client's engagement summary in one statement"""
+    with app.app_context():
+        ClientEngagement.rebuild()
+        db.session.commit()
+        print(f"Rebuilt engagement summaries for {ClientEngagement.query.count()} clients")
+
+
+def verify_engagement_summaries():
+    """Report clients whose stored summary disagrees with their check-ins"""
+    with app.app_context():
+        mismatched = 0
+        for (client_id,) in db.session.query(Client.id).order_by(Client.id):
+            diff = verify_engagement_summary(client_id)
+            if diff:
+                mismatched += 1
+                print(f"Client {client_id}: {diff}")
+        print(f"{mismatched} client(s) with inconsistent engagement summaries")
+        return mismatched
+
+
+if __name__ == '__main__':
+    if '--verify' in sys.argv:
+        sys.exit(1 if verify_engagement_summaries() else 0)
+    rebuild_engagement_summaries()
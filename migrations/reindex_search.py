@@ -0,0 +1,29 @@
+"""
+Rebuild the Elasticsearch clients index from the database, streaming clients
+with their check-in stats in chunks. Usage:
+
+    python migrations/reindex_search.py [--chunk-size N]
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from new_backend import app, search_manager
+
+
+def reindex_clients(chunk_size=500):
+    """Reindex every client; returns the number of failed documents"""
+    with app.app_context():
+        if search_manager.es is None:
+            print("Elasticsearch is not available - nothing to reindex")
+            return 1
+        indexed, failed = search_manager.reindex_clients(chunk_size=chunk_size)
+        print(f"Indexed {indexed} clients ({failed} failed)")
+        return failed
+
+
+if __name__ == '__main__':
+    chunk_size = 500
+    if '--chunk-size' in sys.argv:
+        chunk_size = int(sys.argv[sys.argv.index('--chunk-size') + 1])
+    sys.exit(1 if reindex_clients(chunk_size) else 0)
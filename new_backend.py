@@ -10,19 +10,20 @@ import secrets
 import json
 import time
 import uuid
+import socket
 import html
 import bleach
 import redis
-import smtplib
 import openpyxl
 import jwt
 import logging
 import traceback
 import signal
+import atexit
 from pathlib import Path
 from datetime import datetime, date, timedelta
 from functools import wraps, lru_cache
-from threading import Thread
+from threading import Thread, Lock, Event
 from io import BytesIO
 
 # Flask imports
@@ -42,13 +43,23 @@ from werkzeug.utils import secure_filename
 from markupsafe import escape, Markup
 
 # Database imports
-from sqlalchemy import text, and_, or_, func
+from sqlalchemy import text, and_, or_, func, case, literal_column, true, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert, JSONB, aggregate_order_by
 
 # Email imports
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
+import smtp_delivery
+
+# Numeric analysis
+import numpy as np
+from insight_engine import (WindowBatch, build_insights, triage_scores, rank_within_groups,
+                            RULES as INSIGHT_RULES, MIN_CHECKINS as INSIGHT_MIN_CHECKINS,
+                            PRIORITY_ORDER as INSIGHT_PRIORITY_ORDER)
+from client_search import NgramIndex, PrefixIndex, IndexCache as NgramIndexCache
+from reminder_schedule import get_zone, fire_spec, next_fire_at as next_reminder_fire_at
 
 # Excel imports
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
@@ -107,6 +118,10 @@ logger.setLevel(logging.INFO)
 if os.environ.get('PRODUCTION'):
     logging.getLogger('werkzeug').setLevel(logging.WARNING)
 
+# Celery worker children import this module for its models and domain functions
+# only (see celery_app.bootstrap_worker); web-only setup is skipped for them
+WORKER_MODE = os.environ.get('APP_ROLE') == 'worker'
+
 # === CONSTANTS AND CONFIGURATION ===
 JWT_SECRET = os.environ.get('SECRET_KEY', 'your-secret-key')
 JWT_ALGORITHM = 'HS256'
@@ -159,10 +174,10 @@ import pickle
 class QueueManager:
     """Manage message queue operations with graceful fallback"""
     
-    def __init__(self):
+    def __init__(self, connect=True):
         self.connection = None
         self.channel = None
-        rabbitmq_url = os.environ.get('RABBITMQ_URL')
+        rabbitmq_url = os.environ.get('RABBITMQ_URL') if connect else None
         
         if rabbitmq_url:
             try:
@@ -181,7 +196,7 @@ class QueueManager:
             except Exception as e:
                 logger.warning(f"RabbitMQ not available, using direct processing: {e}")
                 self.channel = None
-        else:
+        elif connect:
             logger.info("RabbitMQ URL not configured, using direct processing")
     
     def publish(self, queue_name, message, priority=0):
@@ -210,8 +225,8 @@ class QueueManager:
         return self.channel is not None and self.connection and not self.connection.is_closed
 
 
-# Initialize queue manager (singleton)
-queue_manager = QueueManager()
+# Initialize queue manager (singleton); only the web health check uses it
+queue_manager = QueueManager(connect=not WORKER_MODE)
 
 
 # === CLICKHOUSE ANALYTICS CONFIGURATION ===
@@ -219,21 +234,33 @@ queue_manager = QueueManager()
 class AnalyticsStore:
     """Manage ClickHouse analytics with graceful fallback to PostgreSQL"""
     
-    def __init__(self):
+    def __init__(self, connect=True):
         self.client = None
-        clickhouse_url = os.environ.get('CLICKHOUSE_URL')
+        self.url = os.environ.get('CLICKHOUSE_URL')
         
-        if clickhouse_url:
-            try:
-                from clickhouse_driver import Client
-                self.client = Client.from_url(clickhouse_url)
-                self._create_tables()
-                logger.info("ClickHouse connected successfully")
-            except Exception as e:
-                logger.warning(f"ClickHouse not available, using PostgreSQL: {e}")
-                self.client = None
-        else:
-            logger.info("ClickHouse URL not configured, using PostgreSQL for analytics")
+        if connect:
+            self.connect()
+            if not self.url:
+                logger.info("ClickHouse URL not configured, using PostgreSQL for analytics")
+    
+    @property
+    def configured(self):
+        return bool(self.url)
+    
+    def connect(self):
+        """Open the ClickHouse client if it is configured and not open yet; returns whether it is open"""
+        if self.client or not self.url:
+            return self.client is not None
+        
+        try:
+            from clickhouse_driver import Client
+            self.client = Client.from_url(self.url)
+            self._create_tables()
+            logger.info("ClickHouse connected successfully")
+        except Exception as e:
+            logger.warning(f"ClickHouse not available, using PostgreSQL: {e}")
+            self.client = None
+        return self.client is not None
     
     def _create_tables(self):
         """Create ClickHouse tables for analytics"""
@@ -311,13 +338,35 @@ class AnalyticsStore:
             logger.error(f"Failed to get client trends: {e}")
             return None
     
+    def insert_checkins(self, rows):
+        """Insert many (client_id, therapist_id, checkin_date, category_id, category_name, value) rows at once.
+
+        Network failures are raised as ConnectionError; anything else (a bad row) is raised as is.
+        """
+        if not self.client or not rows:
+            return False
+
+        from clickhouse_driver.errors import NetworkError
+
+        now = datetime.now()
+        try:
+            self.client.execute('''
+                INSERT INTO checkin_analytics
+                (client_id, therapist_id, checkin_date, checkin_time, category_id, category_name, value)
+                VALUES
+            ''', [(client_id, therapist_id, checkin_date, now, category_id, category_name, value)
+                  for client_id, therapist_id, checkin_date, category_id, category_name, value in rows])
+        except (NetworkError, OSError) as e:
+            raise ConnectionError(f"ClickHouse unreachable: {e}") from e
+        return True
+
     def is_available(self):
         """Check if ClickHouse is available"""
         return self.client is not None
 
 
-# Initialize analytics store (singleton)
-analytics_store = AnalyticsStore()
+# Initialize analytics store (singleton); workers connect on first use by the outbox relay
+analytics_store = AnalyticsStore(connect=not WORKER_MODE)
 
 
 # === API GATEWAY / RATE LIMITING CONFIGURATION ===
@@ -885,20 +934,21 @@ CORS(app, supports_credentials=True)
 
 # Initialize CSRF protection
 csrf = CSRFProtect()
-csrf.init_app(app)
-
-# Initialize Talisman with security settings
-Talisman(app,
-         force_https=False if app.debug else True,
-         strict_transport_security={'max_age': 31536000, 'include_subdomains': True},
-         content_security_policy=False,
-         frame_options='SAMEORIGIN',
-         content_security_policy_nonce_in=[]
-         )
-
-# Initialize rate limiter
+if not WORKER_MODE:
+    csrf.init_app(app)
+
+    # Initialize Talisman with security settings
+    Talisman(app,
+             force_https=False if app.debug else True,
+             strict_transport_security={'max_age': 31536000, 'include_subdomains': True},
+             content_security_policy=False,
+             frame_options='SAMEORIGIN',
+             content_security_policy_nonce_in=[]
+             )
+
+# Initialize rate limiter (route decorators still register in workers, nothing enforces them)
 limiter = Limiter(
-    app=app,
+    app=None if WORKER_MODE else app,
     key_func=get_remote_address,
     default_limits=["50000 per day", "10000 per hour"],
     storage_uri="memory://"
@@ -1075,32 +1125,193 @@ except ImportError:
     Elasticsearch = None
 
 
-class SearchManager:
-    """Manage Elasticsearch operations"""
+class BulkIndexer:
+    """Buffer Elasticsearch writes and send them with helpers.bulk.
 
-    def __init__(self):
-        self.es = None
-        if not ELASTICSEARCH_AVAILABLE:
-            logger.warning("Elasticsearch not installed - search will use database fallback")
+    Actions go out when batch_size are queued or every flush_interval
+    seconds from a daemon thread, so request handlers never wait on
+    Elasticsearch and no single write forces a refresh; documents become
+    searchable on the index refresh_interval. While Elasticsearch is down
+    actions stay buffered (up to MAX_BUFFER, oldest dropped first).
+    """
+
+    MAX_BUFFER = 10000
+
+    def __init__(self, get_client, on_failure=None, batch_size=500, flush_interval=2.0):
+        self._get_client = get_client
+        self._on_failure = on_failure
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self._wakeup = Event()
+        self._thread = None
+        self._pid = None
+        self.stats = {'indexed': 0, 'failed': 0, 'dropped': 0}
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def add(self, action):
+        with self._lock:
+            if len(self._buffer) >= self.MAX_BUFFER:
+                self._buffer.pop(0)
+                self.stats['dropped'] += 1
+            self._buffer.append(action)
+            full = len(self._buffer) >= self.batch_size
+        self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def _ensure_thread(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
             return
-        es_url = os.environ.get('ELASTICSEARCH_URL', 'http://localhost:9200')
-        if es_url:
+        with self._lock:
+            if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = Thread(target=self._run, name='es-bulk-indexer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
             try:
-                self.es = Elasticsearch([es_url], timeout=30, max_retries=3)
-                if self.es.ping():
-                    logger.info("Elasticsearch connected successfully")
-                    self._create_indices()
-                else:
-                    logger.warning("Elasticsearch ping failed")
-                    self.es = None
+                self.flush()
+            except Exception as e:
+                logger.error(f"Elasticsearch bulk flush failed: {e}")
+
+    def flush(self):
+        """Send everything buffered; returns the number of documents indexed"""
+        with self._flush_lock:
+            es = self._get_client()
+            if es is None:
+                return 0
+
+            with self._lock:
+                actions, self._buffer = self._buffer, []
+            if not actions:
+                return 0
+
+            try:
+                indexed, errors = elasticsearch.helpers.bulk(es, actions, raise_on_error=False)
             except Exception as e:
-                logger.error(f"Elasticsearch connection failed: {e}")
-                self.es = None
+                # Connection-level failure: put the batch back in front and let the manager reconnect
+                with self._lock:
+                    self._buffer[:0] = actions[-self.MAX_BUFFER:]
+                if self._on_failure:
+                    self._on_failure(e)
+                raise
+
+            self.stats['indexed'] += indexed
+            if errors:
+                self.stats['failed'] += len(errors)
+                logger.warning(f"Elasticsearch rejected {len(errors)} of {len(actions)} documents: {errors[:3]}")
+            return indexed
+
+    def close(self):
+        """Best-effort flush of whatever is still buffered, for interpreter exit"""
+        if not self._buffer:
+            return
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning(f"Dropping {len(self._buffer)} unsent Elasticsearch actions: {e}")
+
+
+class SearchManager:
+    """Manage Elasticsearch operations.
+
+    Nothing connects at import time. The first use of .es runs one short
+    probe; if that fails, .es stays None (callers use the database
+    fallback) while a daemon thread retries with exponential backoff.
+    Pass client= to use a prebuilt or fake Elasticsearch client.
+    """
+
+    PROBE_TIMEOUT = 2
+    REQUEST_TIMEOUT = 10
+    RECONNECT_MIN_DELAY = 5
+    RECONNECT_MAX_DELAY = 300
+
+    def __init__(self, url=None, client=None):
+        self.url = url or os.environ.get('ELASTICSEARCH_URL')
+        self.refresh_interval = os.environ.get('ELASTICSEARCH_REFRESH_INTERVAL', '5s')
+        self._client = client
+        self._es = None
+        self._probed = False
+        self._lock = Lock()
+        self._reconnect_thread = None
+        self.indexer = BulkIndexer(lambda: self.es, on_failure=self.mark_unavailable)
+
+        if client is None and not ELASTICSEARCH_AVAILABLE:
+            logger.warning("Elasticsearch not installed - search will use database fallback")
+        elif not self.configured:
+            logger.info("Elasticsearch URL not configured - search will use database fallback")
+
+    @property
+    def configured(self):
+        return self._client is not None or bool(self.url and ELASTICSEARCH_AVAILABLE)
+
+    @property
+    def es(self):
+        if self._es is None and not self._probed:
+            self._probe_once()
+        return self._es
+
+    def _connect(self):
+        """One bounded connection attempt; returns True once connected"""
+        try:
+            client = self._client or Elasticsearch(
+                [self.url], timeout=self.REQUEST_TIMEOUT, max_retries=1, retry_on_timeout=False)
+            if not client.ping(request_timeout=self.PROBE_TIMEOUT):
+                raise ConnectionError('ping failed')
+            self._es = client
+            self._create_indices()
+            logger.info("Elasticsearch connected successfully")
+            return True
+        except Exception as e:
+            logger.warning(f"Elasticsearch unavailable: {e}")
+            self._es = None
+            return False
+
+    def _probe_once(self):
+        with self._lock:
+            if self._probed:
+                return
+            self._probed = True
+            if self.configured and not self._connect():
+                self._start_reconnect()
+
+    def _start_reconnect(self):
+        if self._reconnect_thread and self._reconnect_thread.is_alive():
+            return
+        self._reconnect_thread = Thread(target=self._reconnect_loop, name='es-reconnect', daemon=True)
+        self._reconnect_thread.start()
+
+    def _reconnect_loop(self):
+        delay = self.RECONNECT_MIN_DELAY
+        while self._es is None:
+            time.sleep(delay)
+            if self._connect():
+                return
+            delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+
+    def mark_unavailable(self, error=None):
+        """Drop the connection after a failed call and reconnect in the background"""
+        if self._es is None:
+            return
+        logger.warning(f"Elasticsearch connection lost, reconnecting in background: {error}")
+        self._es = None
+        self._start_reconnect()
 
     def _create_indices(self):
         """Create indices if they don't exist"""
         indices = {
             'clients': {
+                'settings': {'refresh_interval': self.refresh_interval},
                 'mappings': {
                     'properties': {
                         'client_id': {'type': 'integer'},
@@ -1137,41 +1348,130 @@ class SearchManager:
         }
 
         for index_name, index_config in indices.items():
-            if not self.es.indices.exists(index=index_name):
-                self.es.indices.create(index=index_name, body=index_config)
+            if not self._es.indices.exists(index=index_name):
+                self._es.indices.create(index=index_name, body=index_config)
                 logger.info(f"Created Elasticsearch index: {index_name}")
 
+    @staticmethod
+    def client_document(client, checkin_stats=None):
+        doc = {
+            'client_id': client.id,
+            'client_serial': client.client_serial,
+            'client_name': client.client_name or client.client_serial,
+            'therapist_id': client.therapist_id,
+            'start_date': client.start_date.isoformat(),
+            'is_active': client.is_active,
+            'suggest': {
+                'input': [client.client_serial, client.client_name] if client.client_name else [
+                    client.client_serial],
+                'contexts': {'therapist_id': str(client.therapist_id)}
+            }
+        }
+
+        if checkin_stats:
+            doc.update(checkin_stats)
+        return doc
+
     def index_client(self, client, checkin_stats=None):
-        """Index or update client in Elasticsearch"""
-        if not self.es:
+        """Queue a client document for the bulk indexer"""
+        if not self.configured:
             return
 
         try:
-            doc = {
-                'client_id': client.id,
-                'client_serial': client.client_serial,
-                'client_name': client.client_name or client.client_serial,
-                'therapist_id': client.therapist_id,
-                'start_date': client.start_date.isoformat(),
-                'is_active': client.is_active,
-                'suggest': {
-                    'input': [client.client_serial, client.client_name] if client.client_name else [
-                        client.client_serial],
-                    'contexts': {'therapist_id': str(client.therapist_id)}
-                }
-            }
+            self.indexer.add({
+                '_index': 'clients',
+                '_id': client.id,
+                '_source': self.client_document(client, checkin_stats)
+            })
+        except Exception as e:
+            logger.error(f"Error indexing client {client.id}: {e}")
 
-            if checkin_stats:
-                doc.update(checkin_stats)
+    def index_clients_now(self, clients, checkin_stats):
+        """Send client documents with one synchronous helpers.bulk call, bypassing the buffer.
 
-            self.es.index(
-                index='clients',
-                id=client.id,
-                body=doc,
-                refresh=True
-            )
+        Raises unless Elasticsearch accepted every document, for callers that
+        must only record a write as done once it is indexed: ConnectionError
+        when it is unreachable, RuntimeError when documents were rejected.
+        Returns the number indexed.
+        """
+        es = self.es
+        if es is None:
+            raise ConnectionError('Elasticsearch is not available')
+
+        actions = [{
+            '_index': 'clients',
+            '_id': client.id,
+            '_source': self.client_document(client, checkin_stats[client.id])
+        } for client in clients]
+        try:
+            indexed, errors = elasticsearch.helpers.bulk(es, actions, raise_on_error=False)
+        except elasticsearch.ConnectionError as e:
+            self.mark_unavailable(e)
+            raise ConnectionError(f"Elasticsearch unreachable: {e}") from e
         except Exception as e:
-            logger.error(f"Error indexing client {client.id}: {e}")
+            self.mark_unavailable(e)
+            raise
+        if errors:
+            raise RuntimeError(f"Elasticsearch rejected {len(errors)} of {len(actions)} documents: {errors[:3]}")
+        return indexed
+
+    @staticmethod
+    def checkin_stats(client_ids):
+        """{client_id: checkin stats fields} for many clients in one grouped query"""
+        rows = db.session.query(
+            DailyCheckin.client_id,
+            func.max(DailyCheckin.checkin_date),
+            func.count(DailyCheckin.id),
+            func.avg(DailyCheckin.emotional_value),
+            func.avg(DailyCheckin.medication_value)
+        ).filter(DailyCheckin.client_id.in_(client_ids)).group_by(DailyCheckin.client_id).all()
+
+        stats = {client_id: {'last_checkin': None, 'checkin_count': 0, 'avg_emotional': 0, 'avg_medication': 0}
+                 for client_id in client_ids}
+        for client_id, last_checkin, count, avg_emotional, avg_medication in rows:
+            stats[client_id] = {
+                'last_checkin': last_checkin.isoformat() if last_checkin else None,
+                'checkin_count': count,
+                'avg_emotional': round(float(avg_emotional), 2) if avg_emotional is not None else 0,
+                'avg_medication': round(float(avg_medication), 2) if avg_medication is not None else 0
+            }
+        return stats
+
+    def _reindex_actions(self, chunk_size):
+        last_id = 0
+        while True:
+            clients = Client.query.filter(Client.id > last_id).order_by(Client.id).limit(chunk_size).all()
+            if not clients:
+                return
+            stats = self.checkin_stats([client.id for client in clients])
+            for client in clients:
+                yield {
+                    '_index': 'clients',
+                    '_id': client.id,
+                    '_source': self.client_document(client, stats[client.id])
+                }
+            last_id = clients[-1].id
+            db.session.expunge_all()
+
+    def reindex_clients(self, chunk_size=500):
+        """Rebuild the clients index from the database, chunk_size clients at a time.
+
+        Refresh is switched off for the duration and a single refresh runs at
+        the end. Returns (indexed, failed).
+        """
+        es = self.es
+        if es is None:
+            raise RuntimeError('Elasticsearch is not available')
+
+        self.indexer.flush()
+        es.indices.put_settings(index='clients', body={'index': {'refresh_interval': '-1'}})
+        try:
+            indexed, errors = elasticsearch.helpers.bulk(
+                es, self._reindex_actions(chunk_size), chunk_size=chunk_size, raise_on_error=False)
+        finally:
+            es.indices.put_settings(index='clients', body={'index': {'refresh_interval': self.refresh_interval}})
+            es.indices.refresh(index='clients')
+        return indexed, len(errors)
 
     def search_clients(self, therapist_id, query, filters=None):
         """Search clients with autocomplete"""
@@ -1234,6 +1534,8 @@ class SearchManager:
 
         except Exception as e:
             logger.error(f"Error searching clients: {e}")
+            if isinstance(e, elasticsearch.exceptions.ConnectionError):
+                self.mark_unavailable(e)
             return []
 
     def get_analytics(self, therapist_id, date_range):
@@ -1280,8 +1582,236 @@ class SearchManager:
             return {}
 
 
-# Initialize search manager
+# Initialize search manager (connects lazily on first use)
 search_manager = SearchManager()
+atexit.register(search_manager.indexer.close)
+
+
+class ClientSearch:
+    """Database-side client search for when Elasticsearch is unavailable.
+
+    Uses pg_trgm similarity over GIN indexes when the extension is installed
+    (see init_db.add_client_search_indexes) and otherwise a per-therapist
+    in-memory n-gram index. Serial-shaped queries also run an indexed
+    prefix lookup whose hits are listed ahead of the fuzzy matches.
+    search() returns (results, source) where source names the backend(s)
+    that answered.
+    """
+
+    SERIAL_PREFIX_RE = re.compile(r'^C[0-9A-F]*$', re.IGNORECASE)
+    # Names like "Cafe" are valid hex too, so letters-only queries must be this long to count as a serial
+    SERIAL_MIN_LETTERS_ONLY = 6
+
+    def __init__(self, limit=20):
+        self.limit = limit
+        self._trigram_available = None
+        self._indexes = NgramIndexCache(ttl=60)
+
+    def trigram_available(self):
+        """Whether pg_trgm is installed; checked once per process"""
+        if self._trigram_available is None:
+            try:
+                self._trigram_available = db.session.execute(
+                    text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Could not check for pg_trgm, using in-memory client search: {e}")
+                self._trigram_available = False
+        return self._trigram_available
+
+    @property
+    def backend(self):
+        return 'trigram' if self.trigram_available() else 'ngram'
+
+    @staticmethod
+    def _result(client, score=None):
+        result = {
+            'client_id': client.id,
+            'client_serial': client.client_serial,
+            'client_name': client.client_name or client.client_serial,
+            'is_active': client.is_active,
+            'start_date': client.start_date.isoformat()
+        }
+        if score is not None:
+            result['score'] = round(score, 3)
+        return result
+
+    def _base_query(self, therapist_id, active_only):
+        query = db.session.query(
+            Client.id, Client.client_serial, Client.client_name, Client.is_active, Client.start_date
+        ).filter(Client.therapist_id == therapist_id)
+        if active_only:
+            query = query.filter(Client.is_active == True)
+        return query
+
+    def _serial_prefix(self, therapist_id, query, active_only):
+        """Prefix lookup served by idx_clients_therapist_serial_prefix"""
+        pattern = query.upper().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        return self._base_query(therapist_id, active_only).filter(
+            Client.client_serial.like(pattern, escape='\\')
+        ).order_by(Client.client_serial).limit(self.limit).all()
+
+    def _trigram_search(self, therapist_id, query, active_only):
+        pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        name = func.coalesce(Client.client_name, '')
+        score = func.greatest(func.similarity(Client.client_serial, query), func.similarity(name, query))
+        substring = or_(Client.client_serial.ilike(pattern, escape='\\'), name.ilike(pattern, escape='\\'))
+
+        rows = self._base_query(therapist_id, active_only).add_columns(score).filter(
+            or_(substring, Client.client_serial.op('%')(query), name.op('%')(query))
+        ).order_by(
+            case((substring, 0), else_=1),
+            score.desc(),
+            Client.client_serial
+        ).limit(self.limit).all()
+        return [self._result(row, row[-1]) for row in rows]
+
+    def _build_index(self, therapist_id):
+        rows = self._base_query(therapist_id, active_only=False).all()
+        return NgramIndex((row.id, row.client_serial, row.client_name, row) for row in rows)
+
+    def _ngram_search(self, therapist_id, query, active_only):
+        index = self._indexes.get(therapist_id, lambda: self._build_index(therapist_id))
+        hits = index.search(query, self.limit, predicate=(lambda row: row.is_active) if active_only else None)
+        return [self._result(row, score) for _, score, row in hits]
+
+    def forget(self, therapist_id):
+        """Drop this process's cached n-gram index after the therapist's clients change"""
+        self._indexes.discard(therapist_id)
+
+    def looks_like_serial(self, query):
+        return bool(self.SERIAL_PREFIX_RE.match(query)) and (
+            any(char.isdigit() for char in query) or len(query) >= self.SERIAL_MIN_LETTERS_ONLY)
+
+    def search(self, therapist_id, query, active_only=False):
+        if self.trigram_available():
+            results, source = self._trigram_search(therapist_id, query, active_only), 'trigram'
+        else:
+            results, source = self._ngram_search(therapist_id, query, active_only), 'ngram'
+
+        if not self.looks_like_serial(query):
+            return results, source
+
+        prefix_hits = [self._result(row) for row in self._serial_prefix(therapist_id, query, active_only)]
+        if not prefix_hits:
+            return results, source
+        seen = {result['client_id'] for result in prefix_hits}
+        merged = prefix_hits + [result for result in results if result['client_id'] not in seen]
+        return merged[:self.limit], f'serial_prefix+{source}'
+
+
+client_search = ClientSearch()
+
+
+class ClientAutocomplete:
+    """Per-therapist typeahead over client serials and names.
+
+    Each therapist's clients live in a Redis hash (client_id -> serial, name,
+    active) with a version counter. The hash is built from Postgres on first
+    use and patched when clients are created, renamed or deleted. Every
+    process keeps a PrefixIndex per therapist in memory and rechecks the
+    version at most once per VERSION_CHECK_INTERVAL, so a keystroke is a
+    bisect over a sorted list. Without Redis the index is rebuilt from
+    Postgres every LOCAL_TTL seconds.
+    """
+
+    VERSION_CHECK_INTERVAL = 1.0
+    LOCAL_TTL = 60
+    KEY_TTL = 7 * 24 * 3600
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self._local = {}  # therapist_id -> (version, checked_at, PrefixIndex)
+
+    @staticmethod
+    def _keys(therapist_id):
+        return f"autocomplete:{therapist_id}", f"autocomplete:{therapist_id}:version"
+
+    @staticmethod
+    def _load_clients(therapist_id):
+        return [tuple(row) for row in db.session.query(
+            Client.id, Client.client_serial, Client.client_name, Client.is_active
+        ).filter(Client.therapist_id == therapist_id)]
+
+    def _fetch(self, therapist_id):
+        """(version, clients) from Redis, seeding the hash from Postgres when it is missing"""
+        data_key, version_key = self._keys(therapist_id)
+        pipe = self.redis.pipeline()
+        pipe.get(version_key)
+        pipe.hgetall(data_key)
+        version, raw = pipe.execute()
+
+        if version is not None:
+            return int(version), [(int(client_id), *json.loads(entry)) for client_id, entry in raw.items()]
+
+        clients = self._load_clients(therapist_id)
+        pipe = self.redis.pipeline()
+        pipe.delete(data_key)
+        if clients:
+            pipe.hset(data_key, mapping={client_id: json.dumps([serial, name, is_active])
+                                         for client_id, serial, name, is_active in clients})
+        pipe.incr(version_key)
+        pipe.expire(data_key, self.KEY_TTL)
+        pipe.expire(version_key, self.KEY_TTL)
+        version = pipe.execute()[-3]
+        return version, clients
+
+    def index(self, therapist_id):
+        now = time.monotonic()
+        cached = self._local.get(therapist_id)
+        if cached and now - cached[1] < self.VERSION_CHECK_INTERVAL:
+            return cached[2]
+
+        try:
+            version = self.redis.get(self._keys(therapist_id)[1])
+            if cached and version is not None and int(version) == cached[0]:
+                self._local[therapist_id] = (cached[0], now, cached[2])
+                return cached[2]
+            version, clients = self._fetch(therapist_id)
+        except redis.RedisError as e:
+            if cached and cached[0] is None and now - cached[1] < self.LOCAL_TTL:
+                return cached[2]
+            logger.warning(f"Autocomplete falling back to database for therapist {therapist_id}: {e}")
+            version, clients = None, self._load_clients(therapist_id)
+
+        index = PrefixIndex(clients)
+        self._local[therapist_id] = (version, now, index)
+        return index
+
+    def complete(self, therapist_id, prefix, limit=10, active_only=False):
+        return self.index(therapist_id).complete(prefix, limit, active_only)
+
+    def _patch(self, therapist_id, apply):
+        """Apply a change to an existing hash and bump its version; unbuilt hashes are left alone"""
+        data_key, version_key = self._keys(therapist_id)
+        self._local.pop(therapist_id, None)
+        try:
+            if self.redis.exists(version_key):
+                pipe = self.redis.pipeline()
+                apply(pipe, data_key)
+                pipe.incr(version_key)
+                pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Autocomplete update failed for therapist {therapist_id}: {e}")
+
+    def client_saved(self, client):
+        """Call after a client is created or renamed"""
+        entry = json.dumps([client.client_serial, client.client_name, bool(client.is_active)])
+        self._patch(client.therapist_id, lambda pipe, key: pipe.hset(key, client.id, entry))
+
+    def client_removed(self, therapist_id, client_id):
+        self._patch(therapist_id, lambda pipe, key: pipe.hdel(key, client_id))
+
+    def invalidate(self, therapist_id):
+        """Drop the therapist's index everywhere; the next lookup rebuilds it"""
+        self._local.pop(therapist_id, None)
+        try:
+            self.redis.delete(*self._keys(therapist_id))
+        except redis.RedisError as e:
+            logger.warning(f"Autocomplete invalidation failed for therapist {therapist_id}: {e}")
+
+
+client_autocomplete = ClientAutocomplete(redis_client)
 
 
 
@@ -1743,6 +2273,14 @@ class CategoryResponse(db.Model):
     category = db.relationship('TrackingCategory', backref='responses')
     custom_category = db.relationship('CustomCategory', backref='responses')
 
+    # Partial unique indexes backing the check-in upserts (ON CONFLICT targets)
+    __table_args__ = (
+        db.Index('uq_category_resp_default', 'client_id', 'category_id', 'response_date',
+                 unique=True, postgresql_where=db.text('category_id IS NOT NULL')),
+        db.Index('uq_category_resp_custom', 'client_id', 'custom_category_id', 'response_date',
+                 unique=True, postgresql_where=db.text('custom_category_id IS NOT NULL')),
+    )
+
     def validate(self):
         """Ensure exactly one category type is set"""
         if (self.category_id is None) == (self.custom_category_id is None):
@@ -1795,6 +2333,342 @@ class CategoryResponse(db.Model):
         )
 
 
+class CheckinSyncKey(db.Model):
+    """Idempotency keys for batch check-in sync, so client retries are no-ops"""
+    __tablename__ = 'checkin_sync_keys'
+
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id', ondelete='CASCADE'), nullable=False)
+    idempotency_key = db.Column(db.String(64), nullable=False)
+    checkin_date = db.Column(db.Date, nullable=False)
+    checkin_id = db.Column(db.Integer, db.ForeignKey('daily_checkins.id', ondelete='CASCADE'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('client_id', 'idempotency_key'),)
+
+
+class ClientEngagement(db.Model):
+    """Per-client check-in summary maintained on write.
+
+    recent_mask holds one bit per day for the RECENT_DAYS days ending at
+    last_checkin_date (bit 0 is last_checkin_date itself), so rolling counts
+    are answered without touching daily_checkins.
+    """
+    __tablename__ = 'client_engagement'
+
+    RECENT_DAYS = 63
+
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id', ondelete='CASCADE'), primary_key=True)
+    last_checkin_date = db.Column(db.Date)
+    current_run = db.Column(db.Integer, nullable=False, default=0)  # Consecutive days ending at last_checkin_date
+    longest_streak = db.Column(db.Integer, nullable=False, default=0)
+    recent_mask = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    REBUILD_SQL = """
+        WITH numbered AS (
+            SELECT client_id, checkin_date,
+                   checkin_date - CAST(ROW_NUMBER() OVER (
+                       PARTITION BY client_id ORDER BY checkin_date) AS INTEGER) AS grp
+            FROM daily_checkins
+            WHERE {checkin_filter}
+        ), runs AS (
+            SELECT client_id, MAX(checkin_date) AS run_end, COUNT(*) AS run_length
+            FROM numbered
+            GROUP BY client_id, grp
+        ), totals AS (
+            SELECT client_id, MAX(run_end) AS last_date, MAX(run_length) AS longest_streak
+            FROM runs
+            GROUP BY client_id
+        ), masks AS (
+            SELECT n.client_id,
+                   BIT_OR(CAST(1 AS BIGINT) << (t.last_date - n.checkin_date)) AS recent_mask
+            FROM numbered n
+            JOIN totals t ON t.client_id = n.client_id
+            WHERE t.last_date - n.checkin_date < :recent_days
+            GROUP BY n.client_id
+        )
+        INSERT INTO client_engagement
+            (client_id, last_checkin_date, current_run, longest_streak, recent_mask, updated_at)
+        SELECT c.id, t.last_date, COALESCE(r.run_length, 0), COALESCE(t.longest_streak, 0),
+               COALESCE(m.recent_mask, 0), :now
+        FROM clients c
+        LEFT JOIN totals t ON t.client_id = c.id
+        LEFT JOIN runs r ON r.client_id = c.id AND r.run_end = t.last_date
+        LEFT JOIN masks m ON m.client_id = c.id
+        WHERE {client_filter}
+        ON CONFLICT (client_id) DO UPDATE SET
+            last_checkin_date = EXCLUDED.last_checkin_date,
+            current_run = EXCLUDED.current_run,
+            longest_streak = EXCLUDED.longest_streak,
+            recent_mask = EXCLUDED.recent_mask,
+            updated_at = EXCLUDED.updated_at
+    """
+
+    @classmethod
+    def rebuild(cls, client_ids=None):
+        """Recompute summaries from daily_checkins in one statement.
+
+        Pass None to rebuild every client (backfill); the caller commits.
+        """
+        params = {'recent_days': cls.RECENT_DAYS, 'now': datetime.utcnow()}
+        if client_ids is None:
+            sql = cls.REBUILD_SQL.format(checkin_filter='TRUE', client_filter='TRUE')
+        else:
+            client_ids = list(client_ids)
+            if not client_ids:
+                return
+            sql = cls.REBUILD_SQL.format(checkin_filter='client_id = ANY(:client_ids)',
+                                         client_filter='c.id = ANY(:client_ids)')
+            params['client_ids'] = client_ids
+        db.session.execute(text(sql), params)
+
+    @classmethod
+    def record_checkins(cls, client_id, new_dates):
+        """Fold newly created check-in dates into the client's summary.
+
+        Dates after the last check-in are applied in O(1); a backfill that
+        lands before it can join or split runs, so it falls back to a rebuild.
+        """
+        if not new_dates:
+            return
+
+        summary = cls.query.filter_by(client_id=client_id).with_for_update().first()
+        if summary is None:
+            cls.rebuild([client_id])
+            return
+
+        for checkin_date in sorted(set(new_dates)):
+            if not summary.advance(checkin_date):
+                cls.rebuild([client_id])
+                db.session.expire(summary)
+                return
+
+    def advance(self, checkin_date):
+        """Apply one check-in day in place; returns False when a rebuild is needed"""
+        last = self.last_checkin_date
+        if last is None:
+            self.last_checkin_date = checkin_date
+            self.current_run = 1
+            self.recent_mask = 1
+        elif checkin_date > last:
+            gap = (checkin_date - last).days
+            self.current_run = self.current_run + 1 if gap == 1 else 1
+            if gap < self.RECENT_DAYS:
+                self.recent_mask = ((self.recent_mask << gap) | 1) & ((1 << self.RECENT_DAYS) - 1)
+            else:
+                self.recent_mask = 1
+            self.last_checkin_date = checkin_date
+        elif checkin_date == last:
+            return True
+        else:
+            return False
+        self.longest_streak = max(self.longest_streak or 0, self.current_run)
+        return True
+
+    @classmethod
+    def load(cls, client_ids):
+        """Return {client_id: ClientEngagement}, rebuilding any missing rows"""
+        client_ids = list(client_ids)
+        if not client_ids:
+            return {}
+        summaries = {row.client_id: row for row in cls.query.filter(cls.client_id.in_(client_ids))}
+        missing = [client_id for client_id in client_ids if client_id not in summaries]
+        if missing:
+            cls.rebuild(missing)
+            db.session.commit()
+            summaries.update({row.client_id: row for row in cls.query.filter(cls.client_id.in_(missing))})
+        return summaries
+
+    def count_since(self, start_date, today=None):
+        """Number of check-in days from start_date through today (at most RECENT_DAYS back)"""
+        today = today or date.today()
+        if not self.last_checkin_date:
+            return 0
+        # Bit i is last_checkin_date - i days; keep the bits that fall in [start_date, today]
+        low = max((self.last_checkin_date - today).days, 0)
+        high = min((self.last_checkin_date - start_date).days, self.RECENT_DAYS - 1)
+        if high < low:
+            return 0
+        return bin((self.recent_mask >> low) & ((1 << (high - low + 1)) - 1)).count('1')
+
+    def current_streak(self, today=None):
+        """Consecutive check-in days ending today (0 if today has no check-in)"""
+        today = today or date.today()
+        return self.current_run if self.last_checkin_date == today else 0
+
+    def to_dict(self, today=None):
+        today = today or date.today()
+        return {
+            'current_streak': self.current_streak(today),
+            'longest_streak': self.longest_streak,
+            'last_checkin_date': self.last_checkin_date.isoformat() if self.last_checkin_date else None,
+            'checkins_7d': self.count_since(today - timedelta(days=6), today),
+            'checkins_30d': self.count_since(today - timedelta(days=29), today)
+        }
+
+
+def verify_engagement_summary(client_id, today=None):
+    """Compare a stored engagement summary against a full recount.
+
+    Returns a dict of {field: (stored, expected)} for every mismatch; empty
+    when the summary is consistent.
+    """
+    today = today or date.today()
+    dates = sorted(row[0] for row in db.session.query(DailyCheckin.checkin_date).filter(
+        DailyCheckin.client_id == client_id
+    ))
+    date_set = set(dates)
+
+    longest = run = 0
+    previous = None
+    for checkin_date in dates:
+        run = run + 1 if previous and (checkin_date - previous).days == 1 else 1
+        longest = max(longest, run)
+        previous = checkin_date
+
+    streak = 0
+    day = today
+    while day in date_set:
+        streak += 1
+        day -= timedelta(days=1)
+
+    expected = {
+        'current_streak': streak,
+        'longest_streak': longest,
+        'last_checkin_date': dates[-1].isoformat() if dates else None,
+        'checkins_7d': sum(1 for d in dates if today - timedelta(days=6) <= d <= today),
+        'checkins_30d': sum(1 for d in dates if today - timedelta(days=29) <= d <= today)
+    }
+
+    summary = ClientEngagement.query.get(client_id)
+    stored = summary.to_dict(today) if summary else {}
+    return {field: (stored.get(field), value) for field, value in expected.items()
+            if stored.get(field) != value}
+
+
+class ClientDailyRollup(db.Model):
+    """One row per client and day with every category value packed together.
+
+    category_values maps the category key used by the check-in API
+    ('<category_id>' or 'custom_<id>') to the day's value. mean_mood is the
+    day's average with reverse-scored categories inverted, and flags holds
+    the FLAG_* bits below.
+    """
+    __tablename__ = 'client_daily_rollups'
+
+    FLAG_LOW_MOOD = 1
+    FLAG_MISSED_MEDICATION = 2
+    FLAG_POOR_SLEEP = 4
+
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id', ondelete='CASCADE'), primary_key=True)
+    rollup_date = db.Column(db.Date, primary_key=True)
+    category_values = db.Column(JSONB, nullable=False, default=dict)
+    mean_mood = db.Column(db.Float)
+    flags = db.Column(db.SmallInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    REBUILD_SQL = """
+        INSERT INTO client_daily_rollups
+            (client_id, rollup_date, category_values, mean_mood, flags, updated_at)
+        SELECT r.client_id, r.response_date,
+               jsonb_object_agg(COALESCE(CAST(r.category_id AS TEXT), 'custom_' || r.custom_category_id), r.value),
+               AVG(CASE WHEN COALESCE(cc.reverse_scoring, tc.name ILIKE '%anxiety%')
+                        THEN LEAST(6 - r.value, 5) ELSE r.value END),
+               BIT_OR(
+                   CASE WHEN tc.name ILIKE '%emotion%' AND r.value <= 2 THEN 1 ELSE 0 END
+                   | CASE WHEN tc.name ILIKE '%medication%' AND r.value < 3 THEN 2 ELSE 0 END
+                   | CASE WHEN tc.name ILIKE '%sleep%' AND r.value <= 2 THEN 4 ELSE 0 END),
+               :now
+        FROM category_responses r
+        LEFT JOIN tracking_categories tc ON tc.id = r.category_id
+        LEFT JOIN custom_categories cc ON cc.id = r.custom_category_id
+        WHERE {client_filter}
+        GROUP BY r.client_id, r.response_date
+        ON CONFLICT (client_id, rollup_date) DO UPDATE SET
+            category_values = EXCLUDED.category_values,
+            mean_mood = EXCLUDED.mean_mood,
+            flags = EXCLUDED.flags,
+            updated_at = EXCLUDED.updated_at
+    """
+
+    @classmethod
+    def derive(cls, values, names, reverse_keys=()):
+        """Compute (mean_mood, flags) for one day.
+
+        values maps category key -> value, names maps default category keys
+        to their TrackingCategory name and reverse_keys lists the keys scored
+        in reverse (lower is better).
+        """
+        if not values:
+            return None, 0
+
+        scores = [min(6 - value, 5) if key in reverse_keys else value for key, value in values.items()]
+        flags = 0
+        for key, value in values.items():
+            name = names.get(key, '').lower()
+            if 'emotion' in name and value <= 2:
+                flags |= cls.FLAG_LOW_MOOD
+            elif 'medication' in name and value < 3:
+                flags |= cls.FLAG_MISSED_MEDICATION
+            elif 'sleep' in name and value <= 2:
+                flags |= cls.FLAG_POOR_SLEEP
+        return sum(scores) / len(scores), flags
+
+    @classmethod
+    def rebuild(cls, client_ids=None):
+        """Recompute rollups from category_responses; the caller commits"""
+        params = {'now': datetime.utcnow()}
+        if client_ids is None:
+            sql = cls.REBUILD_SQL.format(client_filter='TRUE')
+        else:
+            client_ids = list(client_ids)
+            if not client_ids:
+                return
+            sql = cls.REBUILD_SQL.format(client_filter='r.client_id = ANY(:client_ids)')
+            params['client_ids'] = client_ids
+        db.session.execute(text(sql), params)
+
+    @staticmethod
+    def series(columns, key):
+        """Return (dates, values) for one category from read_columns output, skipping unanswered days"""
+        values = columns['categories'].get(str(key))
+        if values is None:
+            return columns['dates'][:0], np.empty(0)
+        answered = ~np.isnan(values)
+        return columns['dates'][answered], values[answered]
+
+    @classmethod
+    def read_columns(cls, client_id, start_date, end_date):
+        """Read a date range as columnar NumPy arrays in one indexed range scan.
+
+        Returns a dict with 'dates' (datetime64[D]), 'mean_mood' (float, NaN
+        when unknown), 'flags' (uint8) and 'categories', a dict of category
+        key -> float array aligned with 'dates' (NaN where not answered).
+        Only days with a rollup row are included.
+        """
+        rows = db.session.query(
+            cls.rollup_date, cls.category_values, cls.mean_mood, cls.flags
+        ).filter(
+            cls.client_id == client_id,
+            cls.rollup_date.between(start_date, end_date)
+        ).order_by(cls.rollup_date).all()
+
+        count = len(rows)
+        columns = {
+            'dates': np.array([row[0] for row in rows], dtype='datetime64[D]'),
+            'mean_mood': np.array([np.nan if row[2] is None else row[2] for row in rows], dtype=float),
+            'flags': np.array([row[3] or 0 for row in rows], dtype=np.uint8),
+            'categories': {}
+        }
+        categories = columns['categories']
+        for position, row in enumerate(rows):
+            for key, value in (row[1] or {}).items():
+                if key not in categories:
+                    categories[key] = np.full(count, np.nan)
+                categories[key][position] = value
+        return columns
+
 
 class GoalCompletion(db.Model):
     __tablename__ = 'goal_completions'
@@ -1822,6 +2696,19 @@ class Reminder(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     last_sent = db.Column(db.DateTime)
     day_of_week = db.Column(db.Integer, default=1)
+    timezone = db.Column(db.String(64))  # IANA zone the local time is in; None for legacy fixed-UTC reminders
+    next_fire_at = db.Column(db.DateTime)  # next due instant (UTC), see reminder_schedule
+
+    __table_args__ = (
+        db.Index('idx_reminders_due', 'next_fire_at',
+                 postgresql_where=db.text("is_active AND reminder_type = 'daily_checkin'")),
+    )
+
+    def schedule_next(self, after=None):
+        """Set next_fire_at to the first fire time after `after` (default now)"""
+        local_time, zone = fire_spec(self.timezone, self.local_reminder_time, self.reminder_time)
+        self.next_fire_at = next_reminder_fire_at(local_time, zone, after or datetime.utcnow())
+        return self.next_fire_at
 
 class EmailQueue(db.Model):
     """Queue for email sending with retry logic"""
@@ -1838,6 +2725,9 @@ class EmailQueue(db.Model):
     sent_at = db.Column(db.DateTime)
     last_attempt_at = db.Column(db.DateTime)
     error_message = db.Column(db.Text)
+    lease_expires_at = db.Column(db.DateTime)  # set while a consumer holds the row
+    leased_by = db.Column(db.String(100))
+    priority = db.Column(db.String(20), default='transactional')  # critical, transactional, bulk
     
     def __repr__(self):
         return f'<EmailQueue {self.id}: {self.to_email} - {self.status}>'
@@ -1935,44 +2825,292 @@ class TherapistNotification(db.Model):
     client = db.relationship('Client')
 
 
-class ConsentRecord(db.Model):
-    __tablename__ = 'consent_records'
+class ClientInsight(db.Model):
+    """Latest outcome of one insight rule for a client over one analysis window.
+
+    Every rule gets a row on each refresh (is_active says whether it fired),
+    so the id stays stable across refreshes and a dismissal sticks until the
+    rule stops firing.
+    """
+    __tablename__ = 'client_insights'
 
     id = db.Column(db.Integer, primary_key=True)
-    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False)
-    consent_type = db.Column(db.String(50), nullable=False)  # 'data_sharing', 'treatment', 'communication'
-    consent_version = db.Column(db.String(20), nullable=False)
-    consented = db.Column(db.Boolean, nullable=False)
-    consent_date = db.Column(db.DateTime, default=datetime.utcnow)
-    ip_address = db.Column(db.String(45))
-    withdrawal_date = db.Column(db.DateTime)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id', ondelete='CASCADE'), nullable=False)
+    rule = db.Column(db.String(50), nullable=False)
+    window_days = db.Column(db.Integer, nullable=False)
+    is_active = db.Column(db.Boolean, nullable=False, default=False)
+    priority = db.Column(db.String(20))
+    payload = db.Column(db.JSON)
+    first_seen_at = db.Column(db.DateTime)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    dismissed_at = db.Column(db.DateTime)
+    dismissed_by = db.Column(db.Integer, db.ForeignKey('users.id'))
 
-    client = db.relationship('Client', backref='consents')
+    __table_args__ = (
+        db.UniqueConstraint('client_id', 'rule', 'window_days'),
+        db.Index('idx_client_insights_open', 'client_id', 'window_days', 'is_active'),
+    )
 
+    @property
+    def insight_id(self):
+        return f"{self.client_id}_{self.rule}_{self.window_days}"
 
+    @staticmethod
+    def parse_insight_id(insight_id):
+        """Split an insight id into (client_id, rule, window_days); None if malformed"""
+        client_id, _, rest = insight_id.partition('_')
+        rule, _, window_days = rest.rpartition('_')
+        if not (client_id.isdigit() and window_days.isdigit() and rule):
+            return None
+        return int(client_id), rule, int(window_days)
+
+    def to_dict(self):
+        data = dict(self.payload or {})
+        data.update({
+            'id': self.insight_id,
+            'client_id': self.client_id,
+            'rule': self.rule,
+            'priority': self.priority,
+            'first_seen_at': self.first_seen_at.isoformat() if self.first_seen_at else None,
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None
+        })
+        return data
 
 
+class ClientTriage(db.Model):
+    """A client's place in their therapist's attention-ranked list, written by the triage scan"""
+    __tablename__ = 'client_triage'
 
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id', ondelete='CASCADE'), primary_key=True)
+    therapist_id = db.Column(db.Integer, db.ForeignKey('therapists.id', ondelete='CASCADE'), nullable=False)
+    rank = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Integer, nullable=False, default=0)
+    critical_count = db.Column(db.SmallInteger, nullable=False, default=0)
+    warning_count = db.Column(db.SmallInteger, nullable=False, default=0)
+    rules = db.Column(db.JSON)
+    checkin_count = db.Column(db.Integer, nullable=False, default=0)
+    window_days = db.Column(db.Integer, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('idx_client_triage_rank', 'therapist_id', 'rank'),
+    )
 
+    def to_dict(self):
+        return {
+            'client_id': self.client_id,
+            'rank': self.rank,
+            'score': self.score,
+            'critical_count': self.critical_count,
+            'warning_count': self.warning_count,
+            'rules': self.rules or [],
+            'checkin_count': self.checkin_count,
+            'window_days': self.window_days,
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None
+        }
 
 
-def log_audit(action, resource_type=None, resource_id=None, details=None, phi_accessed=False):
-    """Log an audit trail entry for HIPAA compliance"""
-    try:
-        audit = AuditLog(
-            user_id=request.current_user.id if hasattr(request, 'current_user') else None,
-            user_email=request.current_user.email if hasattr(request, 'current_user') else 'system',
-            action=action,
-            resource_type=resource_type,
-            resource_id=resource_id,
-            ip_address=request.remote_addr,
-            user_agent=request.headers.get('User-Agent', '')[:500],
-            details=details,
-            phi_accessed=phi_accessed
-        )
-        db.session.add(audit)
-        db.session.commit()
+class WeeklyReportDelivery(db.Model):
+    """One therapist's weekly report for one week.
+
+    The hourly dispatcher inserts a row per due therapist and week (the
+    unique key makes re-dispatch harmless); the per-therapist subtask claims
+    it, records rendering progress and settles it as sent, skipped or failed.
+    """
+    __tablename__ = 'weekly_report_deliveries'
+
+    # A row still 'rendering' after this long belongs to a worker that died
+    STALE_AFTER = timedelta(minutes=30)
+
+    id = db.Column(db.Integer, primary_key=True)
+    therapist_id = db.Column(db.Integer, db.ForeignKey('therapists.id', ondelete='CASCADE'), nullable=False)
+    week_start = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, rendering, sent, skipped, failed
+    clients_total = db.Column(db.Integer, nullable=False, default=0)
+    clients_rendered = db.Column(db.Integer, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    task_id = db.Column(db.String(155))
+    error_message = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.UniqueConstraint('therapist_id', 'week_start', name='uq_weekly_report_delivery'),
+        db.Index('idx_weekly_report_status', 'status', 'created_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'week_start': self.week_start.isoformat(),
+            'status': self.status,
+            'clients_total': self.clients_total,
+            'clients_rendered': self.clients_rendered,
+            'attempts': self.attempts,
+            'error': self.error_message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class ClientInactivityAlert(db.Model):
+    """Last inactivity alert sent to the therapist about a client.
+
+    A client is alerted once per stretch of inactivity: again only after a
+    new check-in has ended that stretch, or after REALERT_AFTER if they are
+    still inactive.
+    """
+    __tablename__ = 'client_inactivity_alerts'
+
+    REALERT_AFTER = timedelta(days=7)
+
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id', ondelete='CASCADE'), primary_key=True)
+    therapist_id = db.Column(db.Integer, db.ForeignKey('therapists.id', ondelete='CASCADE'), nullable=False)
+    last_checkin_date = db.Column(db.Date)  # As of the alert; None if the client never checked in
+    alerted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    alert_count = db.Column(db.Integer, nullable=False, default=1)
+
+
+class PeriodicTaskRun(db.Model):
+    """One scheduled firing of a periodic Celery task.
+
+    Written by celery_app.single_run: a run that got the task's lease lock
+    goes running -> succeeded/failed with its duration and result summary;
+    a firing that found the lock held, or its schedule slot already run, is
+    recorded as skipped.
+    """
+    __tablename__ = 'periodic_task_runs'
+
+    # Older history is pruned as new runs finish
+    RETENTION = timedelta(days=30)
+
+    id = db.Column(db.Integer, primary_key=True)
+    task_name = db.Column(db.String(155), nullable=False)
+    slot = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, succeeded, failed, skipped
+    worker = db.Column(db.String(155))
+    task_id = db.Column(db.String(155))
+    lease_lost = db.Column(db.Boolean, nullable=False, default=False)
+    result = db.Column(JSONB)
+    error_message = db.Column(db.Text)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    duration_ms = db.Column(db.Integer)
+
+    __table_args__ = (
+        db.Index('idx_periodic_task_runs_task', 'task_name', 'started_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'task': self.task_name,
+            'slot': self.slot.isoformat(),
+            'status': self.status,
+            'worker': self.worker,
+            'task_id': self.task_id,
+            'lease_lost': self.lease_lost,
+            'result': self.result,
+            'error': self.error_message,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration_ms': self.duration_ms
+        }
+
+
+class OutboxEvent(db.Model):
+    """A side effect of a committed write, inserted in the same transaction as the write.
+
+    txid is the inserting transaction's id; OutboxRelay delivers events in
+    (txid, id) order and only once every transaction with a lower txid has
+    finished, so an event whose transaction commits late is never skipped.
+    """
+    __tablename__ = 'outbox_events'
+
+    # Events every consumer has processed are pruned after this long
+    RETENTION = timedelta(days=3)
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    txid = db.Column(db.BigInteger, nullable=False, server_default=text('txid_current()'))
+    event_type = db.Column(db.String(50), nullable=False)
+    aggregate_id = db.Column(db.Integer)
+    payload = db.Column(JSONB, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_outbox_events_order', 'txid', 'id'),
+        db.Index('idx_outbox_events_created', 'created_at'),
+    )
+
+
+class OutboxCursor(db.Model):
+    """How far one outbox consumer has got: the (txid, id) of the last event it processed"""
+    __tablename__ = 'outbox_cursors'
+
+    consumer = db.Column(db.String(50), primary_key=True)
+    last_txid = db.Column(db.BigInteger, nullable=False, default=0)
+    last_event_id = db.Column(db.BigInteger, nullable=False, default=0)
+    delivered = db.Column(db.BigInteger, nullable=False, default=0)
+    failures = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class OutboxDeadLetter(db.Model):
+    """Copy of an outbox event one consumer gave up on after OutboxRelay.MAX_FAILURES attempts"""
+    __tablename__ = 'outbox_dead_letters'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    consumer = db.Column(db.String(50), nullable=False, index=True)
+    event_id = db.Column(db.BigInteger, nullable=False)
+    event_type = db.Column(db.String(50), nullable=False)
+    aggregate_id = db.Column(db.Integer)
+    payload = db.Column(JSONB, nullable=False)
+    error = db.Column(db.Text)
+    failures = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ConsentRecord(db.Model):
+    __tablename__ = 'consent_records'
+
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False)
+    consent_type = db.Column(db.String(50), nullable=False)  # 'data_sharing', 'treatment', 'communication'
+    consent_version = db.Column(db.String(20), nullable=False)
+    consented = db.Column(db.Boolean, nullable=False)
+    consent_date = db.Column(db.DateTime, default=datetime.utcnow)
+    ip_address = db.Column(db.String(45))
+    withdrawal_date = db.Column(db.DateTime)
+
+    client = db.relationship('Client', backref='consents')
+
+
+
+
+
+
+
+
+
+def log_audit(action, resource_type=None, resource_id=None, details=None, phi_accessed=False):
+    """Log an audit trail entry for HIPAA compliance"""
+    try:
+        audit = AuditLog(
+            user_id=request.current_user.id if hasattr(request, 'current_user') else None,
+            user_email=request.current_user.email if hasattr(request, 'current_user') else 'system',
+            action=action,
+            resource_type=resource_type,
+            resource_id=resource_id,
+            ip_address=request.remote_addr,
+            user_agent=request.headers.get('User-Agent', '')[:500],
+            details=details,
+            phi_accessed=phi_accessed
+        )
+        db.session.add(audit)
+        db.session.commit()
     except Exception as e:
         logger.error(f"Failed to log audit: {e}")
 
@@ -2149,100 +3287,211 @@ def generate_client_serial():
     return f'C{unique_id}{timestamp}'
 
 
-class EmailCircuitBreaker:
-    """Circuit breaker for email service with persistent state"""
+class CircuitBreaker:
+    """Circuit breaker shared by every process through one Redis hash.
 
-    def __init__(self, failure_threshold=5, recovery_timeout=60):
+    closed -> open after failure_threshold consecutive failures; open ->
+    half_open once recovery_timeout has passed, letting exactly one caller
+    (cluster-wide) through as a probe; the probe's success closes the
+    breaker and its failure re-opens it. A probe that never reports back
+    frees the slot after probe_timeout. Outcomes reported with probe=False
+    (calls admitted while closed that finish late) are counted but never
+    move a half-open breaker. Every step is a Lua script timed by the Redis
+    clock, so workers always agree on the state.
+
+    Postgres (circuit_breaker_state) is written only on transitions, by the
+    caller that caused them, and is read back to seed Redis if the hash is
+    missing. If Redis is unreachable calls are allowed through.
+    """
+
+    ALLOW_SCRIPT = """
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+    local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+    if state == 'closed' then
+        return {1, state, 0}
+    end
+    if state == 'open' then
+        local opened_at = tonumber(redis.call('HGET', KEYS[1], 'opened_at')) or 0
+        if now - opened_at < tonumber(ARGV[1]) then
+            redis.call('HINCRBY', KEYS[1], 'rejected', 1)
+            return {0, state, 0}
+        end
+        redis.call('HSET', KEYS[1], 'state', 'half_open', 'probe_until', tostring(now + tonumber(ARGV[2])))
+        return {1, 'half_open', 1}
+    end
+    local probe_until = tonumber(redis.call('HGET', KEYS[1], 'probe_until')) or 0
+    if now < probe_until then
+        redis.call('HINCRBY', KEYS[1], 'rejected', 1)
+        return {0, state, 0}
+    end
+    redis.call('HSET', KEYS[1], 'probe_until', tostring(now + tonumber(ARGV[2])))
+    return {1, state, 0}
+    """
+
+    SUCCESS_SCRIPT = """
+    local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+    redis.call('HINCRBY', KEYS[1], 'successes', 1)
+    if state == 'half_open' and ARGV[1] == '1' then
+        redis.call('HSET', KEYS[1], 'state', 'closed', 'failures', 0, 'probe_until', 0)
+        return {'closed', 1, 0}
+    end
+    if state == 'closed' then
+        redis.call('HSET', KEYS[1], 'failures', 0)
+    end
+    return {state, 0, 0}
+    """
+
+    FAILURE_SCRIPT = """
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+    local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+    local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+    redis.call('HINCRBY', KEYS[1], 'failures_total', 1)
+    redis.call('HSET', KEYS[1], 'last_failure_at', tostring(now))
+    if (state == 'half_open' and ARGV[2] == '1') or (state == 'closed' and failures >= tonumber(ARGV[1])) then
+        redis.call('HSET', KEYS[1], 'state', 'open', 'opened_at', tostring(now), 'probe_until', 0)
+        redis.call('HINCRBY', KEYS[1], 'opened', 1)
+        return {'open', 1, failures}
+    end
+    return {state, 0, failures}
+    """
+
+    def __init__(self, redis_client, service, failure_threshold=5, recovery_timeout=60, probe_timeout=30):
+        self.redis = redis_client
+        self.service = service
+        self.key = f"circuit:{service}"
         self.failure_threshold = failure_threshold
         self.recovery_timeout = recovery_timeout
-        self._load_state()
+        self.probe_timeout = probe_timeout
+        self.seeded = False
+        self._allow = redis_client.register_script(self.ALLOW_SCRIPT)
+        self._success = redis_client.register_script(self.SUCCESS_SCRIPT)
+        self._failure = redis_client.register_script(self.FAILURE_SCRIPT)
+
+    @staticmethod
+    def _text(value):
+        return value.decode() if isinstance(value, bytes) else value
 
-    def _load_state(self):
-        """Load state from database"""
+    def _seed(self):
+        # Once per process, on first use rather than at import: restore a
+        # persisted open breaker if Redis lost the hash (restart, flush)
+        if self.seeded:
+            return
+        self.seeded = True
         try:
+            if self.redis.exists(self.key):
+                return
             with app.app_context():
-                result = db.session.execute(
-                    text(
-                        "SELECT failure_count, last_failure_time, is_open FROM circuit_breaker_state WHERE service = 'email'")
+                row = db.session.execute(
+                    text("SELECT failure_count, last_failure_time, is_open FROM circuit_breaker_state "
+                         "WHERE service = :service"),
+                    {'service': self.service}
                 ).first()
+            if row and row[2]:
+                opened_at = row[1] or datetime.utcnow()
+                self.redis.hsetnx(self.key, 'failures', row[0] or 0)
+                self.redis.hsetnx(self.key, 'opened_at', int((opened_at - datetime(1970, 1, 1)).total_seconds() * 1000))
+                self.redis.hsetnx(self.key, 'state', 'open')
+        except Exception as e:
+            # Table might not exist yet, or Redis is down; start closed
+            logger.warning(f"Could not seed {self.service} circuit breaker: {e}")
+
+    def _transition(self, state, failures=0):
+        """Persist a state change; only the caller whose script reported the transition gets here"""
+        if state == 'open':
+            app.logger.error(f"{self.service} circuit breaker opened after {failures} failures")
+        elif state == 'half_open':
+            app.logger.info(f"{self.service} circuit breaker half-open, sending one probe")
+        else:
+            app.logger.info(f"{self.service} circuit breaker closed")
 
-                if result:
-                    self.failure_count = result[0]
-                    self.last_failure_time = result[1]
-                    self.is_open = result[2]
-                else:
-                    self.failure_count = 0
-                    self.last_failure_time = None
-                    self.is_open = False
-                    self._save_state()
-        except:
-            # Table might not exist yet
-            self.failure_count = 0
-            self.last_failure_time = None
-            self.is_open = False
-
-    def _save_state(self):
-        """Save state to database"""
         try:
             with app.app_context():
                 db.session.execute(
                     text("""
                         INSERT INTO circuit_breaker_state (service, failure_count, last_failure_time, is_open)
-                        VALUES ('email', :failure_count, :last_failure, :is_open)
+                        VALUES (:service, :failure_count, :last_failure, :is_open)
                         ON CONFLICT (service) DO UPDATE SET
                             failure_count = :failure_count,
                             last_failure_time = :last_failure,
                             is_open = :is_open
                     """),
                     {
-                        'failure_count': self.failure_count,
-                        'last_failure': self.last_failure_time,
-                        'is_open': self.is_open
+                        'service': self.service,
+                        'failure_count': failures,
+                        'last_failure': datetime.utcnow() if state == 'open' else None,
+                        'is_open': state != 'closed'
                     }
                 )
                 db.session.commit()
-        except:
-            pass
-
-    def call_succeeded(self):
-        """Reset the circuit breaker on success"""
-        self.failure_count = 0
-        self.is_open = False
-        self.last_failure_time = None
-        self._save_state()
+        except Exception as e:
+            logger.warning(f"Could not persist {self.service} circuit breaker state: {e}")
 
-    def call_failed(self):
-        """Record a failure and potentially open the circuit"""
-        self.failure_count += 1
-        self.last_failure_time = datetime.utcnow()
+    def can_attempt_call(self):
+        """Permission for one call: False, 'closed', or 'half_open' for the single probe caller.
 
-        if self.failure_count >= self.failure_threshold:
-            self.is_open = True
-            app.logger.error(f"Email circuit breaker opened after {self.failure_count} failures")
+        The probe must make exactly one call and report it with probe=True.
+        """
+        self._seed()
+        try:
+            allowed, state, transitioned = self._allow(
+                keys=[self.key], args=[self.recovery_timeout * 1000, self.probe_timeout * 1000])
+        except redis.RedisError as e:
+            logger.warning(f"{self.service} circuit breaker unavailable, allowing call: {e}")
+            return 'closed'
+        state = self._text(state)
+        if transitioned:
+            self._transition(state)
+        return state if allowed else False
+
+    def call_succeeded(self, probe=False):
+        """Record a success; the probe's success closes a half-open breaker"""
+        self._seed()
+        try:
+            state, transitioned, _ = self._success(keys=[self.key], args=[int(probe)])
+        except redis.RedisError:
+            return
+        if transitioned:
+            self._transition(self._text(state))
 
-        self._save_state()
+    def call_failed(self, probe=False):
+        """Record a failure; opens the breaker at failure_threshold, or at once on a failed probe"""
+        self._seed()
+        try:
+            state, transitioned, failures = self._failure(
+                keys=[self.key], args=[self.failure_threshold, int(probe)])
+        except redis.RedisError:
+            return
+        if transitioned:
+            self._transition(self._text(state), int(failures))
 
-    def can_attempt_call(self):
-        """Check if we can attempt to send email"""
-        if not self.is_open:
-            return True
+    def metrics(self):
+        """Current state and lifetime counters, for the health endpoint"""
+        try:
+            raw = {self._text(field): self._text(value) for field, value in self.redis.hgetall(self.key).items()}
+        except redis.RedisError as e:
+            return {'state': 'unknown', 'error': str(e)}
 
-        # Check if we should attempt recovery
-        if self.last_failure_time:
-            time_since_failure = (datetime.utcnow() - self.last_failure_time).total_seconds()
-            if time_since_failure >= self.recovery_timeout:
-                # Attempt recovery
-                self.is_open = False
-                self.failure_count = 0
-                self._save_state()
-                app.logger.info("Email circuit breaker attempting recovery")
-                return True
+        def millis_to_iso(value):
+            return datetime.utcfromtimestamp(int(value) / 1000).isoformat() if value and value != '0' else None
 
-        return False
+        return {
+            'state': raw.get('state', 'closed'),
+            'consecutive_failures': int(raw.get('failures', 0)),
+            'failure_threshold': self.failure_threshold,
+            'recovery_timeout': self.recovery_timeout,
+            'opened_at': millis_to_iso(raw.get('opened_at')) if raw.get('state', 'closed') != 'closed' else None,
+            'last_failure_at': millis_to_iso(raw.get('last_failure_at')),
+            'successes': int(raw.get('successes', 0)),
+            'failures': int(raw.get('failures_total', 0)),
+            'rejected': int(raw.get('rejected', 0)),
+            'times_opened': int(raw.get('opened', 0))
+        }
 
 
 # Create global circuit breaker instance
-email_circuit_breaker = EmailCircuitBreaker()
+email_circuit_breaker = CircuitBreaker(redis_client, 'email')
 
 
 class EmailBounceHandler:
@@ -2347,8 +3596,12 @@ class SafetyPlan(db.Model):
 
 
 
-def send_email_async(app, to_email, subject, body, html_body=None):
-    """Send email asynchronously in app context with circuit breaker"""
+def send_email_async(app, to_email, subject, body, html_body=None, permit=None):
+    """Send email asynchronously in app context with circuit breaker.
+
+    permit is the caller's can_attempt_call() result; without one the
+    breaker is asked here.
+    """
     with app.app_context():
         # Check if email is valid
         if not email_bounce_handler.is_valid_email(to_email):
@@ -2356,7 +3609,8 @@ def send_email_async(app, to_email, subject, body, html_body=None):
             return
 
         # Check circuit breaker
-        if not email_circuit_breaker.can_attempt_call():
+        permit = permit or email_circuit_breaker.can_attempt_call()
+        if not permit:
             app.logger.warning(f"Email circuit breaker is open, not sending email to {to_email}")
             return
 
@@ -2394,92 +3648,516 @@ def send_email_async(app, to_email, subject, body, html_body=None):
             if html_body:
                 msg.attach(MIMEText(html_body, 'html'))
 
-            # Send email
-            server = smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT'])
-
-            # Enable TLS encryption
-            try:
-                server.starttls()
-                server.ehlo()  # Re-identify ourselves over TLS connection
-                # Log encryption status for compliance
-                app.logger.info(f"Sending encrypted email to {to_email} via TLS")
-            except Exception as e:
-                app.logger.error(f"Failed to enable TLS encryption: {e}")
-                email_circuit_breaker.call_failed()
-                return False # Re-identify ourselves over TLS connection
-
-            # Login and send
-            server.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
+            # Send over a pooled session (STARTTLS and login happen once per connection)
+            smtp_delivery.send_message(msg)
 
             # Log encryption status for compliance
-            app.logger.info(f"Sending encrypted email to {to_email} via TLS")
-
-            server.send_message(msg)
-            server.quit()
+            app.logger.info(f"Sent encrypted email to {to_email} via TLS")
 
             app.logger.info(f"Email sent successfully to {to_email}")
-            email_circuit_breaker.call_succeeded()
+            email_circuit_breaker.call_succeeded(probe=permit == 'half_open')
             return True  # ADD THIS LINE - Return True on success
 
         except Exception as e:
             app.logger.error(f"Error sending email: {e}")
-            email_circuit_breaker.call_failed()
+            email_circuit_breaker.call_failed(probe=permit == 'half_open')
             return False  # ADD THIS LINE - Return False on failure
 
 
-def process_email_queue_batch():
-    """Process email queue in batches for better performance"""
-    from datetime import datetime, timedelta
+def build_email_message(to_email, subject, body, html_body=None, sender=None):
+    """Plain-text (plus optional HTML) message ready for smtp_delivery"""
+    msg = MIMEMultipart('alternative')
+    msg['From'] = sender or app.config['MAIL_USERNAME']
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain', 'utf-8'))
+    if html_body:
+        msg.attach(MIMEText(html_body, 'html', 'utf-8'))
+    return msg
+
+
+class MailRateLimiter:
+    """Provider send-rate limit shared by every worker, split into priority lanes.
+
+    One Redis token bucket (MAIL_RATE_PER_MINUTE, bursting to MAIL_BURST)
+    covers all outbound mail. Lanes draw from the same bucket but must leave
+    part of it untouched: bulk stops while LANE_RESERVE['bulk'] of the burst
+    is left, transactional stops at its own smaller reserve, and critical
+    mail can take the last token. A flood of reminders therefore never
+    consumes the capacity an urgent-session notification needs.
+
+    A 4xx from the provider pauses only the bulk lane, doubling the pause on
+    each repeat up to BACKOFF_MAX and stepping back down as batches go
+    through cleanly. If Redis is unreachable sends are allowed through, as
+    they were before the limiter existed.
+    """
 
-    with app.app_context():
-        # Get batch of pending emails
-        batch_size = 50  # Process 50 at a time
+    LANES = ('critical', 'transactional', 'bulk')
+    LANE_RESERVE = {'critical': 0.0, 'transactional': 0.1, 'bulk': 0.4}
+    BACKOFF_BASE = 30
+    BACKOFF_MAX = 900
+    BACKOFF_LEVEL_TTL = 3600
+
+    BUCKET_KEY = 'mail_bucket'
+    PAUSE_KEY = 'mail_backoff:bulk'
+    LEVEL_KEY = 'mail_backoff:bulk:level'
+
+    # Refill from the Redis clock so workers on different hosts agree on elapsed time
+    TAKE_SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local capacity = tonumber(ARGV[2])
+    local reserve = tonumber(ARGV[3])
+    local requested = tonumber(ARGV[4])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    local granted = math.max(0, math.min(requested, math.floor(tokens - reserve)))
+    tokens = tokens - granted
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+    local wait_ms = 0
+    if granted < requested then
+        wait_ms = math.max(1, math.ceil((reserve + 1 - tokens) / rate * 1000))
+    end
+    return {granted, wait_ms}
+    """
 
-        pending_emails = EmailQueue.query.filter(
-            EmailQueue.status == 'pending',
-            EmailQueue.attempts < 3
-        ).order_by(EmailQueue.created_at).limit(batch_size).all()
+    def __init__(self, redis_client, per_minute=None, burst=None):
+        self.redis = redis_client
+        self.rate = float(per_minute or os.environ.get('MAIL_RATE_PER_MINUTE', 60)) / 60
+        self.capacity = float(burst or os.environ.get('MAIL_BURST', 30))
+        self._take = redis_client.register_script(self.TAKE_SCRIPT)
 
-        for email_record in pending_emails:
-            try:
-                # Mark as processing
-                email_record.status = 'processing'
-                email_record.last_attempt_at = datetime.utcnow()
-                email_record.attempts += 1
-                db.session.commit()
+    def acquire(self, lane, count=1):
+        """Take up to count send tokens for lane; returns (granted, seconds until more are free)"""
+        reserve = self.capacity * self.LANE_RESERVE.get(lane, self.LANE_RESERVE['bulk'])
+        try:
+            granted, wait_ms = self._take(keys=[self.BUCKET_KEY],
+                                          args=[self.rate, self.capacity, reserve, count])
+            return int(granted), int(wait_ms) / 1000
+        except redis.RedisError as e:
+            logger.warning(f"Mail rate limiter unavailable, sending unthrottled: {e}")
+            return count, 0
+
+    def refund(self, count):
+        """Return tokens taken for rows that were never claimed"""
+        if count <= 0:
+            return
+        try:
+            self.redis.hincrbyfloat(self.BUCKET_KEY, 'tokens', count)
+        except redis.RedisError:
+            pass
 
-                # Send email
-                send_email_async(
-                    app,
-                    email_record.to_email,
-                    email_record.subject,
-                    email_record.body,
-                    email_record.html_body
-                )
+    def paused_for(self, lane):
+        """Seconds the lane must still wait after a provider 4xx; only bulk mail is ever paused"""
+        if lane != 'bulk':
+            return 0
+        try:
+            return max(0, self.redis.pttl(self.PAUSE_KEY)) / 1000
+        except redis.RedisError:
+            return 0
 
-                # Mark as sent
-                email_record.status = 'sent'
-                email_record.sent_at = datetime.utcnow()
-                db.session.commit()
+    def throttled(self):
+        """Record a provider 4xx: pause bulk mail, twice as long as last time"""
+        try:
+            level = self.redis.incr(self.LEVEL_KEY)
+            self.redis.expire(self.LEVEL_KEY, self.BACKOFF_LEVEL_TTL)
+            pause = min(self.BACKOFF_BASE * 2 ** (level - 1), self.BACKOFF_MAX)
+            self.redis.set(self.PAUSE_KEY, level, ex=int(pause))
+            logger.warning(f"Provider is throttling mail, pausing bulk lane for {pause}s")
+        except redis.RedisError:
+            pass
 
-            except Exception as e:
-                # Mark as failed
-                email_record.status = 'failed'
-                email_record.error_message = str(e)
-                db.session.commit()
+    def recovered(self):
+        """A batch went through without a 4xx; step the next pause back down"""
+        try:
+            level = self.redis.get(self.LEVEL_KEY)
+            if level and int(level) > 0:
+                self.redis.decr(self.LEVEL_KEY)
+        except redis.RedisError:
+            pass
+
+
+mail_rate_limiter = MailRateLimiter(redis_client)
 
-                logger.error(f"Failed to send email {email_record.id}: {e}")
 
+class PeriodicLease:
+    """A held periodic-task lock, renewed from a daemon thread until released"""
+
+    def __init__(self, owner, name, slot, slot_key, token, lease_seconds, slot_ttl):
+        self.owner = owner
+        self.name = name
+        self.slot = slot
+        self.slot_key = slot_key
+        self.token = token
+        self.lease_seconds = lease_seconds
+        self.slot_ttl = slot_ttl
+        self.lost = False
+        self._stop = Event()
+        self._renewer = None
+        if token:
+            self._renewer = Thread(target=self._renew_loop, daemon=True)
+            self._renewer.start()
+
+    @property
+    def guarded(self):
+        """False when Redis was unreachable and the run went ahead without a lock"""
+        return self.token is not None
+
+    def _renew_loop(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            if not self.owner.renew(self):
+                self.lost = True
+                logger.warning(f"Lost the lease on periodic task {self.name}; another run may start")
+                return
+
+    def release(self):
+        """Stop renewing, mark this slot as run and free the lock"""
+        self._stop.set()
+        if self._renewer is not None:
+            self._renewer.join()
+        if self.token:
+            self.owner.release(self)
+
+
+class PeriodicTaskLock:
+    """Single-run guard for periodic tasks, shared by every worker and Beat instance.
+
+    A run takes a lease on the task name (SET NX with an expiry, renewed
+    while the task runs), so an overrunning run blocks the next one instead
+    of overlapping it. Releasing marks the schedule slot as done, so a
+    second Beat firing the same slot, even after the first run has
+    finished, is skipped too. A worker that dies simply lets its lease
+    expire. If Redis is unreachable the run goes ahead unguarded.
+    """
+
+    KEY_PREFIX = 'periodic'
+
+    ACQUIRE_SCRIPT = """
+    if redis.call('EXISTS', KEYS[2]) == 1 then
+        return 'done'
+    end
+    if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+        return 'acquired'
+    end
+    return 'held'
+    """
 
-def send_email(to_email, subject, body, html_body=None):
-    """Send email using Celery if available, otherwise use thread"""
+    RENEW_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+
+    RELEASE_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        redis.call('SET', KEYS[2], ARGV[1], 'PX', ARGV[2])
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self._acquire = redis_client.register_script(self.ACQUIRE_SCRIPT)
+        self._renew = redis_client.register_script(self.RENEW_SCRIPT)
+        self._release = redis_client.register_script(self.RELEASE_SCRIPT)
+
+    def lock_key(self, name):
+        return f"{self.KEY_PREFIX}:{name}:lock"
+
+    @staticmethod
+    def slot_start(slot_seconds, now=None):
+        """Epoch second the schedule slot containing `now` (default: the current time) starts at"""
+        now = int(time.time() if now is None else now)
+        return now - now % slot_seconds
+
+    def acquire(self, name, slot_seconds, lease_seconds, now=None):
+        """(lease, None) for the current slot, or (None, 'held'/'done') when this firing must skip"""
+        now = int(time.time() if now is None else now)
+        slot_start = self.slot_start(slot_seconds, now)
+        slot = datetime.utcfromtimestamp(slot_start)
+        slot_key = f"{self.KEY_PREFIX}:{name}:slot:{slot_start}"
+        # Keep the done marker until the slot is over, plus a minute for clock skew
+        slot_ttl = slot_start + slot_seconds - now + 60
+        token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        try:
+            outcome = self._acquire(keys=[self.lock_key(name), slot_key],
+                                    args=[token, int(lease_seconds * 1000)])
+        except redis.RedisError as e:
+            logger.warning(f"Periodic task lock unavailable, running {name} unguarded: {e}")
+            return PeriodicLease(self, name, slot, slot_key, None, lease_seconds, slot_ttl), None
+        outcome = outcome.decode() if isinstance(outcome, bytes) else outcome
+        if outcome != 'acquired':
+            return None, outcome
+        return PeriodicLease(self, name, slot, slot_key, token, lease_seconds, slot_ttl), None
+
+    def renew(self, lease):
+        try:
+            return bool(self._renew(keys=[self.lock_key(lease.name)],
+                                    args=[lease.token, int(lease.lease_seconds * 1000)]))
+        except redis.RedisError:
+            # Keep going; the lease is only lost if it actually expires
+            return True
+
+    def release(self, lease):
+        try:
+            self._release(keys=[self.lock_key(lease.name), lease.slot_key],
+                          args=[lease.token, lease.slot_ttl * 1000])
+        except redis.RedisError as e:
+            logger.warning(f"Could not release periodic task lock {lease.name}: {e}")
+
+    def holder(self, name):
+        """Token (host:pid:id) of whoever runs the task right now, or None"""
+        try:
+            token = self.redis.get(self.lock_key(name))
+        except redis.RedisError:
+            return None
+        return token.decode() if isinstance(token, bytes) else token
+
+
+periodic_task_lock = PeriodicTaskLock(redis_client)
+
+
+class EmailQueueConsumer:
+    """Claims email_queue rows in leased batches so any number of workers can drain it.
+
+    claim() marks up to `limit` pending rows (or processing rows whose lease
+    has expired) as processing in a single UPDATE over a
+    SELECT ... FOR UPDATE SKIP LOCKED, so concurrent consumers never get the
+    same row and never wait on each other. Each row is stamped with this
+    consumer's id and a lease expiry; settling a row only succeeds while the
+    lease is still ours, so a consumer that stalls past its lease cannot
+    overwrite whoever re-claimed the row.
+
+    A consumer bound to a lane only claims rows of that priority and sizes
+    each batch by the tokens mail_rate_limiter grants it; an unbound
+    consumer takes any row under the bulk lane's limits.
+
+    A batch can outlast its lease (every connect may take the full SMTP
+    timeout), so deliver() checks the lease before each message and renews
+    it once less than LEASE_MARGIN is left; a row whose lease was lost is
+    skipped rather than sent a second time.
+    """
+
+    LEASE_SECONDS = 300
+    # Longer than one send can take: two SMTP timeouts (send + retry on a fresh session) plus slack
+    LEASE_MARGIN = 90
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, worker_id=None, lease_seconds=LEASE_SECONDS, lane=None):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        self.lane = lane
+
+    def _claim(self, conditions, limit):
+        now = datetime.utcnow()
+        claimable = db.session.query(EmailQueue.id).filter(
+            EmailQueue.attempts < self.MAX_ATTEMPTS,
+            or_(
+                EmailQueue.status == 'pending',
+                and_(EmailQueue.status == 'processing', EmailQueue.lease_expires_at < now)
+            ),
+            *conditions
+        ).order_by(EmailQueue.created_at).limit(limit).with_for_update(skip_locked=True)
+
+        rows = db.session.execute(
+            update(EmailQueue).where(EmailQueue.id.in_(claimable.scalar_subquery())).values(
+                status='processing',
+                leased_by=self.worker_id,
+                lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                attempts=func.coalesce(EmailQueue.attempts, 0) + 1,
+                last_attempt_at=now
+            ).returning(
+                EmailQueue.id, EmailQueue.to_email, EmailQueue.subject, EmailQueue.body,
+                EmailQueue.html_body, EmailQueue.attempts, EmailQueue.priority, EmailQueue.lease_expires_at
+            ),
+            execution_options={'synchronize_session': False}
+        ).all()
+        db.session.commit()
+        return rows
+
+    def claim(self, limit=50):
+        """Lease up to limit rows of this lane, oldest first.
+
+        Returns (id, to_email, subject, body, html_body, attempts, priority, lease_expires_at) rows.
+        """
+        return self._claim((EmailQueue.priority == self.lane,) if self.lane else (), limit)
+
+    def claim_one(self, email_id):
+        """Lease one specific row, or None if it is sent, exhausted or held by another consumer"""
+        rows = self._claim((EmailQueue.id == email_id,), 1)
+        return rows[0] if rows else None
+
+    def _owned(self, email_ids):
+        return update(EmailQueue).where(
+            EmailQueue.id.in_(email_ids),
+            EmailQueue.status == 'processing',
+            EmailQueue.leased_by == self.worker_id
+        )
+
+    def renew(self, email_ids):
+        """Extend the lease on rows still leased to us and commit; returns the ids that were"""
+        if not email_ids:
+            return set()
+        rows = db.session.execute(self._owned(email_ids).values(
+            lease_expires_at=datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+        ).returning(EmailQueue.id), execution_options={'synchronize_session': False}).all()
+        db.session.commit()
+        return {row.id for row in rows}
+
+    def fail_exhausted(self):
+        """Fail rows whose worker died on their last attempt; claim() never picks them up again"""
+        failed = db.session.execute(update(EmailQueue).where(
+            EmailQueue.status == 'processing',
+            EmailQueue.attempts >= self.MAX_ATTEMPTS,
+            EmailQueue.lease_expires_at < datetime.utcnow()
+        ).values(
+            status='failed', error_message='Lease expired on the final attempt',
+            leased_by=None, lease_expires_at=None
+        ), execution_options={'synchronize_session': False}).rowcount
+        db.session.commit()
+        return failed
+
+    def mark_sent(self, email_ids):
+        """Settle delivered rows; returns how many were still leased to us"""
+        if not email_ids:
+            return 0
+        return db.session.execute(self._owned(email_ids).values(
+            status='sent', sent_at=datetime.utcnow(), error_message=None,
+            leased_by=None, lease_expires_at=None
+        ), execution_options={'synchronize_session': False}).rowcount
+
+    def mark_failed(self, email_id, error, retry=True):
+        """Release a failed row back to pending, or fail it for good once attempts run out"""
+        status = case((EmailQueue.attempts < self.MAX_ATTEMPTS, 'pending'), else_='failed') if retry else 'failed'
+        return db.session.execute(self._owned([email_id]).values(
+            status=status, error_message=str(error)[:1000],
+            leased_by=None, lease_expires_at=None
+        ), execution_options={'synchronize_session': False}).rowcount
+
+    def mark_deferred(self, email_id, error):
+        """Put a throttled row back to pending without spending one of its attempts"""
+        return db.session.execute(self._owned([email_id]).values(
+            status='pending', error_message=str(error)[:1000],
+            attempts=EmailQueue.attempts - 1,
+            leased_by=None, lease_expires_at=None
+        ), execution_options={'synchronize_session': False}).rowcount
+
+    def deliver(self, rows, permit):
+        """Send claimed rows over pooled SMTP sessions and settle each; returns (sent, failed).
+
+        permit is the email_circuit_breaker.can_attempt_call() result the
+        caller obtained; a 'half_open' permit covers exactly one row.
+        """
+        probe = permit == 'half_open'
+        sendable = []
+        for row in rows:
+            if email_bounce_handler.is_valid_email(row.to_email):
+                sendable.append(row)
+            else:
+                self.mark_failed(row.id, 'Address marked as invalid', retry=False)
+
+        # Rows sent but not yet settled are renewed too, or a re-claim would send them again
+        held = {row.id for row in sendable}
+        lease_until = min((row.lease_expires_at for row in sendable), default=None)
+
+        def before_send(index):
+            nonlocal lease_until
+            now = datetime.utcnow()
+            if (lease_until - now).total_seconds() < self.LEASE_MARGIN:
+                held.intersection_update(self.renew(list(held)))
+                lease_until = now + timedelta(seconds=self.lease_seconds)
+            return sendable[index].id in held
+
+        errors = smtp_delivery.send_messages([
+            build_email_message(row.to_email, row.subject, row.body, row.html_body) for row in sendable
+        ], before_send=before_send)
+
+        sent_ids = []
+        throttled = 0
+        for row, error in zip(sendable, errors):
+            if isinstance(error, smtp_delivery.Skipped):
+                logger.warning(f"Lease on email {row.id} was lost mid-batch, leaving it to its new holder")
+            elif error is None:
+                sent_ids.append(row.id)
+                email_circuit_breaker.call_succeeded(probe=probe)
+            elif smtp_delivery.is_throttled(error):
+                # Rate limiting is not an outage, so it must not open the breaker on critical mail
+                self.mark_deferred(row.id, error)
+                throttled += 1
+            else:
+                self.mark_failed(row.id, error)
+                email_circuit_breaker.call_failed(probe=probe)
+                logger.error(f"Failed to send email {row.id}: {error}")
+        self.mark_sent(sent_ids)
+        db.session.commit()
+
+        if throttled:
+            mail_rate_limiter.throttled()
+        elif sent_ids:
+            mail_rate_limiter.recovered()
+        return len(sent_ids), len(rows) - len(sent_ids)
+
+    def drain(self, batch_size=50, max_batches=20):
+        """Claim and deliver batches until the lane is empty or the rate limit, breaker or max_batches stops it.
+
+        totals['retry_in'] is how long to wait before draining again when the
+        run stopped on the rate limit or a bulk pause rather than an empty lane.
+        """
+        lane = self.lane or 'bulk'
+        totals = {'claimed': 0, 'sent': 0, 'failed': 0, 'retry_in': 0}
+        totals['failed'] += self.fail_exhausted()
+        for _ in range(max_batches):
+            permit = email_circuit_breaker.can_attempt_call()
+            if not permit:
+                app.logger.warning("Email circuit breaker is open, leaving queue for the next run")
+                break
+            totals['retry_in'] = mail_rate_limiter.paused_for(lane)
+            if totals['retry_in']:
+                break
+            # A half-open breaker admits a single probe message, not a whole batch
+            granted, totals['retry_in'] = mail_rate_limiter.acquire(lane, 1 if permit == 'half_open' else batch_size)
+            if not granted:
+                break
+            rows = self.claim(granted)
+            mail_rate_limiter.refund(granted - len(rows))
+            if rows:
+                sent, failed = self.deliver(rows, permit)
+                totals['claimed'] += len(rows)
+                totals['sent'] += sent
+                totals['failed'] += failed
+            if len(rows) < granted:
+                # The lane is empty, so nothing is left waiting on the rate limit
+                totals['retry_in'] = 0
+                break
+        return totals
+
+
+def process_email_queue_batch():
+    """Drain one batch of the email queue; safe to run from any number of workers at once"""
+    with app.app_context():
+        return EmailQueueConsumer().drain(batch_size=50, max_batches=1)
+
+
+def send_email(to_email, subject, body, html_body=None, priority='transactional'):
+    """Send email using Celery if available, otherwise use thread.
+
+    priority picks the mail lane: 'critical' and 'transactional' mail is
+    dispatched right away on its own Celery queue, 'bulk' mail waits for the
+    next rate-limited bulk drain.
+    """
     if not app.config.get('MAIL_USERNAME'):
         # Email not configured, return silently
         return False
 
     # Check if Celery is available and configured
     try:
-        from celery_app import send_email_task
+        from celery_app import send_email_task, MAIL_QUEUES
 
         # Create EmailQueue entry for Celery
         email_queue = EmailQueue(
@@ -2487,13 +4165,17 @@ def send_email(to_email, subject, body, html_body=None):
             subject=subject,
             body=body,
             html_body=html_body,
-            status='pending'
+            status='pending',
+            priority=priority
         )
         db.session.add(email_queue)
         db.session.commit()
 
+        if priority == 'bulk':
+            return True
+
         # Use Celery to send email asynchronously - pass only the ID
-        task = send_email_task.delay(email_queue.id)
+        task = send_email_task.apply_async(args=[email_queue.id, priority], queue=MAIL_QUEUES[priority])
         logger.info(f"Email queued via Celery with task id: {task.id} for queue id: {email_queue.id}")
         return True
 
@@ -2502,14 +4184,15 @@ def send_email(to_email, subject, body, html_body=None):
         logger.info("Celery not available, using thread-based email sending")
 
         # Check circuit breaker before creating thread
-        if not email_circuit_breaker.can_attempt_call():
+        permit = email_circuit_breaker.can_attempt_call()
+        if not permit:
             app.logger.warning(f"Email circuit breaker is open, skipping email to {to_email}")
             return False
 
         # Send email in background thread
         thread = Thread(
             target=send_email_async,
-            args=(app, to_email, subject, body, html_body)
+            args=(app, to_email, subject, body, html_body, permit)
         )
         thread.daemon = True
         thread.start()
@@ -2521,126 +4204,210 @@ def send_email(to_email, subject, body, html_body=None):
         db.session.rollback()  # Rollback the failed EmailQueue entry
 
         # Check circuit breaker before falling back
-        if not email_circuit_breaker.can_attempt_call():
+        permit = email_circuit_breaker.can_attempt_call()
+        if not permit:
             app.logger.warning(f"Email circuit breaker is open, skipping email to {to_email}")
             return False
 
         # Fall back to thread-based sending
         thread = Thread(
             target=send_email_async,
-            args=(app, to_email, subject, body, html_body)
+            args=(app, to_email, subject, body, html_body, permit)
         )
         thread.daemon = True
         thread.start()
         return True
 
 
-def check_client_inactivity():
-    """Check for inactive clients and notify therapists"""
-    with app.app_context():
-        try:
-            # Get all active clients who haven't checked in for 7 days
-            seven_days_ago = date.today() - timedelta(days=7)
-
-            inactive_clients = db.session.query(Client).join(User).filter(
-                Client.is_active == True,
-                User.is_active == True
-            ).all()
-
-            notifications_sent = 0
-
-            for client in inactive_clients:
-                # Get last checkin
-                last_checkin = client.checkins.order_by(
-                    DailyCheckin.checkin_date.desc()
-                ).first()
-
-                if not last_checkin or last_checkin.checkin_date < seven_days_ago:
-                    # Notify therapist
-                    if client.therapist and client.therapist.user:
-                        therapist_email = client.therapist.user.email
-
-                        # Get therapist's language preference
-                        # You might want to store this in the Therapist model
-                        # For now, default to English
-                        lang = 'en'  # TODO: Get from therapist preferences
-
-                        # Translated subjects
-                        subjects = {
-                            'en': f"Client Inactivity Alert - {sanitize_input(client.client_serial)}",
-                            'he': f"התראת חוסר פעילות - מטופל {sanitize_input(client.client_serial)}",
-                            'ru': f"Предупреждение о неактивности клиента - {sanitize_input(client.client_serial)}",
-                            'ar': f"تنبيه عدم نشاط العميل - {sanitize_input(client.client_serial)}"
-                        }
-
-                        # Translated bodies
-                        if lang == 'he':
-                            body = f"""שלום {client.therapist.name},
-
-המטופל שלך {sanitize_input(client.client_serial)} לא השלים צ'ק-אין במשך יותר מ-7 ימים.
-
-צ'ק-אין אחרון: {last_checkin.checkin_date.strftime('%d/%m/%Y') if last_checkin else 'אף פעם'}
-תאריך התחלת טיפול: {client.start_date.strftime('%d/%m/%Y')}
-
-אנא שקול ליצור קשר כדי לבדוק את ההתקדמות שלהם.
-
-בברכה,
-מערכת הליווי הטיפולי"""
-                        elif lang == 'ru':
-                            body = f"""Уважаемый {client.therapist.name},
+INACTIVITY_DAYS = 7
+INACTIVITY_CHUNK_SIZE = 1000
 
-Ваш клиент {sanitize_input(client.client_serial)} не выполнял отметку более 7 дней.
-
-Последняя отметка: {last_checkin.checkin_date.strftime('%d.%m.%Y') if last_checkin else 'Никогда'}
-Дата начала терапии: {client.start_date.strftime('%d.%m.%Y')}
-
-Пожалуйста, подумайте о том, чтобы связаться с ним для проверки прогресса.
-
-С уважением,
-Система терапевтического сопровождения"""
-                        elif lang == 'ar':
-                            body = f"""عزيزي {client.therapist.name}،
-
-لم يكمل عميلك {sanitize_input(client.client_serial)} تسجيل الحضور لأكثر من 7 أيام.
-
-آخر تسجيل حضور: {last_checkin.checkin_date.strftime('%d/%m/%Y') if last_checkin else 'أبداً'}
-تاريخ بدء العلاج: {client.start_date.strftime('%d/%m/%Y')}
-
-يرجى التفكير في التواصل معهم للتحقق من تقدمهم.
-
-مع أطيب التحيات،
-نظام المرافقة العلاجية"""
-                        else:  # English
-                            body = f"""Dear {client.therapist.name},
+INACTIVITY_DIGEST_TRANSLATIONS = {
+    'en': {
+        'subject': "Client Inactivity Alert - {count} client(s)",
+        'greeting': "Dear {name},",
+        'intro': "The following clients have not completed a check-in for over {days} days:",
+        'line': "- {serial}: last check-in {last_checkin}, started {start_date}",
+        'never': "Never",
+        'closing': "Please consider reaching out to check on their progress.",
+        'regards': "Best regards,\nTherapeutic Companion System",
+        'date_format': '%Y-%m-%d'
+    },
+    'he': {
+        'subject': "התראת חוסר פעילות - {count} מטופלים",
+        'greeting': "שלום {name},",
+        'intro': "המטופלים הבאים לא השלימו צ'ק-אין במשך יותר מ-{days} ימים:",
+        'line': "- {serial}: צ'ק-אין אחרון {last_checkin}, תחילת טיפול {start_date}",
+        'never': "אף פעם",
+        'closing': "אנא שקול ליצור קשר כדי לבדוק את ההתקדמות שלהם.",
+        'regards': "בברכה,\nמערכת הליווי הטיפולי",
+        'date_format': '%d/%m/%Y'
+    },
+    'ru': {
+        'subject': "Предупреждение о неактивности клиентов - {count}",
+        'greeting': "Уважаемый {name},",
+        'intro': "Следующие клиенты не выполняли отметку более {days} дней:",
+        'line': "- {serial}: последняя отметка {last_checkin}, начало терапии {start_date}",
+        'never': "Никогда",
+        'closing': "Пожалуйста, подумайте о том, чтобы связаться с ними для проверки прогресса.",
+        'regards': "С уважением,\nСистема терапевтического сопровождения",
+        'date_format': '%d.%m.%Y'
+    },
+    'ar': {
+        'subject': "تنبيه عدم نشاط العملاء - {count}",
+        'greeting': "عزيزي {name}،",
+        'intro': "لم يكمل العملاء التالون تسجيل الحضور لأكثر من {days} أيام:",
+        'line': "- {serial}: آخر تسجيل حضور {last_checkin}، بدء العلاج {start_date}",
+        'never': "أبداً",
+        'closing': "يرجى التفكير في التواصل معهم للتحقق من تقدمهم.",
+        'regards': "مع أطيب التحيات،\nنظام المرافقة العلاجية",
+        'date_format': '%d/%m/%Y'
+    }
+}
 
-Your client {sanitize_input(client.client_serial)} has not completed a check-in for over 7 days.
 
-Last check-in: {last_checkin.checkin_date.strftime('%Y-%m-%d') if last_checkin else 'Never'}
-Client start date: {client.start_date.strftime('%Y-%m-%d')}
+def inactive_client_chunks(chunk_size=INACTIVITY_CHUNK_SIZE, today=None):
+    """Yield lists of inactive clients that are due an alert, ordered by (therapist_id, client_id).
 
-Please consider reaching out to check on their progress.
+    One grouped query per chunk: last check-in per client is MAX(checkin_date)
+    and the HAVING clause keeps clients whose last check-in (or start date,
+    if they never checked in) is over INACTIVITY_DAYS old and who have not
+    been alerted for this stretch of inactivity within REALERT_AFTER. The
+    therapist's e-mail and report language come from the same query.
+    """
+    from sqlalchemy.orm import aliased
+
+    today = today or date.today()
+    cutoff = today - timedelta(days=INACTIVITY_DAYS)
+    realert_before = datetime.utcnow() - ClientInactivityAlert.REALERT_AFTER
+    therapist_user = aliased(User)
+    # Report settings live in a Reminder row whose client_id holds the therapist id
+    settings = db.session.query(
+        Reminder.client_id.label('therapist_id'),
+        func.max(Reminder.reminder_language).label('language')
+    ).filter(Reminder.reminder_type == 'weekly_report').group_by(Reminder.client_id).subquery()
+
+    last_checkin = func.max(DailyCheckin.checkin_date)
+    query = db.session.query(
+        Client.therapist_id,
+        Client.id,
+        Client.client_serial,
+        Client.start_date,
+        last_checkin.label('last_checkin'),
+        Therapist.name,
+        therapist_user.email,
+        settings.c.language
+    ).join(
+        User, User.id == Client.user_id
+    ).join(
+        Therapist, Therapist.id == Client.therapist_id
+    ).join(
+        therapist_user, therapist_user.id == Therapist.user_id
+    ).outerjoin(
+        settings, settings.c.therapist_id == Therapist.id
+    ).outerjoin(
+        DailyCheckin, DailyCheckin.client_id == Client.id
+    ).outerjoin(
+        ClientInactivityAlert, ClientInactivityAlert.client_id == Client.id
+    ).filter(
+        Client.is_active == True,
+        User.is_active == True
+    ).group_by(
+        Client.id, Therapist.id, therapist_user.id, settings.c.language, ClientInactivityAlert.client_id
+    ).having(and_(
+        func.coalesce(last_checkin, Client.start_date) < cutoff,
+        or_(
+            ClientInactivityAlert.client_id.is_(None),
+            ClientInactivityAlert.alerted_at < realert_before,
+            ClientInactivityAlert.last_checkin_date.is_distinct_from(last_checkin)
+        )
+    )).order_by(Client.therapist_id, Client.id)
 
-Best regards,
-Therapeutic Companion System"""
+    last_key = (0, 0)
+    while True:
+        rows = query.filter(tuple_(Client.therapist_id, Client.id) > last_key).limit(chunk_size).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last_key = (rows[-1].therapist_id, rows[-1].id)
+
+
+def send_inactivity_digest(therapist_id, clients):
+    """One e-mail listing every inactive client of a therapist; records the alerts once it is queued"""
+    first = clients[0]
+    lang = first.language if first.language in INACTIVITY_DIGEST_TRANSLATIONS else 'en'
+    t = INACTIVITY_DIGEST_TRANSLATIONS[lang]
+
+    lines = [t['line'].format(
+        serial=sanitize_input(client.client_serial),
+        last_checkin=client.last_checkin.strftime(t['date_format']) if client.last_checkin else t['never'],
+        start_date=client.start_date.strftime(t['date_format'])
+    ) for client in clients]
+    body = "\n\n".join([
+        t['greeting'].format(name=first.name),
+        t['intro'].format(days=INACTIVITY_DAYS) + "\n\n" + "\n".join(lines),
+        t['closing'],
+        t['regards']
+    ])
+    subject = t['subject'].format(count=len(clients))
+
+    if not send_email(first.email, subject, body, priority='bulk'):
+        return False
 
-                        subject = subjects.get(lang, subjects['en'])
+    now = datetime.utcnow()
+    stmt = pg_insert(ClientInactivityAlert).values([{
+        'client_id': client.id,
+        'therapist_id': therapist_id,
+        'last_checkin_date': client.last_checkin,
+        'alerted_at': now,
+        'alert_count': 1
+    } for client in clients])
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['client_id'],
+        set_={
+            'therapist_id': stmt.excluded.therapist_id,
+            'last_checkin_date': stmt.excluded.last_checkin_date,
+            'alerted_at': stmt.excluded.alerted_at,
+            'alert_count': ClientInactivityAlert.alert_count + 1
+        }
+    ))
+    db.session.commit()
 
-                        if send_email(therapist_email, subject, body):
-                            notifications_sent += 1
+    logger.info('inactivity_digest_sent', extra={
+        'extra_data': {
+            'therapist_id': therapist_id,
+            'clients': len(clients),
+            'client_serials': [client.client_serial for client in clients]
+        }
+    })
+    return True
 
-                            # Log notification
-                            logger.info('inactivity_notification_sent', extra={
-                                'extra_data': {
-                                    'client_id': client.id,
-                                    'client_serial': client.client_serial,
-                                    'therapist_id': client.therapist.id,
-                                    'last_checkin': last_checkin.checkin_date.isoformat() if last_checkin else None
-                                }
-                            })
 
-            return notifications_sent
+def check_client_inactivity():
+    """Send each therapist one digest of their newly inactive clients; returns digests sent"""
+    with app.app_context():
+        try:
+            digests_sent = 0
+            therapist_id, pending = None, []
+
+            # A therapist's clients can span two chunks, so a digest goes out
+            # once the next therapist's rows start (or the rows run out)
+            for rows in inactive_client_chunks():
+                for row in rows:
+                    if row.therapist_id != therapist_id and pending:
+                        digests_sent += send_inactivity_digest(therapist_id, pending)
+                        pending = []
+                    therapist_id = row.therapist_id
+                    pending.append(row)
+            if pending:
+                digests_sent += send_inactivity_digest(therapist_id, pending)
+
+            return digests_sent
 
         except Exception as e:
+            db.session.rollback()
             logger.error(f"Error checking client inactivity: {e}")
             return 0
 
@@ -2698,6 +4465,24 @@ def delete_therapist_account():
             # Delete category responses
             CategoryResponse.query.filter_by(client_id=client.id).delete()
 
+            # Delete batch sync keys
+            CheckinSyncKey.query.filter_by(client_id=client.id).delete()
+
+            # Delete engagement summary
+            ClientEngagement.query.filter_by(client_id=client.id).delete()
+
+            # Delete daily rollups
+            ClientDailyRollup.query.filter_by(client_id=client.id).delete()
+
+            # Delete stored insights
+            ClientInsight.query.filter_by(client_id=client.id).delete()
+
+            # Delete triage entry
+            ClientTriage.query.filter_by(client_id=client.id).delete()
+
+            # Delete inactivity alert state
+            ClientInactivityAlert.query.filter_by(client_id=client.id).delete()
+
             # Delete goal completions through goals
             for goal in client.goals:
                 GoalCompletion.query.filter_by(goal_id=goal.id).delete()
@@ -2734,6 +4519,8 @@ def delete_therapist_account():
                 # Delete the user
                 db.session.delete(client_user)
 
+        WeeklyReportDelivery.query.filter_by(therapist_id=therapist.id).delete()
+
         # Delete the therapist
         db.session.delete(therapist)
 
@@ -2751,6 +4538,7 @@ def delete_therapist_account():
 
         # Commit all deletions
         db.session.commit()
+        client_autocomplete.invalidate(therapist.id)
 
         return jsonify({
             'success': True,
@@ -3475,7 +5263,7 @@ Therapeutic Companion Team"""
         """
 
         # Send email
-        email_sent = send_email(email, subject, body, html_body)
+        email_sent = send_email(email, subject, body, html_body, priority='critical')
 
         logger.info('password_reset_success', extra={
             'extra_data': {
@@ -3565,6 +5353,205 @@ def reset_password():
 
 # ============= THERAPIST ENDPOINTS =============
 
+# ============= THERAPIST DASHBOARD STATISTICS =============
+
+class TherapistStatsCache:
+    """Per-therapist dashboard counters kept in a Redis hash.
+
+    The hash holds total_clients, active_clients, pending_missions and one
+    'checkins:YYYY-MM-DD' bucket per day, so the rolling check-in count is a
+    sum of buckets. Events adjust the counters in place; a missing hash is
+    rebuilt with a single SQL statement and the reconcile task repairs drift.
+    """
+
+    KEY_PREFIX = 'therapist_stats'
+    TTL = 86400
+    RECENT_DAYS = 7
+
+    # Only touch counters when the hash exists, so events never create a partial entry
+    INCREMENT_SCRIPT = """
+        if redis.call('EXISTS', KEYS[1]) == 0 then
+            return 0
+        end
+        for i = 1, #ARGV, 2 do
+            redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+        end
+        return 1
+    """
+
+    STATS_SQL = """
+        SELECT c.total_clients, c.active_clients, m.pending_missions, k.checkin_buckets
+        FROM (SELECT COUNT(*) AS total_clients,
+                     COUNT(*) FILTER (WHERE is_active) AS active_clients
+              FROM clients
+              WHERE therapist_id = :therapist_id) c,
+             (SELECT COUNT(*) FILTER (WHERE is_mission AND mission_completed = FALSE) AS pending_missions
+              FROM therapist_notes
+              WHERE therapist_id = :therapist_id) m,
+             (SELECT COALESCE(json_object_agg(day, checkins), '{}') AS checkin_buckets
+              FROM (SELECT dc.checkin_date AS day, COUNT(*) AS checkins
+                    FROM daily_checkins dc
+                    JOIN clients cl ON cl.id = dc.client_id
+                    WHERE cl.therapist_id = :therapist_id AND dc.checkin_date >= :since
+                    GROUP BY dc.checkin_date) buckets) k
+    """
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self._increment = redis_client.register_script(self.INCREMENT_SCRIPT) if redis_client else None
+
+    def _key(self, therapist_id):
+        return f"{self.KEY_PREFIX}:{therapist_id}"
+
+    @classmethod
+    def window_start(cls, today=None):
+        return (today or date.today()) - timedelta(days=cls.RECENT_DAYS)
+
+    def compute(self, therapist_id, today=None):
+        """Count everything from the database in one statement"""
+        row = db.session.execute(text(self.STATS_SQL), {
+            'therapist_id': therapist_id,
+            'since': self.window_start(today)
+        }).fetchone()
+        fields = {
+            'total_clients': row.total_clients,
+            'active_clients': row.active_clients,
+            'pending_missions': row.pending_missions
+        }
+        buckets = row.checkin_buckets
+        if isinstance(buckets, str):
+            buckets = json.loads(buckets)
+        for day, count in (buckets or {}).items():
+            fields[f'checkins:{day}'] = count
+        return fields
+
+    def store(self, therapist_id, fields):
+        if not self.redis:
+            return
+        try:
+            key = self._key(therapist_id)
+            pipe = self.redis.pipeline()
+            pipe.delete(key)
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, self.TTL)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Therapist stats store error: {e}")
+
+    def load(self, therapist_id):
+        """Raw counters from Redis, or None when not cached"""
+        if not self.redis:
+            return None
+        try:
+            raw = self.redis.hgetall(self._key(therapist_id))
+        except Exception as e:
+            logger.error(f"Therapist stats load error: {e}")
+            return None
+        if not raw:
+            return None
+        return {(k.decode() if isinstance(k, bytes) else k): int(v) for k, v in raw.items()}
+
+    @classmethod
+    def summarize(cls, fields, today=None):
+        """Turn raw counters into the dashboard statistics"""
+        since = cls.window_start(today).isoformat()
+        recent = sum(count for name, count in fields.items()
+                     if name.startswith('checkins:') and name[len('checkins:'):] >= since)
+        return {
+            'total_clients': fields.get('total_clients', 0),
+            'active_clients': fields.get('active_clients', 0),
+            'recent_checkins': recent,
+            'pending_missions': fields.get('pending_missions', 0)
+        }
+
+    def get(self, therapist_id):
+        fields = self.load(therapist_id)
+        if fields is None:
+            fields = self.compute(therapist_id)
+            self.store(therapist_id, fields)
+        return self.summarize(fields)
+
+    def _adjust(self, therapist_id, deltas):
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if not self._increment or not deltas:
+            return
+        args = []
+        for name, delta in deltas.items():
+            args.extend([name, int(delta)])
+        try:
+            self._increment(keys=[self._key(therapist_id)], args=args)
+        except Exception as e:
+            logger.error(f"Therapist stats update error: {e}")
+            self.invalidate(therapist_id)
+
+    def invalidate(self, therapist_id):
+        if not self.redis:
+            return
+        try:
+            self.redis.delete(self._key(therapist_id))
+        except Exception as e:
+            logger.error(f"Therapist stats invalidate error: {e}")
+
+    # --- Events ---
+
+    def client_added(self, therapist_id, is_active=True):
+        self._adjust(therapist_id, {'total_clients': 1, 'active_clients': 1 if is_active else 0})
+
+    def client_removed(self, therapist_id, was_active, pending_missions=0, checkin_dates=()):
+        deltas = {
+            'total_clients': -1,
+            'active_clients': -1 if was_active else 0,
+            'pending_missions': -pending_missions
+        }
+        since = self.window_start()
+        for day in checkin_dates:
+            if day >= since:
+                deltas[f'checkins:{day.isoformat()}'] = -1
+        self._adjust(therapist_id, deltas)
+
+    def checkins_created(self, therapist_id, checkin_dates):
+        since = self.window_start()
+        deltas = {}
+        for day in checkin_dates:
+            if day >= since:
+                name = f'checkins:{day.isoformat()}'
+                deltas[name] = deltas.get(name, 0) + 1
+        self._adjust(therapist_id, deltas)
+
+    def mission_added(self, therapist_id):
+        self._adjust(therapist_id, {'pending_missions': 1})
+
+    def mission_completed(self, therapist_id):
+        self._adjust(therapist_id, {'pending_missions': -1})
+
+    def reconcile(self, therapist_id):
+        """Recount one therapist, overwrite the cache and return the fields that had drifted"""
+        cached = self.load(therapist_id)
+        fresh = self.compute(therapist_id)
+        self.store(therapist_id, fresh)
+        if cached is None:
+            return {}
+        cached_stats = self.summarize(cached)
+        fresh_stats = self.summarize(fresh)
+        return {name: (cached_stats[name], value) for name, value in fresh_stats.items()
+                if cached_stats[name] != value}
+
+    def cached_therapist_ids(self):
+        if not self.redis:
+            return []
+        ids = []
+        for key in self.redis.scan_iter(match=f'{self.KEY_PREFIX}:*', count=500):
+            key = key.decode() if isinstance(key, bytes) else key
+            try:
+                ids.append(int(key.rsplit(':', 1)[1]))
+            except ValueError:
+                continue
+        return ids
+
+
+therapist_stats = TherapistStatsCache(redis_client)
+
+
 @app.route('/api/therapist/dashboard', methods=['GET'])
 @require_auth(['therapist'])
 def therapist_dashboard():
@@ -3572,22 +5559,8 @@ def therapist_dashboard():
     try:
         therapist = request.current_user.therapist
 
-        # Get client statistics
-        total_clients = therapist.clients.count()
-        active_clients = therapist.clients.filter_by(is_active=True).count()
-
-        # Get recent activity
-        recent_checkins = db.session.query(DailyCheckin).join(Client).filter(
-            Client.therapist_id == therapist.id,
-            DailyCheckin.checkin_date >= date.today() - timedelta(days=7)
-        ).count()
-
-        # Get pending missions
-        pending_missions = TherapistNote.query.filter_by(
-            therapist_id=therapist.id,
-            is_mission=True,
-            mission_completed=False
-        ).count()
+        # Counters are maintained by events; a cache miss recounts in one statement
+        statistics = therapist_stats.get(therapist.id)
 
         return jsonify({
             'success': True,
@@ -3596,12 +5569,7 @@ def therapist_dashboard():
                 'license_number': therapist.license_number,
                 'organization': therapist.organization
             },
-            'statistics': {
-                'total_clients': total_clients,
-                'active_clients': active_clients,
-                'recent_checkins': recent_checkins,
-                'pending_missions': pending_missions
-            }
+            'statistics': statistics
         })
 
     except Exception as e:
@@ -3673,41 +5641,9 @@ def get_therapist_clients():
                 tracking_plans_data[plan.client_id] = []
             tracking_plans_data[plan.client_id].append(plan)
 
-        # Get last check-in dates for all clients
+        # Last check-in and week counts from the maintained engagement summaries
         week_start = date.today() - timedelta(days=date.today().weekday())
-
-        # Get last checkin dates and week counts with optimized queries
-        from sqlalchemy import select, and_
-
-        # Get all last checkins in one query
-        last_checkin_subquery = db.session.query(
-            DailyCheckin.client_id,
-            func.max(DailyCheckin.checkin_date).label('last_date')
-        ).filter(
-            DailyCheckin.client_id.in_(client_ids)
-        ).group_by(DailyCheckin.client_id).subquery()
-
-        last_checkin_results = db.session.query(
-            last_checkin_subquery.c.client_id,
-            last_checkin_subquery.c.last_date
-        ).all()
-
-        last_checkins = {r[0]: r[1] for r in last_checkin_results}
-
-        # Get all week counts in one query
-        week_count_results = db.session.query(
-            DailyCheckin.client_id,
-            func.count(DailyCheckin.id).label('count')
-        ).filter(
-            DailyCheckin.client_id.in_(client_ids),
-            DailyCheckin.checkin_date >= week_start
-        ).group_by(DailyCheckin.client_id).all()
-
-        week_counts = {r[0]: r[1] for r in week_count_results}
-        # Set default 0 for clients with no checkins
-        for client_id in client_ids:
-            if client_id not in week_counts:
-                week_counts[client_id] = 0
+        engagement = ClientEngagement.load(client_ids)
 
         # Build response
         client_data = []
@@ -3721,8 +5657,9 @@ def get_therapist_clients():
                     tracking_categories.append(translated_name)
 
             # Get stats
-            last_checkin_date = last_checkins.get(client.id)
-            week_checkin_count = week_counts.get(client.id, 0)
+            summary = engagement.get(client.id)
+            last_checkin_date = summary.last_checkin_date if summary else None
+            week_checkin_count = summary.count_since(week_start) if summary else 0
 
             client_data.append({
                 'id': client.id,
@@ -3732,6 +5669,7 @@ def get_therapist_clients():
                 'is_active': client.is_active,
                 'last_checkin': last_checkin_date.isoformat() if last_checkin_date else None,
                 'week_completion': f"{week_checkin_count}/7",
+                'current_streak': summary.current_streak() if summary else 0,
                 'tracking_categories': tracking_categories
             })
 
@@ -3774,6 +5712,121 @@ def get_therapist_clients():
         return jsonify({'error': str(e)}), 500
 
 
+CASELOAD_SPARKLINE_DAYS = 14
+
+
+def build_caseload_overview(therapist_id):
+    """Summarise every active client of a therapist with a handful of grouped queries.
+
+    Returns a list of per-client dicts with last check-in, week completion,
+    a 14-day mean-mood sparkline (None for days without a check-in) and
+    open alert counts.
+    """
+    today = date.today()
+    week_start = today - timedelta(days=today.weekday())
+    spark_start = today - timedelta(days=CASELOAD_SPARKLINE_DAYS - 1)
+    flag_start = today - timedelta(days=6)
+
+    clients = db.session.query(Client.id, Client.client_serial, Client.client_name, Client.start_date).filter(
+        Client.therapist_id == therapist_id,
+        Client.is_active == True
+    ).order_by(Client.client_serial).all()
+    client_ids = [row.id for row in clients]
+    if not client_ids:
+        return []
+
+    engagement = ClientEngagement.load(client_ids)
+
+    # One ordered series per client from the daily rollups
+    series = db.session.query(
+        ClientDailyRollup.client_id,
+        func.array_agg(aggregate_order_by(ClientDailyRollup.rollup_date, ClientDailyRollup.rollup_date)),
+        func.array_agg(aggregate_order_by(ClientDailyRollup.mean_mood, ClientDailyRollup.rollup_date)),
+        func.array_agg(aggregate_order_by(ClientDailyRollup.flags, ClientDailyRollup.rollup_date))
+    ).filter(
+        ClientDailyRollup.client_id.in_(client_ids),
+        ClientDailyRollup.rollup_date >= spark_start
+    ).group_by(ClientDailyRollup.client_id).all()
+    series = {row[0]: row[1:] for row in series}
+
+    unread = dict(db.session.query(
+        TherapistNotification.client_id, func.count(TherapistNotification.id)
+    ).filter(
+        TherapistNotification.therapist_id == therapist_id,
+        TherapistNotification.client_id.in_(client_ids),
+        TherapistNotification.is_read == False
+    ).group_by(TherapistNotification.client_id).all())
+
+    overview = []
+    for row in clients:
+        summary = engagement.get(row.id)
+        sparkline = [None] * CASELOAD_SPARKLINE_DAYS
+        flag_counts = {'low_mood': 0, 'missed_medication': 0, 'poor_sleep': 0}
+
+        dates, moods, flags = series.get(row.id, ([], [], []))
+        for day, mood, day_flags in zip(dates, moods, flags):
+            sparkline[(day - spark_start).days] = round(mood, 2) if mood is not None else None
+            if day >= flag_start and day_flags:
+                if day_flags & ClientDailyRollup.FLAG_LOW_MOOD:
+                    flag_counts['low_mood'] += 1
+                if day_flags & ClientDailyRollup.FLAG_MISSED_MEDICATION:
+                    flag_counts['missed_medication'] += 1
+                if day_flags & ClientDailyRollup.FLAG_POOR_SLEEP:
+                    flag_counts['poor_sleep'] += 1
+
+        last_checkin = summary.last_checkin_date if summary else None
+        overview.append({
+            'id': row.id,
+            'serial': row.client_serial,
+            'client_name': row.client_name or row.client_serial,
+            'start_date': row.start_date.isoformat() if row.start_date else None,
+            'last_checkin': last_checkin.isoformat() if last_checkin else None,
+            'week_completion': summary.count_since(week_start) if summary else 0,
+            'current_streak': summary.current_streak() if summary else 0,
+            'mood_sparkline': sparkline,
+            'alerts': {
+                'unread_notifications': unread.get(row.id, 0),
+                'flags_7d': flag_counts
+            }
+        })
+    return overview
+
+
+def invalidate_checkin_caches(client):
+    """Drop every cached view that includes this client's check-in data"""
+    cache.delete('client_dashboard', f"{client.user_id}:{get_language_from_header()}")
+    cache.invalidate_pattern(f"client_categories:{client.id}:*")
+    cache.delete('caseload_overview', client.therapist_id)
+
+
+@app.route('/api/therapist/caseload-overview', methods=['GET'])
+@require_auth(['therapist'])
+@cached_endpoint('caseload_overview', ttl=300, key_func=lambda: request.current_user.therapist.id)
+def get_caseload_overview():
+    """Whole-caseload overview with per-client sparklines, cached per therapist"""
+    try:
+        therapist = request.current_user.therapist
+        clients = build_caseload_overview(therapist.id)
+
+        return jsonify({
+            'success': True,
+            'generated_at': datetime.utcnow().isoformat(),
+            'sparkline_start': (date.today() - timedelta(days=CASELOAD_SPARKLINE_DAYS - 1)).isoformat(),
+            'clients': clients
+        })
+
+    except Exception as e:
+        logger.error('caseload_overview_error', extra={
+            'extra_data': {
+                'error': str(e),
+                'request_id': g.request_id
+            },
+            'request_id': g.request_id,
+            'user_id': request.current_user.id
+        }, exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/therapist/search-clients', methods=['GET'])
 @require_auth(['therapist'])
 @cached_endpoint('client_search', ttl=60,
@@ -3801,37 +5854,13 @@ def search_therapist_clients():
                 'source': 'elasticsearch'
             })
 
-        # Fallback to database search
-        clients_query = therapist.clients
-
-        # Apply search
-        search_filter = or_(
-            Client.client_serial.ilike(f'%{query}%'),
-            Client.client_name.ilike(f'%{query}%')
-        )
-        clients_query = clients_query.filter(search_filter)
-
-        # Apply filters
-        if request.args.get('active_only') == 'true':
-            clients_query = clients_query.filter_by(is_active=True)
-
-        # Get results
-        clients = clients_query.limit(20).all()
-
-        results = []
-        for client in clients:
-            results.append({
-                'client_id': client.id,
-                'client_serial': client.client_serial,
-                'client_name': client.client_name or client.client_serial,
-                'is_active': client.is_active,
-                'start_date': client.start_date.isoformat()
-            })
+        # Fall back to trigram / n-gram search in the database tier
+        results, source = client_search.search(therapist.id, query, active_only=filters.get('is_active', False))
 
         return jsonify({
             'success': True,
             'results': results,
-            'source': 'database'
+            'source': source
         })
 
     except Exception as e:
@@ -3842,6 +5871,37 @@ def search_therapist_clients():
 
 
 
+@app.route('/api/therapist/clients/autocomplete', methods=['GET'])
+@require_auth(['therapist'])
+def autocomplete_therapist_clients():
+    """Typeahead over the therapist's client serials and names, served from memory"""
+    try:
+        therapist = request.current_user.therapist
+        prefix = request.args.get('q', '').strip()
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+
+        if not prefix:
+            return jsonify({'success': True, 'results': [], 'source': 'autocomplete'})
+
+        matches = client_autocomplete.complete(
+            therapist.id, prefix, limit, active_only=request.args.get('active_only') == 'true')
+
+        return jsonify({
+            'success': True,
+            'results': [{
+                'client_id': client_id,
+                'client_serial': client_serial,
+                'client_name': client_name or client_serial,
+                'is_active': is_active
+            } for client_id, client_serial, client_name, is_active in matches],
+            'source': 'autocomplete'
+        })
+
+    except Exception as e:
+        logger.error(f"Autocomplete error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/therapist/client/<int:client_id>', methods=['GET'])
 @require_auth(['therapist'])
 def get_client_details(client_id):
@@ -3915,18 +5975,13 @@ def get_client_details(client_id):
             WeeklyGoal.therapist_id == therapist.id  # Extra verification
         )
 
-        for goal in goals_query:
-            # Get completions for each day
-            completions = {}
-            for i in range(7):
-                day = week_start + timedelta(days=i)
-                completion = goal.completions.filter_by(completion_date=day).first()
-                completions[day.isoformat()] = completion.completed if completion else None
-
+        goals = goals_query.all()
+        grid = GoalGrid.load([goal.id for goal in goals], week_start, 7)
+        for goal in goals:
             active_goals.append({
                 'id': goal.id,
                 'text': goal.goal_text,
-                'completions': completions
+                'completions': grid.as_dict(goal.id)
             })
 
         # Get recent check-ins with limit
@@ -4058,29 +6113,25 @@ def get_client_analytics(client_id):
         # Get category trends
         # Get category trends with pagination
         category_trends = {}
+        rollups = ClientDailyRollup.read_columns(client_id, start_date, end_date)
+        offset = (page - 1) * per_page
         for plan in client.tracking_plans.filter_by(is_active=True):
-            responses_query = CategoryResponse.query.filter(
-                CategoryResponse.client_id == client_id,
-                CategoryResponse.category_id == plan.category_id,
-                CategoryResponse.response_date.between(start_date, end_date)
-            ).order_by(CategoryResponse.response_date)
+            dates, values = ClientDailyRollup.series(rollups, plan.category_id)
+            page_dates = dates[offset:offset + per_page]
+            page_values = values[offset:offset + per_page]
 
-            # Paginate responses
-            paginated = responses_query.paginate(page=page, per_page=per_page, error_out=False)
-            responses = paginated.items
-
-            if responses:
+            if len(page_values):
                 translated_name = translate_category_name(plan.category.name, lang)
                 category_trends[translated_name] = {
                     'data': [
                         {
-                            'date': resp.response_date.isoformat(),
-                            'value': resp.value
-                        } for resp in responses
+                            'date': str(day),
+                            'value': int(value)
+                        } for day, value in zip(page_dates, page_values)
                     ],
-                    'average': sum(r.value for r in responses) / len(responses),
-                    'total_records': paginated.total,
-                    'has_more': paginated.has_next
+                    'average': float(page_values.mean()),
+                    'total_records': len(values),
+                    'has_more': offset + per_page < len(values)
                 }
 
         # Get goal completion stats
@@ -4093,15 +6144,16 @@ def get_client_analytics(client_id):
             'completion_data': []
         }
 
-        for goal in goals:
-            completions = goal.completions.all()
-            completed_count = sum(1 for c in completions if c.completed)
-            total_days = len(completions)
-            goal_stats['completion_data'].append({
-                'goal': goal.goal_text,
-                'week_start': goal.week_start.isoformat(),
-                'completion_rate': (completed_count / total_days * 100) if total_days > 0 else 0
-            })
+        if goals:
+            first_week = min(goal.week_start for goal in goals)
+            last_day = max(max(goal.week_start for goal in goals) + timedelta(days=6), end_date)
+            grid = GoalGrid.load([goal.id for goal in goals], first_week, (last_day - first_week).days + 1)
+            for goal in goals:
+                goal_stats['completion_data'].append({
+                    'goal': goal.goal_text,
+                    'week_start': goal.week_start.isoformat(),
+                    'completion_rate': grid.completion_rate(goal.id)
+                })
 
         # Get mission completion stats
         missions = TherapistNote.query.filter_by(
@@ -4138,6 +6190,125 @@ def get_client_analytics(client_id):
         return jsonify({'error': str(e)}), 500
 
 
+INSIGHT_DEFAULT_DAYS = 30
+INSIGHT_MAX_DAYS = 365
+INSIGHT_REFRESH_DELAY = 60  # seconds; check-ins inside this window share one refresh
+INSIGHT_UPSERT_CHUNK = 1000
+
+
+def load_insight_batch(client_ids, days=INSIGHT_DEFAULT_DAYS, today=None):
+    """Load the insight window for many clients in one grouped query.
+
+    The window covers today - days through today. Emotional and medication
+    values come from the check-in row, and sleep from the client's sleep
+    category response that day. The query cost does not depend on the
+    window length.
+    """
+    today = today or date.today()
+    start_date = today - timedelta(days=days)
+    client_ids = list(client_ids)
+    if not client_ids:
+        return WindowBatch([], start_date, days + 1, np.empty((0, days + 1, 3)), np.empty((0, days + 1), bool))
+
+    sleep_ids = [row[0] for row in db.session.query(TrackingCategory.id).filter(
+        TrackingCategory.name.ilike('%sleep%'))]
+
+    rows = db.session.query(
+        DailyCheckin.client_id,
+        DailyCheckin.checkin_date,
+        func.max(DailyCheckin.emotional_value),
+        func.max(DailyCheckin.medication_value),
+        func.max(CategoryResponse.value)
+    ).outerjoin(
+        CategoryResponse, and_(
+            CategoryResponse.client_id == DailyCheckin.client_id,
+            CategoryResponse.response_date == DailyCheckin.checkin_date,
+            CategoryResponse.category_id.in_(sleep_ids or [-1])
+        )
+    ).filter(
+        DailyCheckin.client_id.in_(client_ids),
+        DailyCheckin.checkin_date.between(start_date, today)
+    ).group_by(DailyCheckin.client_id, DailyCheckin.checkin_date).all()
+
+    return WindowBatch.from_rows(client_ids, rows, start_date, days + 1)
+
+
+def refresh_client_insights(client_ids, days=INSIGHT_DEFAULT_DAYS, today=None):
+    """Recompute and store every rule's outcome for the clients over one window.
+
+    Each (client, rule, window) row is upserted whether or not the rule fired,
+    so ids and dismissals survive refreshes. A dismissal is cleared once the
+    rule stops firing, and first_seen_at restarts when it fires again.
+    Returns the number of active insights; the caller commits.
+    """
+    batch = load_insight_batch(client_ids, days, today)
+    insights = build_insights(batch)
+    now = datetime.utcnow()
+
+    rows = []
+    for client_id in batch.client_ids:
+        fired = {insight['rule']: insight for insight in insights[client_id]}
+        for rule in INSIGHT_RULES:
+            insight = fired.get(rule.name)
+            rows.append({
+                'client_id': client_id,
+                'rule': rule.name,
+                'window_days': days,
+                'is_active': insight is not None,
+                'priority': insight['priority'] if insight else None,
+                'payload': {key: value for key, value in insight.items()
+                            if key not in ('rule', 'client_id', 'priority')} if insight else None,
+                'first_seen_at': now,
+                'computed_at': now
+            })
+
+    for offset in range(0, len(rows), INSIGHT_UPSERT_CHUNK):
+        stmt = pg_insert(ClientInsight).values(rows[offset:offset + INSIGHT_UPSERT_CHUNK])
+        still_active = and_(stmt.excluded.is_active, ClientInsight.is_active)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['client_id', 'rule', 'window_days'],
+            set_={
+                'is_active': stmt.excluded.is_active,
+                'priority': stmt.excluded.priority,
+                'payload': stmt.excluded.payload,
+                'first_seen_at': case((still_active, ClientInsight.first_seen_at),
+                                      else_=stmt.excluded.first_seen_at),
+                'computed_at': stmt.excluded.computed_at,
+                'dismissed_at': case((stmt.excluded.is_active, ClientInsight.dismissed_at)),
+                'dismissed_by': case((stmt.excluded.is_active, ClientInsight.dismissed_by))
+            }
+        ))
+
+    return sum(len(items) for items in insights.values())
+
+
+def schedule_insight_refresh(client_id):
+    """Queue a background insight refresh for a client, at most one per INSIGHT_REFRESH_DELAY.
+
+    The first check-in sets a short-lived Redis marker and schedules the task
+    with a countdown; later check-ins inside that window ride along. Without
+    Celery or Redis nothing is queued and the read endpoint refreshes stale
+    windows itself.
+    """
+    if not celery or not redis_client:
+        return False
+
+    key = f"insights_refresh:{client_id}"
+    try:
+        if not redis_client.set(key, 1, nx=True, ex=INSIGHT_REFRESH_DELAY * 2):
+            return False
+        from celery_app import refresh_client_insights_task
+        refresh_client_insights_task.apply_async(args=[client_id], countdown=INSIGHT_REFRESH_DELAY)
+        return True
+    except Exception as e:
+        logger.warning(f"Could not schedule insight refresh for client {client_id}: {e}")
+        try:
+            redis_client.delete(key)
+        except Exception:
+            pass
+        return False
+
+
 @app.route('/api/therapist/ai-insights/<int:client_id>', methods=['GET'])
 @require_auth(['therapist'])
 def get_client_ai_insights(client_id):
@@ -4155,155 +6326,39 @@ def get_client_ai_insights(client_id):
         if not client:
             return jsonify({'error': 'Client not found'}), 404
 
-        insights = []
-
-        # Analyze last 30 days for patterns
-        thirty_days_ago = date.today() - timedelta(days=30)
-        all_checkins = client.checkins.filter(
-            DailyCheckin.checkin_date >= thirty_days_ago
-        ).order_by(DailyCheckin.checkin_date).all()
-
-        # Need minimum data
-        if len(all_checkins) < 5:
-            return jsonify({
-                'success': True,
-                'insights': [],
-                'message': 'Not enough data for analysis'
-            })
-
-        # Split into periods for comparison
-        midpoint = len(all_checkins) // 2
-        first_half = all_checkins[:midpoint]
-        second_half = all_checkins[midpoint:]
-
-        # 1. EMOTIONAL DECLINE DETECTION
-        emotional_first = [c.emotional_value for c in first_half if c.emotional_value]
-        emotional_second = [c.emotional_value for c in second_half if c.emotional_value]
-
-        if emotional_first and emotional_second:
-            avg_first = sum(emotional_first) / len(emotional_first)
-            avg_second = sum(emotional_second) / len(emotional_second)
-            decline_percent = ((avg_first - avg_second) / avg_first * 100) if avg_first > 0 else 0
+        days = min(max(request.args.get('days', INSIGHT_DEFAULT_DAYS, type=int), 7), INSIGHT_MAX_DAYS)
 
-            if decline_percent > 20:  # 20% decline
-                insights.append({
-                    'id': f'{client.id}_emotional_{int(time.time())}',
-                    'client_id': client.id,
-                    'priority': 'critical' if decline_percent > 30 else 'warning',
-                    'title': 'therapist.declining_emotional_state',
-                    'description': 'therapist.emotional_decline_desc',
-                    'description_params': {'percent': int(decline_percent)},
-                    'recommendation': 'therapist.schedule_session_rec',
-                    'trend': 'declining',
-                    'trend_description': 'therapist.from_to_trend',
-                    'trend_params': {'from': f'{avg_first:.1f}', 'to': f'{avg_second:.1f}'}
-                })
-        # 2. INCONSISTENT CHECK-INS
-        days_between_checkins = []
-        for i in range(1, len(all_checkins)):
-            days_diff = (all_checkins[i].checkin_date - all_checkins[i - 1].checkin_date).days
-            days_between_checkins.append(days_diff)
-
-        if days_between_checkins:
-            avg_gap = sum(days_between_checkins) / len(days_between_checkins)
-            if avg_gap > 3:  # More than 3 days average between check-ins
-                insights.append({
-                    'id': f'{client.id}_engagement_{int(time.time())}',
-                    'client_id': client.id,
-                    'priority': 'warning',
-                    'title': 'therapist.inconsistent_engagement',
-                    'description': 'therapist.inconsistent_desc',
-                    'description_params': {'days': int(avg_gap)},
-                    'recommendation': 'therapist.discuss_barriers_rec',
-                    'trend': 'stable',
-                    'trend_description': 'therapist.checkins_in_days',
-                    'trend_params': {'count': len(all_checkins), 'days': 30}  # Using 30 since we're analyzing 30 days
-                })
+        # Windows slide with the calendar, so anything computed before today is stale
+        computed_at = db.session.query(func.min(ClientInsight.computed_at)).filter_by(
+            client_id=client.id, window_days=days).scalar()
+        if computed_at is None or computed_at.date() < datetime.utcnow().date():
+            refresh_client_insights([client.id], days)
+            db.session.commit()
 
-        # 3. MEDICATION ADHERENCE
-        med_values = [c.medication_value for c in all_checkins if c.medication_value is not None]
-        if med_values and sum(1 for m in med_values if m < 3) > len(med_values) * 0.3:
-            non_adherent_days = sum(1 for m in med_values if m < 3)
-            insights.append({
-                'id': f'{client.id}_medication_{int(time.time())}',
-                'client_id': client.id,
-                'priority': 'warning' if non_adherent_days < 10 else 'critical',
-                'title': 'therapist.medication_concerns',
-                'description': 'therapist.medication_desc',
-                'description_params': {'days': non_adherent_days},
-                'recommendation': 'therapist.discuss_medication_rec',
-                'trend': 'declining',
-                'trend_description': 'therapist.non_adherent_percent',
-                'trend_params': {'percent': int((non_adherent_days / 30) * 100)}
-            })
+        insights = ClientInsight.query.filter_by(
+            client_id=client.id,
+            window_days=days,
+            is_active=True,
+            dismissed_at=None
+        ).all()
+        insights.sort(key=lambda insight: INSIGHT_PRIORITY_ORDER.get(insight.priority, 3))
 
-        # 4. POSITIVE PROGRESS
-        if emotional_first and emotional_second:
-            improvement = avg_second - avg_first
-            improvement_percent=(avg_second - avg_first)/(avg_first *100)
-            insights.append({
-                'id': f'{client.id}_progress_{int(time.time())}',
-                'client_id': client.id,
-                'priority': 'info',
-                'title': 'therapist.positive_progress',
-                'description': 'therapist.improvement_desc',
-                'description_params': {'percent': int(improvement_percent)},
-                'recommendation': 'therapist.acknowledge_progress_rec',
-                'trend': 'improving',
-                'trend_description': 'therapist.averaging_score',
-                'trend_params': {'score': f'{avg_second:.1f}'}
-            })
-        # 5. CRISIS DETECTION
-        if len(emotional_second) >= 3:
-            last_three = emotional_second[-3:]
-            if all(e <= 2 for e in last_three) and len(emotional_first) > 0:
-                avg_first = sum(emotional_first) / len(emotional_first)
-                if avg_first > 3:
-                    insights.append({
-                        'id': f'{client.id}_crisis_{int(time.time())}',
-                        'client_id': client.id,
-                        'priority': 'critical',
-                        'title': 'therapist.potential_crisis',
-                        'description': 'therapist.crisis_desc',
-                        'description_params': {},
-                        'recommendation': 'therapist.immediate_outreach_rec',
-                        'trend': 'declining',
-                        'trend_description': 'therapist.urgent_attention',
-                        'trend_params': {}
-                    })
-        # 6. SLEEP QUALITY ANALYSIS (if tracking)
-        sleep_responses = []
-        for checkin in all_checkins:
-            sleep_cat = CategoryResponse.query.join(TrackingCategory).filter(
-                CategoryResponse.client_id == client.id,
-                CategoryResponse.response_date == checkin.checkin_date,
-                TrackingCategory.name.ilike('%sleep%')
-            ).first()
-            if sleep_cat:
-                sleep_responses.append(sleep_cat.value)
-
-        if len(sleep_responses) >= 7:
-            poor_sleep_days = sum(1 for s in sleep_responses[-7:] if s <= 2)
-            if poor_sleep_days >= 4:  # Poor sleep 4+ of last 7 days
-                insights.append({
-                    'id': f'{client.id}_sleep_{int(time.time())}',
-                    'client_id': client.id,
-                    'priority': 'warning',
-                    'title': 'therapist.sleep_concerns',
-                    'description': 'therapist.sleep_desc',
-                    'description_params': {'days': poor_sleep_days},
-                    'recommendation': 'therapist.sleep_hygiene_rec',
-                    'trend': 'stable',
-                    'trend_description': 'therapist.persistent_sleep',
-                    'trend_params': {}
+        # Need minimum data
+        if not insights:
+            checkins = DailyCheckin.query.filter(
+                DailyCheckin.client_id == client.id,
+                DailyCheckin.checkin_date >= date.today() - timedelta(days=days)
+            ).count()
+            if checkins < INSIGHT_MIN_CHECKINS:
+                return jsonify({
+                    'success': True,
+                    'insights': [],
+                    'message': 'Not enough data for analysis'
                 })
-        # Sort by priority
-        priority_order = {'critical': 0, 'warning': 1, 'info': 2}
-        insights.sort(key=lambda x: priority_order.get(x['priority'], 3))
 
         return jsonify({
             'success': True,
-            'insights': insights[:10]  # Limit to top 10
+            'insights': [insight.to_dict() for insight in insights[:10]]  # Limit to top 10
         })
 
     except Exception as e:
@@ -4314,12 +6369,139 @@ def get_client_ai_insights(client_id):
 @app.route('/api/therapist/dismiss-insight/<string:insight_id>', methods=['POST'])
 @require_auth(['therapist'])
 def dismiss_insight(insight_id):
-    """Dismiss an AI insight"""
+    """Dismiss an AI insight until its rule stops firing"""
     try:
-        # In a real implementation, you'd track dismissed insights in the database
-        # For now, just return success
+        therapist = request.current_user.therapist
+        key = ClientInsight.parse_insight_id(insight_id)
+        if not key:
+            return jsonify({'error': 'Insight not found'}), 404
+
+        client_id, rule, window_days = key
+        insight = ClientInsight.query.join(Client, Client.id == ClientInsight.client_id).filter(
+            ClientInsight.client_id == client_id,
+            ClientInsight.rule == rule,
+            ClientInsight.window_days == window_days,
+            Client.therapist_id == therapist.id
+        ).first()
+
+        if not insight:
+            return jsonify({'error': 'Insight not found'}), 404
+
+        if not insight.dismissed_at:
+            insight.dismissed_at = datetime.utcnow()
+            insight.dismissed_by = request.current_user.id
+            db.session.commit()
+
+        logger.info('insight_dismissed', extra={
+            'extra_data': {'client_id': client_id, 'rule': rule, 'window_days': window_days,
+                           'request_id': g.request_id},
+            'request_id': g.request_id,
+            'user_id': request.current_user.id
+        })
+
         return jsonify({'success': True})
     except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+# ============= CASELOAD TRIAGE =============
+
+TRIAGE_WINDOW_DAYS = 30
+TRIAGE_THERAPISTS_PER_TASK = 25
+
+
+def triage_therapist_ids():
+    """Therapists with at least one active client, i.e. everyone the triage scan covers"""
+    return [row[0] for row in db.session.query(Client.therapist_id).filter(
+        Client.is_active == True,
+        Client.therapist_id.isnot(None)
+    ).distinct().order_by(Client.therapist_id)]
+
+
+def run_triage_scan(therapist_ids, days=TRIAGE_WINDOW_DAYS, today=None):
+    """Score every active client of the given therapists and replace their ranked triage lists.
+
+    The clients come from one query and their windows from one grouped query
+    (load_insight_batch); rules, scores and per-therapist ranks are then
+    computed over the whole batch at once, so cost grows linearly with the
+    number of clients. Returns the number of clients ranked; the caller commits.
+    """
+    therapist_ids = list(therapist_ids)
+    clients = db.session.query(Client.id, Client.therapist_id).filter(
+        Client.therapist_id.in_(therapist_ids),
+        Client.is_active == True
+    ).order_by(Client.id).all()
+
+    ClientTriage.query.filter(ClientTriage.therapist_id.in_(therapist_ids)).delete(synchronize_session=False)
+    if not clients:
+        return 0
+
+    batch = load_insight_batch([row.id for row in clients], days, today)
+    score, critical, warning, fired = triage_scores(batch)
+    rank = rank_within_groups([row.therapist_id for row in clients], score, batch.client_ids)
+    checkins = batch.checkin_counts
+    rule_names = [rule.name for rule in INSIGHT_RULES]
+    now = datetime.utcnow()
+
+    rows = [{
+        'client_id': row.id,
+        'therapist_id': row.therapist_id,
+        'rank': int(rank[i]),
+        'score': int(score[i]),
+        'critical_count': int(critical[i]),
+        'warning_count': int(warning[i]),
+        'rules': [name for name, hit in zip(rule_names, fired[i]) if hit],
+        'checkin_count': int(checkins[i]),
+        'window_days': days,
+        'computed_at': now
+    } for i, row in enumerate(clients)]
+
+    for offset in range(0, len(rows), INSIGHT_UPSERT_CHUNK):
+        stmt = pg_insert(ClientTriage).values(rows[offset:offset + INSIGHT_UPSERT_CHUNK])
+        # A client reassigned mid-scan may still hold a row under the old therapist
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['client_id'],
+            set_={column: stmt.excluded[column] for column in rows[0] if column != 'client_id'}
+        ))
+
+    return len(rows)
+
+
+@app.route('/api/therapist/triage', methods=['GET'])
+@require_auth(['therapist'])
+def get_therapist_triage():
+    """Clients ranked by how urgently they need attention, from the latest triage scan"""
+    try:
+        therapist = request.current_user.therapist
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+
+        # Therapists the scan has not reached yet get one inline
+        if not db.session.query(ClientTriage.query.filter_by(therapist_id=therapist.id).exists()).scalar():
+            run_triage_scan([therapist.id])
+            db.session.commit()
+
+        rows = db.session.query(ClientTriage, Client.client_serial, Client.client_name).join(
+            Client, Client.id == ClientTriage.client_id
+        ).filter(
+            ClientTriage.therapist_id == therapist.id,
+            Client.is_active == True
+        ).order_by(ClientTriage.rank).limit(limit).all()
+
+        triage = []
+        for entry, client_serial, client_name in rows:
+            item = entry.to_dict()
+            item.update(client_serial=client_serial, client_name=client_name)
+            triage.append(item)
+
+        return jsonify({
+            'success': True,
+            'triage': triage,
+            'computed_at': triage[0]['computed_at'] if triage else None
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Triage error for therapist {request.current_user.id}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
@@ -4356,7 +6538,54 @@ def get_system_stats():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/admin/periodic-tasks', methods=['GET'])
+@require_auth(['therapist'])  # Could restrict to admin role
+def get_periodic_task_runs():
+    """Recent runs of the scheduled Celery tasks, with 24h totals and current lock holders"""
+    try:
+        task_name = request.args.get('task')
+        limit = min(request.args.get('limit', 50, type=int), 500)
+
+        query = PeriodicTaskRun.query
+        if task_name:
+            query = query.filter_by(task_name=task_name)
+        runs = query.order_by(PeriodicTaskRun.started_at.desc()).limit(limit).all()
+
+        since = datetime.utcnow() - timedelta(hours=24)
+        succeeded = PeriodicTaskRun.status == 'succeeded'
+        totals = db.session.query(
+            PeriodicTaskRun.task_name,
+            func.count(PeriodicTaskRun.id),
+            func.count(PeriodicTaskRun.id).filter(succeeded),
+            func.count(PeriodicTaskRun.id).filter(PeriodicTaskRun.status == 'failed'),
+            func.count(PeriodicTaskRun.id).filter(PeriodicTaskRun.status == 'skipped'),
+            func.avg(PeriodicTaskRun.duration_ms).filter(succeeded),
+            func.max(PeriodicTaskRun.duration_ms),
+            func.max(PeriodicTaskRun.started_at)
+        ).filter(PeriodicTaskRun.started_at >= since).group_by(PeriodicTaskRun.task_name).all()
+
+        tasks = {}
+        for name, total, ok, failed, skipped, avg_ms, max_ms, last_started in totals:
+            tasks[name] = {
+                'runs': total,
+                'succeeded': ok,
+                'failed': failed,
+                'skipped': skipped,
+                'avg_duration_ms': round(float(avg_ms)) if avg_ms is not None else None,
+                'max_duration_ms': max_ms,
+                'last_started_at': last_started.isoformat() if last_started else None,
+                'running_on': periodic_task_lock.holder(name)
+            }
+
+        return jsonify({
+            'success': True,
+            'tasks': tasks,
+            'runs': [run.to_dict() for run in runs]
+        })
 
+    except Exception as e:
+        logger.error(f"Error getting periodic task runs: {str(e)}")
+        return jsonify({'error': 'Failed to get periodic task runs'}), 500
 
 
 # ============= CLIENT REPORT ENDPOINTS =============
@@ -5449,6 +7678,17 @@ def test_pdf_libraries():
     return results
 
 
+def weekly_report_window(today=None):
+    """(week_start, week_end, week_num, year) for the seven days ending yesterday"""
+    today = today or date.today()
+    week_end = today - timedelta(days=1)  # Yesterday
+    week_start = week_end - timedelta(days=6)  # 7 days before yesterday
+
+    # For the week number, use the week of the middle day of the period
+    middle_day = week_start + timedelta(days=3)
+    return week_start, week_end, middle_day.isocalendar()[1], middle_day.year
+
+
 def create_weekly_report_pdf(client, therapist, week_start, week_end, week_num, year, lang='en'):
     """Create PDF report with proper Unicode support via WeasyPrint"""
     # DEBUG: Check what types we're receiving
@@ -6680,6 +8920,26 @@ def save_weekly_report_settings():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/therapist/weekly-report-status', methods=['GET'])
+@require_auth(['therapist'])
+def get_weekly_report_status():
+    """Delivery progress of the therapist's recent weekly reports"""
+    try:
+        therapist = request.current_user.therapist
+        deliveries = WeeklyReportDelivery.query.filter_by(therapist_id=therapist.id).order_by(
+            WeeklyReportDelivery.week_start.desc()
+        ).limit(8).all()
+
+        return jsonify({
+            'success': True,
+            'deliveries': [delivery.to_dict() for delivery in deliveries]
+        })
+
+    except Exception as e:
+        logger.error(f"Error getting weekly report status: {str(e)}")
+        return jsonify({'error': 'Failed to get weekly report status'}), 500
+
+
 @app.route('/api/therapist/test-weekly-report', methods=['POST'])
 @require_auth(['therapist'])
 def test_weekly_report():
@@ -6768,11 +9028,7 @@ def test_weekly_report():
             return jsonify({'error': 'Failed to generate any PDF reports'}), 500
 
         # Send email
-        server = smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT'])
-        server.starttls()
-        server.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
-        server.send_message(msg)
-        server.quit()
+        smtp_delivery.send_message(msg)
 
         return jsonify({
             'success': True,
@@ -7085,11 +9341,7 @@ Best regards,
             msg.attach(pdf_attachment)
 
             # Send email
-            server = smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT'])
-            server.starttls()
-            server.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
-            server.send_message(msg)
-            server.quit()
+            smtp_delivery.send_message(msg)
 
             return jsonify({
                 'success': True,
@@ -7170,9 +9422,13 @@ def detailed_health_check():
 
     # Check email
     email_configured = bool(app.config.get('MAIL_USERNAME'))
+    breaker = email_circuit_breaker.metrics()
     health_status['services']['email'] = {
-        'status': 'configured' if email_configured else 'not_configured'
+        'status': 'configured' if email_configured else 'not_configured',
+        'circuit_breaker': breaker
     }
+    if breaker['state'] in ('open', 'half_open') and health_status['status'] == 'healthy':
+        health_status['status'] = 'degraded'
 
     # Check RabbitMQ
     try:
@@ -7209,7 +9465,7 @@ def detailed_health_check():
         'data_retention_policies': bool(PrivacyCompliance.RETENTION_PERIODS)
     }
 
-    return jsonify(health_status), 200 if health_status['status'] == 'healthy' else 503
+    return jsonify(health_status), 200 if health_status['status'] != 'unhealthy' else 503
 
 @app.route('/api/test-pdf-libs', methods=['GET'])
 def test_pdf_libs():
@@ -7325,6 +9581,8 @@ def ensure_client_names():
 
         if updated_count > 0:
             db.session.commit()
+            for client in clients_without_names:
+                client_autocomplete.client_saved(client)
             print(f"Updated {updated_count} clients with names")
 
     except Exception as e:
@@ -7532,8 +9790,10 @@ def initialize_app_data():
 
 # Don't initialize on import for production
 # Let init_db.py handle it during deployment
-# Initialize based on environment
-if not os.environ.get('PRODUCTION'):
+# Initialize based on environment; workers leave this to the web process and init_db.py
+if WORKER_MODE:
+    pass
+elif not os.environ.get('PRODUCTION'):
     # Development mode
     with app.app_context():
         initialize_database()
@@ -7758,7 +10018,7 @@ def create_client():
                         db.session.add(custom_category)
                         custom_categories_created += 1
 
-        if search_manager.es:
+        if search_manager.configured:
             checkin_stats = {
                 'last_checkin': None,
                 'checkin_count': 0,
@@ -7771,6 +10031,10 @@ def create_client():
 
 
         db.session.commit()
+        cache.delete('caseload_overview', therapist.id)
+        client_search.forget(therapist.id)
+        client_autocomplete.client_saved(client)
+        therapist_stats.client_added(therapist.id, client.is_active)
 
                 # Final verification
         client_categories = ClientTrackingPlan.query.filter_by(client_id=client.id).count()
@@ -7929,9 +10193,39 @@ def delete_client(client_id):
         # Delete all related data (cascade should handle most)
         # But explicitly delete some for safety
 
+        # Capture what the dashboard counters need before the rows disappear
+        was_active = client.is_active
+        pending_missions = TherapistNote.query.filter_by(
+            client_id=client_id,
+            is_mission=True,
+            mission_completed=False
+        ).count()
+        recent_checkin_dates = [row[0] for row in db.session.query(DailyCheckin.checkin_date).filter(
+            DailyCheckin.client_id == client_id,
+            DailyCheckin.checkin_date >= TherapistStatsCache.window_start()
+        )]
+
         # Delete category responses
         CategoryResponse.query.filter_by(client_id=client_id).delete()
 
+        # Delete batch sync keys
+        CheckinSyncKey.query.filter_by(client_id=client_id).delete()
+
+        # Delete engagement summary
+        ClientEngagement.query.filter_by(client_id=client_id).delete()
+
+        # Delete daily rollups
+        ClientDailyRollup.query.filter_by(client_id=client_id).delete()
+
+        # Delete stored insights
+        ClientInsight.query.filter_by(client_id=client_id).delete()
+
+        # Delete triage entry
+        ClientTriage.query.filter_by(client_id=client_id).delete()
+
+        # Delete inactivity alert state
+        ClientInactivityAlert.query.filter_by(client_id=client_id).delete()
+
         # Delete goal completions through goals
         for goal in client.goals:
             GoalCompletion.query.filter_by(goal_id=goal.id).delete()
@@ -7988,6 +10282,10 @@ def delete_client(client_id):
 
         # Commit all deletions
         db.session.commit()
+        cache.delete('caseload_overview', therapist.id)
+        client_search.forget(therapist.id)
+        client_autocomplete.client_removed(therapist.id, client_id)
+        therapist_stats.client_removed(therapist.id, was_active, pending_missions, recent_checkin_dates)
 
         return jsonify({
             'success': True,
@@ -8048,6 +10346,9 @@ def add_therapist_note():
         db.session.add(note)
         db.session.commit()
 
+        if note.is_mission:
+            therapist_stats.mission_added(therapist.id)
+
         return jsonify({
             'success': True,
             'note': {
@@ -8351,41 +10652,23 @@ def client_dashboard():
                 cat['today_value'] = today_values.get(cat_id)
 
 
-            # Get this week's check-ins count
+        # Streak and weekly count come from the maintained engagement summary
         week_start = date.today() - timedelta(days=date.today().weekday())
-        week_end = week_start + timedelta(days=6)
-        week_checkins = client.checkins.filter(
-            DailyCheckin.checkin_date.between(week_start, week_end)
-        ).count()
-
-        # Calculate current streak
-        current_streak = 0
-        check_date = date.today()
-
-        while True:
-            checkin = client.checkins.filter_by(checkin_date=check_date).first()
-            if checkin:
-                current_streak += 1
-                check_date -= timedelta(days=1)
-            else:
-                break
-
-
+        engagement = ClientEngagement.load([client.id])[client.id]
+        week_checkins = engagement.count_since(week_start)
+        current_streak = engagement.current_streak()
 
         weekly_goals = []
-        for goal in client.goals.filter_by(
-                week_start=week_start,
-                is_active=True
-        ):
-            # Get today's completion
-            today_completion = goal.completions.filter_by(
-                completion_date=date.today()
-            ).first()
-
+        goals = client.goals.filter_by(
+            week_start=week_start,
+            is_active=True
+        ).all()
+        today_grid = GoalGrid.load([goal.id for goal in goals], date.today(), 1)
+        for goal in goals:
             weekly_goals.append({
                 'id': goal.id,
                 'text': goal.goal_text,
-                'today_completed': today_completion.completed if today_completion else None
+                'today_completed': today_grid.cell(goal.id, date.today())
             })
 
         # Get reminders
@@ -8410,6 +10693,7 @@ def client_dashboard():
             },
             'week_checkins_count': week_checkins,
             'current_streak': current_streak,
+            'engagement': engagement.to_dict(),
             'tracking_categories': tracking_categories,
             'weekly_goals': weekly_goals,
             'reminders': reminders
@@ -8455,63 +10739,727 @@ def get_consent_status():
                 'version': record.consent_version if record else None
             }
 
-        return jsonify({
-            'success': True,
-            'consents': consent_status
-        })
+        return jsonify({
+            'success': True,
+            'consents': consent_status
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/client/consent', methods=['POST'])
+@require_auth(['client'])
+def update_consent():
+    """Update client consent"""
+    try:
+        client = request.current_user.client
+        data = request.json
+
+        consent_type = data.get('consent_type')
+        consented = data.get('consented')
+
+        if consent_type not in ['data_sharing', 'treatment', 'communication']:
+            return jsonify({'error': 'Invalid consent type'}), 400
+
+        # Create new consent record
+        consent = ConsentRecord(
+            client_id=client.id,
+            consent_type=consent_type,
+            consent_version='1.0',  # Update this when consent forms change
+            consented=consented,
+            ip_address=request.remote_addr
+        )
+        db.session.add(consent)
+        db.session.commit()
+
+        # Audit log
+        log_audit(
+            action='UPDATE_CONSENT',
+            resource_type='consent',
+            resource_id=consent.id,
+            details={
+                'consent_type': consent_type,
+                'consented': consented
+            }
+        )
+
+        return jsonify({
+            'success': True,
+            'message': 'Consent updated successfully'
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+
+
+
+
+
+# ============= GOAL GRID =============
+
+MAX_GOAL_TICKS = 100
+
+
+class GoalGrid:
+    """Dense goal x day matrix of completion states, loaded with one query.
+
+    Cells are True/False for recorded completions and None when nothing was
+    recorded for that goal on that day.
+    """
+
+    def __init__(self, goal_ids, start_date, days=7):
+        self.goal_ids = list(goal_ids)
+        self.start_date = start_date
+        self.days = [start_date + timedelta(days=i) for i in range(days)]
+        self.matrix = {goal_id: [None] * days for goal_id in self.goal_ids}
+
+    @classmethod
+    def load(cls, goal_ids, start_date, days=7):
+        """Load every completion for goal_ids within [start_date, start_date + days)"""
+        grid = cls(goal_ids, start_date, days)
+        if not grid.goal_ids or days <= 0:
+            return grid
+
+        rows = db.session.query(
+            GoalCompletion.goal_id, GoalCompletion.completion_date, GoalCompletion.completed
+        ).filter(
+            GoalCompletion.goal_id.in_(grid.goal_ids),
+            GoalCompletion.completion_date.between(start_date, grid.days[-1])
+        ).all()
+        for goal_id, completion_date, completed in rows:
+            grid.matrix[goal_id][(completion_date - start_date).days] = completed
+        return grid
+
+    def row(self, goal_id):
+        return self.matrix.get(goal_id, [None] * len(self.days))
+
+    def cell(self, goal_id, day):
+        offset = (day - self.start_date).days
+        if 0 <= offset < len(self.days):
+            return self.row(goal_id)[offset]
+        return None
+
+    def as_dict(self, goal_id):
+        """{iso_date: completed_or_None} for one goal, as the goal endpoints return it"""
+        return {day.isoformat(): value for day, value in zip(self.days, self.row(goal_id))}
+
+    def completion_rate(self, goal_id):
+        """Percentage of recorded days marked completed (0 when nothing was recorded)"""
+        recorded = [value for value in self.row(goal_id) if value is not None]
+        return (sum(1 for value in recorded if value) / len(recorded) * 100) if recorded else 0
+
+    @staticmethod
+    def upsert(ticks):
+        """Write (goal_id, completion_date, completed) ticks in one statement; the caller commits"""
+        rows = {}
+        for goal_id, completion_date, completed in ticks:
+            rows[(goal_id, completion_date)] = {
+                'goal_id': goal_id,
+                'completion_date': completion_date,
+                'completed': bool(completed),
+                'created_at': datetime.utcnow()
+            }
+        if not rows:
+            return 0
+
+        stmt = pg_insert(GoalCompletion).values(list(rows.values()))
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['goal_id', 'completion_date'],
+            set_={'completed': stmt.excluded.completed}
+        ))
+        return len(rows)
+
+
+# ============= CHECK-IN WRITE ENGINE =============
+
+class CheckinValidationError(ValueError):
+    """Raised when a submitted check-in cannot be written"""
+
+
+class CheckinWriteEngine:
+    """Set-based writer for daily check-ins.
+
+    Category ids are validated against one preloaded set (the client's active
+    default categories plus their custom categories) and every write is a
+    fixed number of INSERT ... ON CONFLICT DO UPDATE statements, so the cost
+    of a submission does not grow with the number of categories.
+    """
+
+    MAX_NOTE_LENGTH = 500
+    MAX_BATCH_DAYS = 31
+    MAX_BACKFILL_DAYS = 365
+
+    def __init__(self, client):
+        self.client = client
+
+        # Active default categories: {category_id: name}
+        rows = db.session.query(TrackingCategory.id, TrackingCategory.name).join(
+            ClientTrackingPlan, ClientTrackingPlan.category_id == TrackingCategory.id
+        ).filter(
+            ClientTrackingPlan.client_id == client.id,
+            ClientTrackingPlan.is_active == True
+        ).all()
+        self.default_categories = {row[0]: row[1] for row in rows}
+
+        # Client's custom categories: {custom_category_id: name}
+        rows = db.session.query(CustomCategory.id, CustomCategory.name, CustomCategory.reverse_scoring).filter(
+            CustomCategory.client_id == client.id
+        ).all()
+        self.custom_categories = {row[0]: row[1] for row in rows}
+
+        # Rollup metadata, keyed the same way as category_values
+        self.rollup_names = {str(cat_id): name for cat_id, name in self.default_categories.items()}
+        self.reverse_keys = {str(cat_id) for cat_id, name in self.default_categories.items()
+                             if 'anxiety' in name.lower()}
+        self.reverse_keys.update(f'custom_{row[0]}' for row in rows if row[2])
+
+    @staticmethod
+    def _legacy_field(category_name):
+        """Map a default category to the legacy DailyCheckin column it mirrors"""
+        name = category_name.lower()
+        if 'emotion' in name:
+            return 'emotional'
+        if 'medication' in name:
+            return 'medication'
+        if 'activity' in name:
+            return 'activity'
+        return None
+
+    @classmethod
+    def parse_date(cls, date_str):
+        """Parse a YYYY-MM-DD check-in date and enforce the allowed range"""
+        if not isinstance(date_str, str) or len(date_str) != 10:
+            raise CheckinValidationError('Invalid date format')
+        try:
+            checkin_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        except ValueError:
+            raise CheckinValidationError('Invalid date format. Use YYYY-MM-DD')
+        if checkin_date > date.today():
+            raise CheckinValidationError('Cannot submit check-in for future dates')
+        if checkin_date < date.today() - timedelta(days=cls.MAX_BACKFILL_DAYS):
+            raise CheckinValidationError('Cannot submit check-in for dates more than 1 year ago')
+        return checkin_date
+
+    @staticmethod
+    def _mapping(value, field):
+        """A missing field is empty; anything other than an object is a validation error"""
+        if value is None:
+            return {}
+        if not isinstance(value, dict):
+            raise CheckinValidationError(f'{field} must be an object.')
+        return value
+
+    def prepare(self, checkin_date, category_responses=None, category_notes=None, goal_completions=None):
+        """Validate one day's payload and return the rows to write.
+
+        Unknown category ids are dropped, matching the previous behaviour of
+        the check-in endpoint; malformed values raise CheckinValidationError.
+        """
+        category_responses = self._mapping(category_responses, 'category_responses')
+        category_notes = dict(self._mapping(category_notes, 'category_notes'))
+        goal_completions = self._mapping(goal_completions, 'goal_completions')
+
+        for cat_id, notes in category_notes.items():
+            if notes is not None and not isinstance(notes, str):
+                raise CheckinValidationError(f'Notes for category {cat_id} must be text.')
+            if notes and len(notes) > self.MAX_NOTE_LENGTH:
+                raise CheckinValidationError(
+                    f'Notes too long for category {cat_id}. Maximum {self.MAX_NOTE_LENGTH} characters.')
+            category_notes[cat_id] = sanitize_input(notes)[:self.MAX_NOTE_LENGTH] if notes else ''
+
+        default_values = {}
+        custom_values = {}
+        legacy = {}
+
+        for cat_id, value in category_responses.items():
+            try:
+                value_int = int(value)
+            except (ValueError, TypeError):
+                raise CheckinValidationError(f'Invalid value for category {cat_id}. Must be a number.')
+            if value_int < 0 or value_int > 5:
+                raise CheckinValidationError(f'Invalid value for category {cat_id}. Must be between 0 and 5.')
+
+            notes = category_notes.get(str(cat_id), '')
+            if isinstance(cat_id, str) and cat_id.startswith('custom_'):
+                try:
+                    custom_id = int(cat_id.replace('custom_', ''))
+                except ValueError:
+                    raise CheckinValidationError(f'Invalid category id {cat_id}.')
+                if custom_id in self.custom_categories:
+                    custom_values[custom_id] = (value_int, notes)
+                continue
+
+            try:
+                category_id = int(cat_id)
+            except (ValueError, TypeError):
+                raise CheckinValidationError(f'Invalid category id {cat_id}.')
+            if category_id not in self.default_categories:
+                continue
+
+            default_values[category_id] = (value_int, notes)
+            field = self._legacy_field(self.default_categories[category_id])
+            if field:
+                legacy[field] = (value_int, notes)
+
+        goals = {}
+        for goal_id, completed in goal_completions.items():
+            try:
+                goals[int(goal_id)] = bool(completed)
+            except (ValueError, TypeError):
+                raise CheckinValidationError(f'Invalid goal id {goal_id}.')
+
+        return {
+            'checkin_date': checkin_date,
+            'default_values': default_values,
+            'custom_values': custom_values,
+            'legacy': legacy,
+            'goal_completions': goals
+        }
+
+    def write(self, entries):
+        """Upsert one or more prepared days in the current transaction.
+
+        Returns one result dict per entry; the caller commits.
+        """
+        if not entries:
+            return []
+
+        client_id = self.client.id
+        checkin_time = datetime.now().time()
+        dates = [entry['checkin_date'] for entry in entries]
+
+        # 1. Upsert the DailyCheckin rows. Legacy columns only change when the
+        # matching category was submitted, as with the old ORM update path.
+        checkin_rows = []
+        for entry in entries:
+            row = {
+                'client_id': client_id,
+                'checkin_date': entry['checkin_date'],
+                'checkin_time': checkin_time
+            }
+            for field in ('emotional', 'medication', 'activity'):
+                value, notes = entry['legacy'].get(field, (None, None))
+                row[f'{field}_value'] = value
+                row[f'{field}_notes_encrypted'] = encrypt_field(notes) if value is not None else None
+            checkin_rows.append(row)
+
+        stmt = pg_insert(DailyCheckin).values(checkin_rows)
+        update_set = {'checkin_time': stmt.excluded.checkin_time}
+        for field in ('emotional', 'medication', 'activity'):
+            value_col = f'{field}_value'
+            notes_col = f'{field}_notes_encrypted'
+            submitted = stmt.excluded[value_col].isnot(None)
+            update_set[value_col] = case(
+                (submitted, stmt.excluded[value_col]), else_=getattr(DailyCheckin, value_col))
+            update_set[notes_col] = case(
+                (submitted, stmt.excluded[notes_col]), else_=getattr(DailyCheckin, notes_col))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['client_id', 'checkin_date'],
+            set_=update_set
+        ).returning(DailyCheckin.id, DailyCheckin.checkin_date, literal_column('(xmax = 0)'))
+        checkin_ids = {row[1]: (row[0], bool(row[2])) for row in db.session.execute(stmt)}
+
+        # Streak / rolling-count summary only changes when a new day appears
+        ClientEngagement.record_checkins(
+            client_id, [checkin_date for checkin_date, (_, created) in checkin_ids.items() if created])
+
+        # 2. Drop responses for these dates whose category was not resubmitted
+        default_keep = [(entry['checkin_date'], cat_id)
+                        for entry in entries for cat_id in entry['default_values']]
+        custom_keep = [(entry['checkin_date'], cat_id)
+                       for entry in entries for cat_id in entry['custom_values']]
+        stale_default = and_(
+            CategoryResponse.category_id.isnot(None),
+            tuple_(CategoryResponse.response_date, CategoryResponse.category_id).notin_(default_keep)
+            if default_keep else true()
+        )
+        stale_custom = and_(
+            CategoryResponse.custom_category_id.isnot(None),
+            tuple_(CategoryResponse.response_date, CategoryResponse.custom_category_id).notin_(custom_keep)
+            if custom_keep else true()
+        )
+        CategoryResponse.query.filter(
+            CategoryResponse.client_id == client_id,
+            CategoryResponse.response_date.in_(dates),
+            or_(stale_default, stale_custom)
+        ).delete(synchronize_session=False)
+
+        # 3. One upsert per category kind, each against its partial unique index
+        default_rows = [{
+            'client_id': client_id,
+            'category_id': cat_id,
+            'custom_category_id': None,
+            'response_date': entry['checkin_date'],
+            'value': value,
+            'notes': notes
+        } for entry in entries for cat_id, (value, notes) in entry['default_values'].items()]
+        custom_rows = [{
+            'client_id': client_id,
+            'category_id': None,
+            'custom_category_id': cat_id,
+            'response_date': entry['checkin_date'],
+            'value': value,
+            'notes': notes
+        } for entry in entries for cat_id, (value, notes) in entry['custom_values'].items()]
+
+        for rows, column in ((default_rows, CategoryResponse.category_id),
+                             (custom_rows, CategoryResponse.custom_category_id)):
+            if not rows:
+                continue
+            stmt = pg_insert(CategoryResponse).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['client_id', column.key, 'response_date'],
+                index_where=column.isnot(None),
+                set_={'value': stmt.excluded.value, 'notes': stmt.excluded.notes}
+            )
+            db.session.execute(stmt)
+
+        # Daily rollups mirror the full set of responses just written for each day
+        rollup_rows = []
+        for entry in entries:
+            values = {str(cat_id): value for cat_id, (value, _) in entry['default_values'].items()}
+            values.update({f'custom_{cat_id}': value for cat_id, (value, _) in entry['custom_values'].items()})
+            mean_mood, flags = ClientDailyRollup.derive(values, self.rollup_names, self.reverse_keys)
+            rollup_rows.append({
+                'client_id': client_id,
+                'rollup_date': entry['checkin_date'],
+                'category_values': values,
+                'mean_mood': mean_mood,
+                'flags': flags,
+                'updated_at': datetime.utcnow()
+            })
+        stmt = pg_insert(ClientDailyRollup).values(rollup_rows)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['client_id', 'rollup_date'],
+            set_={
+                'category_values': stmt.excluded.category_values,
+                'mean_mood': stmt.excluded.mean_mood,
+                'flags': stmt.excluded.flags,
+                'updated_at': stmt.excluded.updated_at
+            }
+        ))
+
+        # 4. Goal completions, restricted to this client's goals
+        goal_ids = {goal_id for entry in entries for goal_id in entry['goal_completions']}
+        owned_goals = set()
+        if goal_ids:
+            owned_goals = {row[0] for row in db.session.query(WeeklyGoal.id).filter(
+                WeeklyGoal.client_id == client_id,
+                WeeklyGoal.id.in_(goal_ids)
+            )}
+        GoalGrid.upsert(
+            (goal_id, entry['checkin_date'], completed)
+            for entry in entries for goal_id, completed in entry['goal_completions'].items()
+            if goal_id in owned_goals
+        )
+
+        # 5. Outbox events for the side effects, committed or rolled back with the check-ins
+        db.session.execute(pg_insert(OutboxEvent), [{
+            'event_type': 'checkin.saved',
+            'aggregate_id': client_id,
+            'payload': {
+                'client_id': client_id,
+                'therapist_id': self.client.therapist_id,
+                'checkin_id': checkin_ids[entry['checkin_date']][0],
+                'checkin_date': entry['checkin_date'].isoformat(),
+                'created': checkin_ids[entry['checkin_date']][1],
+                'responses': [[cat_id, self.default_categories[cat_id], value]
+                              for cat_id, (value, _) in entry['default_values'].items()] +
+                             [[f'custom_{cat_id}', self.custom_categories[cat_id], value]
+                              for cat_id, (value, _) in entry['custom_values'].items()]
+            },
+            'created_at': datetime.utcnow()
+        } for entry in entries])
+
+        results = []
+        for entry in entries:
+            checkin_id, created = checkin_ids[entry['checkin_date']]
+            results.append({
+                'checkin_id': checkin_id,
+                'checkin_date': entry['checkin_date'],
+                'created': created,
+                'categories_tracked': len(entry['default_values']) + len(entry['custom_values']),
+                'goals_updated': sum(1 for goal_id in entry['goal_completions'] if goal_id in owned_goals)
+            })
+        return results
+
+
+class OutboxRelay:
+    """Delivers outbox events to registered consumers, at least once, in commit-safe order.
+
+    Each consumer has its own cursor row. A relay pass locks the cursor
+    (FOR UPDATE SKIP LOCKED, so concurrent relays split the consumers rather
+    than queueing on them), reads the next batch of events after it, hands
+    the consumer's event types to its handler and advances the cursor in
+    the same transaction. A handler that raises leaves the cursor where it
+    was and the batch is delivered again on the next pass, so handlers must
+    be idempotent and must not commit. Handlers raise ConnectionError when
+    their backend is unreachable, which is retried for as long as it lasts;
+    any other error is retried MAX_FAILURES times, then the batch's events
+    are copied to outbox_dead_letters and the cursor moves past them, so
+    one bad batch cannot stall the consumer (or pruning) for good.
+
+    Only events whose transaction id is below the oldest transaction still
+    running are read: sequence ids are handed out before commit, so a later
+    id can become visible first, but nothing can still appear below that
+    horizon.
+    """
+
+    BATCH_SIZE = 200
+    MAX_BATCHES = 25
+    MAX_FAILURES = 10
+
+    def __init__(self):
+        self.consumers = {}
+
+    def consumer(self, name, event_types):
+        """Register handler(events) for the given event types under a cursor called name"""
+        def register(handler):
+            self.consumers[name] = (tuple(event_types), handler)
+            return handler
+        return register
+
+    def relay(self, batch_size=None, max_batches=None):
+        """One pass over every consumer; returns {consumer: events delivered}"""
+        return {name: self.relay_consumer(name, batch_size, max_batches) for name in self.consumers}
+
+    def relay_consumer(self, name, batch_size=None, max_batches=None):
+        event_types, handler = self.consumers[name]
+        batch_size = batch_size or self.BATCH_SIZE
+
+        db.session.execute(pg_insert(OutboxCursor).values(consumer=name).on_conflict_do_nothing())
+        db.session.commit()
+
+        delivered = 0
+        for _ in range(max_batches or self.MAX_BATCHES):
+            horizon = db.session.execute(text("SELECT txid_snapshot_xmin(txid_current_snapshot())")).scalar()
+            cursor = OutboxCursor.query.filter_by(consumer=name).with_for_update(skip_locked=True).first()
+            if cursor is None:
+                # Another relay is on this consumer
+                db.session.rollback()
+                break
+
+            events = OutboxEvent.query.filter(
+                tuple_(OutboxEvent.txid, OutboxEvent.id) > tuple_(cursor.last_txid, cursor.last_event_id),
+                OutboxEvent.txid < horizon
+            ).order_by(OutboxEvent.txid, OutboxEvent.id).limit(batch_size).all()
+            if not events:
+                db.session.rollback()
+                break
+
+            wanted = [event for event in events if event.event_type in event_types]
+            position = (cursor.last_txid, cursor.last_event_id)
+            try:
+                if wanted:
+                    handler(wanted)
+            except Exception as e:
+                dead = [{
+                    'consumer': name, 'event_id': event.id, 'event_type': event.event_type,
+                    'aggregate_id': event.aggregate_id, 'payload': event.payload, 'error': str(e)[:2000]
+                } for event in wanted]
+                end = (events[-1].txid, events[-1].id)
+                db.session.rollback()
+                failures = db.session.execute(update(OutboxCursor).where(OutboxCursor.consumer == name).values(
+                    failures=OutboxCursor.failures + 1,
+                    last_error=str(e)[:2000],
+                    updated_at=datetime.utcnow()
+                ).returning(OutboxCursor.failures)).scalar()
+                db.session.commit()
+                if isinstance(e, ConnectionError) or failures < self.MAX_FAILURES:
+                    logger.error(f"Outbox consumer {name} failed ({failures}), batch will be retried: {e}")
+                else:
+                    self._dead_letter(name, position, end, dead, failures)
+                break
+
+            cursor.last_txid = events[-1].txid
+            cursor.last_event_id = events[-1].id
+            cursor.delivered += len(wanted)
+            cursor.failures = 0
+            cursor.last_error = None
+            cursor.updated_at = datetime.utcnow()
+            db.session.commit()
+            delivered += len(wanted)
+            if len(events) < batch_size:
+                break
+
+        return delivered
+
+    def _dead_letter(self, name, position, end, dead, failures):
+        """Copy a batch that keeps failing to outbox_dead_letters and move the cursor past it"""
+        cursor = OutboxCursor.query.filter_by(consumer=name).with_for_update(skip_locked=True).first()
+        if cursor is None or (cursor.last_txid, cursor.last_event_id) != position:
+            # Another relay has the cursor or already moved it
+            db.session.rollback()
+            return
+        if dead:
+            db.session.execute(pg_insert(OutboxDeadLetter), [dict(row, failures=failures) for row in dead])
+        cursor.last_txid, cursor.last_event_id = end
+        cursor.failures = 0
+        cursor.updated_at = datetime.utcnow()
+        db.session.commit()
+        logger.error(f"Outbox consumer {name} gave up after {failures} failures, "
+                     f"{len(dead)} events moved to outbox_dead_letters")
+
+    def prune(self):
+        """Delete events every registered consumer is past and that are older than OutboxEvent.RETENTION"""
+        cursors = OutboxCursor.query.filter(OutboxCursor.consumer.in_(list(self.consumers))).all()
+        if len(cursors) < len(self.consumers):
+            return 0
+        oldest = min((cursor.last_txid, cursor.last_event_id) for cursor in cursors)
+        deleted = OutboxEvent.query.filter(
+            tuple_(OutboxEvent.txid, OutboxEvent.id) <= tuple_(*oldest),
+            OutboxEvent.created_at < datetime.utcnow() - OutboxEvent.RETENTION
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    def kick(self):
+        """Without Celery there is no relay worker, so deliver right away"""
+        if celery:
+            return
+        try:
+            self.relay()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Inline outbox relay failed, events stay queued: {e}")
+
 
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+outbox_relay = OutboxRelay()
 
 
-@app.route('/api/client/consent', methods=['POST'])
-@require_auth(['client'])
-def update_consent():
-    """Update client consent"""
-    try:
-        client = request.current_user.client
-        data = request.json
+@outbox_relay.consumer('analytics', ['checkin.saved'])
+def relay_checkin_analytics(events):
+    """One ClickHouse row per default category response; a no-op only when ClickHouse is not configured.
 
-        consent_type = data.get('consent_type')
-        consented = data.get('consented')
+    checkin_analytics.category_id is a UInt32 in the default categories' id
+    space, so custom categories (sent as 'custom_<id>') are left out.
+    """
+    if not analytics_store.configured:
+        return
+    if not analytics_store.connect():
+        # Raising keeps the cursor in place so the batch is retried
+        raise ConnectionError("ClickHouse is configured but unreachable")
+    analytics_store.insert_checkins([
+        (event.payload['client_id'], event.payload['therapist_id'],
+         date.fromisoformat(event.payload['checkin_date']), int(category_id), category_name, value)
+        for event in events for category_id, category_name, value in event.payload['responses']
+        if not str(category_id).startswith('custom_')
+    ])
+
+
+@outbox_relay.consumer('search', ['checkin.saved'])
+def relay_checkin_search(events):
+    """Re-index each affected client once with fresh check-in stats.
+
+    Sent synchronously rather than through the bulk indexer's buffer, so the
+    cursor only moves once Elasticsearch has the documents.
+    """
+    if not search_manager.configured:
+        return
+    client_ids = sorted({event.aggregate_id for event in events})
+    stats = SearchManager.checkin_stats(client_ids)
+    search_manager.index_clients_now(Client.query.filter(Client.id.in_(client_ids)).all(), stats)
 
-        if consent_type not in ['data_sharing', 'treatment', 'communication']:
-            return jsonify({'error': 'Invalid consent type'}), 400
 
-        # Create new consent record
-        consent = ConsentRecord(
-            client_id=client.id,
-            consent_type=consent_type,
-            consent_version='1.0',  # Update this when consent forms change
-            consented=consented,
-            ip_address=request.remote_addr
-        )
-        db.session.add(consent)
-        db.session.commit()
+@outbox_relay.consumer('insights', ['checkin.saved'])
+def relay_checkin_insights(events):
+    """Schedule one debounced insight refresh per affected client"""
+    for client_id in {event.aggregate_id for event in events}:
+        schedule_insight_refresh(client_id)
 
-        # Audit log
-        log_audit(
-            action='UPDATE_CONSENT',
-            resource_type='consent',
-            resource_id=consent.id,
-            details={
-                'consent_type': consent_type,
-                'consented': consented
-            }
-        )
 
-        return jsonify({
-            'success': True,
-            'message': 'Consent updated successfully'
-        })
+def queue_checkin_completion_email(user):
+    """Queue the congratulation email sent after a client's first check-in of the day"""
+    try:
+        # Get user's language preference
+        lang = get_language_from_header()
 
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        # Generate positive message
+        positive_messages = {
+            'en': [
+                "Great job completing your daily check-in! Your consistency is admirable.",
+                "Well done! Every check-in brings you closer to your wellness goals.",
+                "Fantastic! Your dedication to tracking your progress is inspiring.",
+                "Excellent work today! Your therapist will be pleased with your commitment.",
+                "Amazing! You're building healthy habits one day at a time."
+            ],
+            'he': [
+                "כל הכבוד על השלמת הצ'ק-אין היומי! העקביות שלך ראויה להערכה.",
+                "עבודה טובה! כל צ'ק-אין מקרב אותך ליעדי הבריאות שלך.",
+                "מצוין! המסירות שלך למעקב אחר ההתקדמות שלך מעוררת השראה.",
+                "עבודה מעולה היום! המטפל שלך ישמח לראות את המחויבות שלך.",
+                "מדהים! אתה בונה הרגלים בריאים יום אחר יום."
+            ],
+            'ru': [
+                "Отличная работа по заполнению ежедневной отметки! Ваша последовательность достойна восхищения.",
+                "Молодец! Каждая отметка приближает вас к вашим целям благополучия.",
+                "Фантастика! Ваша преданность отслеживанию прогресса вдохновляет.",
+                "Отличная работа сегодня! Ваш терапевт будет доволен вашей приверженностью.",
+                "Потрясающе! Вы формируете здоровые привычки день за днем."
+            ],
+            'ar': [
+                "عمل رائع في إكمال تسجيل الحضور اليومي! ثباتك يستحق الإعجاب.",
+                "أحسنت! كل تسجيل حضور يقربك من أهداف عافيتك.",
+                "رائع! تفانيك في تتبع تقدمك ملهم.",
+                "عمل ممتاز اليوم! سيكون معالجك سعيدًا بالتزامك.",
+                "مذهل! أنت تبني عادات صحية يومًا بعد يوم."
+            ]
+        }
 
+        import random
+        messages = positive_messages.get(lang, positive_messages['en'])
+        selected_message = random.choice(messages)
 
+        # Email subject by language
+        subjects = {
+            'en': "Well done on today's check-in! 🌟",
+            'he': "כל הכבוד על הצ'ק-אין של היום! 🌟",
+            'ru': "Молодец, вы выполнили сегодняшнюю отметку! 🌟",
+            'ar': "أحسنت في تسجيل حضور اليوم! 🌟"
+        }
 
+        subject = subjects.get(lang, subjects['en'])
+
+        # Create email with the positive message
+        email_queue = EmailQueue(
+            to_email=user.email,
+            subject=subject,
+            body=selected_message,
+            html_body=f"""
+                    <html>
+                    <body style="font-family: Arial, sans-serif; direction: {'rtl' if lang in ['he', 'ar'] else 'ltr'};">
+                        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                            <h2 style="color: #4CAF50; text-align: center;">{subject}</h2>
+                            <p style="font-size: 18px; line-height: 1.6; color: #333;">
+                                {selected_message}
+                            </p>
+                            <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;">
+                            <p style="color: #666; font-size: 14px; text-align: center;">
+                                {'המסע הטיפולי שלך' if lang == 'he' else
+            'Ваш терапевтический путь' if lang == 'ru' else
+            'رحلتك العلاجية' if lang == 'ar' else
+            'Your Therapeutic Journey'}
+                            </p>
+                        </div>
+                    </body>
+                    </html>
+                    """,
+            status='pending',
+            priority='transactional'
+        )
+        db.session.add(email_queue)
+        db.session.commit()
 
+        # Trigger email processing
+        if celery:
+            from celery_app import process_email_queue_task, MAIL_QUEUES
+            process_email_queue_task.apply_async(args=['transactional'], queue=MAIL_QUEUES['transactional'])
 
+    except Exception as e:
+        logger.error(f"Failed to queue completion email: {e}")
 
 
 @app.route('/api/client/checkin', methods=['POST'])
@@ -8592,278 +11540,204 @@ def submit_checkin():
             'user_id': request.current_user.id
         })
 
-        # Check if check-in exists
-        existing = client.checkins.filter_by(checkin_date=checkin_date).first()
-        is_update = existing is not None
-
-        if existing:
-            # Update existing check-in
-            existing.checkin_time = datetime.now().time()
-
-            # Clear old category responses for this date
-            CategoryResponse.query.filter_by(
-                client_id=client.id,
-                response_date=checkin_date
-            ).delete()
-        else:
-            # Create new check-in
-            checkin = DailyCheckin(
-                client_id=client.id,
-                checkin_date=checkin_date,
-                checkin_time=datetime.now().time()
+        # Validate against the preloaded category set and write in one batch
+        engine = CheckinWriteEngine(client)
+        try:
+            prepared = engine.prepare(
+                checkin_date,
+                data.get('category_responses', {}),
+                data.get('category_notes', {}),
+                data.get('goal_completions', {})
             )
-            db.session.add(checkin)
-            db.session.flush()
-            existing = checkin
-
-        category_notes = data.get('category_notes', {})
-        for cat_id, notes in category_notes.items():
-            if notes and len(notes) > 500:
-                return jsonify({'error': f'Notes too long for category {cat_id}. Maximum 500 characters.'}), 400
-
-        for cat_id, notes in category_notes.items():
-            if notes:
-                category_notes[cat_id] = sanitize_input(notes)[:500]  # Also enforce length
+        except CheckinValidationError as e:
+            return jsonify({'error': str(e)}), 400
 
-            # Validate category responses
-        category_responses = data.get('category_responses', {})
-        validated_responses = {}
-        client_category_ids = set()
-        for plan in client.tracking_plans.filter_by(is_active=True):
-            client_category_ids.add(plan.category_id)
+        result = engine.write([prepared])[0]
+        is_update = not result['created']
 
-        for cat_id, value in category_responses.items():
-            try:
-                value_int = int(value)
-                if value_int < 0 or value_int > 5:
-                    return jsonify({'error': f'Invalid value for category {cat_id}. Must be between 0 and 5.'}), 400
+        db.session.commit()
 
-                # Keep custom category IDs as strings
-                if isinstance(cat_id, str) and cat_id.startswith('custom_'):
-                    validated_responses[cat_id] = value_int
-                else:
-                    cat_id_int = int(cat_id)
-                    if cat_id_int in client_category_ids:
-                        validated_responses[cat_id_int] = value_int
-            except (ValueError, TypeError):
-                return jsonify({'error': f'Invalid value for category {cat_id}. Must be a number.'}), 400
+        # Read-your-writes caches and counters stay inline; the rest goes through the outbox
+        invalidate_checkin_caches(client)
+        if not is_update:
+            therapist_stats.checkins_created(client.therapist_id, [checkin_date])
+        outbox_relay.kick()
 
-        # Use validated responses
-        category_responses = validated_responses
+        log_audit(
+            action='CREATE_CHECKIN' if not is_update else 'UPDATE_CHECKIN',
+            resource_type='checkin',
+            resource_id=result['checkin_id'],
+            details={
+                'client_serial': client.client_serial,
+                'checkin_date': str(checkin_date),
+                'categories_tracked': result['categories_tracked']
+            },
+            phi_accessed=True
+        )
 
-        # Process category responses
-        responses_logged = []
-        validation_errors = []
+        # Send completion email if this is today's checkin
+        if checkin_date == date.today() and not is_update:
+            queue_checkin_completion_email(request.current_user)
 
-        for cat_id, value in category_responses.items():
-            try:
-                # Check if it's a custom category
-                if isinstance(cat_id, str) and cat_id.startswith('custom_'):
-                    # Custom category
-                    custom_cat_id = int(cat_id.replace('custom_', ''))
-                    custom_category = CustomCategory.query.get(custom_cat_id)
+        logger.info('checkin_success', extra={
+            'extra_data': {
+                'client_id': client.id,
+                'client_serial': client.client_serial,
+                'checkin_date': checkin_date.isoformat(),
+                'is_update': is_update,
+                'categories_tracked': result['categories_tracked'],
+                'goals_updated': result['goals_updated'],
+                'request_id': g.request_id
+            },
+            'request_id': g.request_id,
+            'user_id': request.current_user.id
+        })
 
-                    if not custom_category or custom_category.client_id != client.id:
-                        continue
+        return jsonify({
+            'success': True,
+            'message': 'Check-in saved successfully'
+        })
 
-                    # Use the helper method for custom category
-                    response = CategoryResponse.create_for_custom_category(
-                        client_id=client.id,
-                        custom_category_id=custom_cat_id,
-                        response_date=checkin_date,
-                        value=value,
-                        notes=category_notes.get(cat_id, '')
-                    )
-                    response.save(commit=False)
+    except Exception as e:
+        db.session.rollback()
+        logger.error('checkin_error', extra={
+            'extra_data': {
+                'error': str(e),
+                'client_id': client.id,
+                'checkin_date': checkin_date.isoformat() if checkin_date else None,
+                'request_id': g.request_id
+            },
+            'request_id': g.request_id,
+            'user_id': request.current_user.id
+        }, exc_info=True)
+        return jsonify({'error': str(e)}), 500
 
-                    responses_logged.append({
-                        'category': custom_category.name,
-                        'value': value,
-                        'has_notes': bool(category_notes.get(cat_id, '')),
-                        'is_custom': True
-                    })
-                else:
-                    # Default category
-                    category = TrackingCategory.query.get(int(cat_id))
-                    if not category:
-                        continue
 
-                    # Use the helper method for standard category
-                    response = CategoryResponse.create_for_category(
-                        client_id=client.id,
-                        category_id=int(cat_id),
-                        response_date=checkin_date,
-                        value=value,
-                        notes=sanitize_input(category_notes.get(str(cat_id), '')[:500])
-                    )
-                    response.save(commit=False)
+@app.route('/api/client/checkins/batch', methods=['POST'])
+@require_auth(['client'])
+def submit_checkins_batch():
+    """Sync several days of check-ins in one transaction.
 
-                    responses_logged.append({
-                        'category': category.name,
-                        'value': value,
-                        'has_notes': bool(category_notes.get(str(cat_id), '')),
-                        'is_custom': False
-                    })
+    Each entry carries an idempotency key; entries whose key was already
+    applied are reported as duplicates without touching the database again.
+    Invalid entries are rejected individually and do not block the others.
+    """
+    try:
+        client = request.current_user.client
+        data = request.json or {}
+        entries = data.get('checkins')
 
-                    if 'emotion' in category.name.lower():
-                        existing.emotional_value = value
-                        existing.emotional_notes = category_notes.get(str(cat_id), '')
-                    elif 'medication' in category.name.lower():
-                        existing.medication_value = value
-                        existing.medication_notes = category_notes.get(str(cat_id), '')
-                    elif 'physical activity' in category.name.lower() or 'activity' in category.name.lower():
-                        existing.activity_value = value
-                        existing.activity_notes = category_notes.get(str(cat_id), '')
-
-            except ValueError as e:
-                validation_errors.append(f"Category {cat_id}: {str(e)}")
-                logger.error(f"Invalid category response for {cat_id}: {e}")
-
-        if validation_errors:  # Level 1 (OUTSIDE the for loop, same as for)
-            db.session.rollback()
+        if not isinstance(entries, list) or not entries:
+            return jsonify({'error': 'checkins must be a non-empty list'}), 400
+        if len(entries) > CheckinWriteEngine.MAX_BATCH_DAYS:
             return jsonify({
-                'error': 'Invalid category data',
-                'details': validation_errors
+                'error': f'Too many check-ins. Maximum {CheckinWriteEngine.MAX_BATCH_DAYS} per batch.'
             }), 400
 
+        # Resolve every idempotency key already applied in a single query
+        keys = [entry.get('idempotency_key') for entry in entries if isinstance(entry, dict)]
+        keys = [key for key in keys if isinstance(key, str)]
+        applied = {}
+        if keys:
+            applied = {row.idempotency_key: row for row in CheckinSyncKey.query.filter(
+                CheckinSyncKey.client_id == client.id,
+                CheckinSyncKey.idempotency_key.in_(keys)
+            )}
+
+        engine = CheckinWriteEngine(client)
+        results = [None] * len(entries)
+        pending = []  # (position, idempotency_key, prepared entry)
+        seen_keys = set()
+        seen_dates = set()
+
+        for position, entry in enumerate(entries):
+            key = entry.get('idempotency_key') if isinstance(entry, dict) else None
+            result = {'idempotency_key': key, 'date': entry.get('date') if isinstance(entry, dict) else None}
+            results[position] = result
+
+            if not isinstance(key, str) or not key or len(key) > 64:
+                result.update(status='rejected', error='idempotency_key must be a string of 1-64 characters')
+                continue
 
+            if key in applied:
+                result.update(status='duplicate', date=applied[key].checkin_date.isoformat(),
+                              checkin_id=applied[key].checkin_id)
+                continue
+            if key in seen_keys:
+                result.update(status='duplicate')
+                continue
+            seen_keys.add(key)
 
-        # Save goal completions
-        goal_completions = data.get('goal_completions', {})
-        goals_updated = 0
-        for goal_id, completed in goal_completions.items():
-            # Check if completion exists
-            existing_completion = GoalCompletion.query.filter_by(
-                goal_id=int(goal_id),
-                completion_date=checkin_date
-            ).first()
-
-            if existing_completion:
-                existing_completion.completed = completed
-            else:
-                completion = GoalCompletion(
-                    goal_id=int(goal_id),
-                    completion_date=checkin_date,
-                    completed=completed
+            try:
+                checkin_date = engine.parse_date(entry.get('date'))
+                if checkin_date in seen_dates:
+                    raise CheckinValidationError('Duplicate date in batch')
+                prepared = engine.prepare(
+                    checkin_date,
+                    entry.get('category_responses', {}),
+                    entry.get('category_notes', {}),
+                    entry.get('goal_completions', {})
                 )
-                db.session.add(completion)
-            goals_updated += 1
-
-        cache.delete('client_dashboard', f"{request.current_user.id}:{get_language_from_header()}")
-        cache.invalidate_pattern(f"client_categories:{client.id}:*")
+            except CheckinValidationError as e:
+                result.update(status='rejected', error=str(e))
+                continue
 
+            seen_dates.add(checkin_date)
+            pending.append((position, key, prepared))
 
-        db.session.commit()
+        created_today = False
+        if pending:
+            written = engine.write([prepared for _, _, prepared in pending])
 
-        log_audit(
-            action='CREATE_CHECKIN' if not is_update else 'UPDATE_CHECKIN',
-            resource_type='checkin',
-            resource_id=existing.id,
-            details={
-                'client_serial': client.client_serial,
-                'checkin_date': str(checkin_date),
-                'categories_tracked': len(responses_logged)
-            },
-            phi_accessed=True
-        )
+            key_stmt = pg_insert(CheckinSyncKey).values([{
+                'client_id': client.id,
+                'idempotency_key': key,
+                'checkin_date': outcome['checkin_date'],
+                'checkin_id': outcome['checkin_id'],
+                'created_at': datetime.utcnow()
+            } for (_, key, _), outcome in zip(pending, written)])
+            db.session.execute(key_stmt.on_conflict_do_nothing(
+                index_elements=['client_id', 'idempotency_key']))
 
-        # Send completion email if this is today's checkin
-        if checkin_date == date.today() and not is_update:
-            try:
-                # Get user's language preference
-                lang = get_language_from_header()
-
-                # Generate positive message
-                positive_messages = {
-                    'en': [
-                        "Great job completing your daily check-in! Your consistency is admirable.",
-                        "Well done! Every check-in brings you closer to your wellness goals.",
-                        "Fantastic! Your dedication to tracking your progress is inspiring.",
-                        "Excellent work today! Your therapist will be pleased with your commitment.",
-                        "Amazing! You're building healthy habits one day at a time."
-                    ],
-                    'he': [
-                        "כל הכבוד על השלמת הצ'ק-אין היומי! העקביות שלך ראויה להערכה.",
-                        "עבודה טובה! כל צ'ק-אין מקרב אותך ליעדי הבריאות שלך.",
-                        "מצוין! המסירות שלך למעקב אחר ההתקדמות שלך מעוררת השראה.",
-                        "עבודה מעולה היום! המטפל שלך ישמח לראות את המחויבות שלך.",
-                        "מדהים! אתה בונה הרגלים בריאים יום אחר יום."
-                    ],
-                    'ru': [
-                        "Отличная работа по заполнению ежедневной отметки! Ваша последовательность достойна восхищения.",
-                        "Молодец! Каждая отметка приближает вас к вашим целям благополучия.",
-                        "Фантастика! Ваша преданность отслеживанию прогресса вдохновляет.",
-                        "Отличная работа сегодня! Ваш терапевт будет доволен вашей приверженностью.",
-                        "Потрясающе! Вы формируете здоровые привычки день за днем."
-                    ],
-                    'ar': [
-                        "عمل رائع في إكمال تسجيل الحضور اليومي! ثباتك يستحق الإعجاب.",
-                        "أحسنت! كل تسجيل حضور يقربك من أهداف عافيتك.",
-                        "رائع! تفانيك في تتبع تقدمك ملهم.",
-                        "عمل ممتاز اليوم! سيكون معالجك سعيدًا بالتزامك.",
-                        "مذهل! أنت تبني عادات صحية يومًا بعد يوم."
-                    ]
-                }
+            db.session.commit()
 
-                import random
-                messages = positive_messages.get(lang, positive_messages['en'])
-                selected_message = random.choice(messages)
+            for (position, _, _), outcome in zip(pending, written):
+                results[position].update(
+                    status='created' if outcome['created'] else 'updated',
+                    date=outcome['checkin_date'].isoformat(),
+                    checkin_id=outcome['checkin_id']
+                )
+                if outcome['created'] and outcome['checkin_date'] == date.today():
+                    created_today = True
 
-                # Email subject by language
-                subjects = {
-                    'en': "Well done on today's check-in! 🌟",
-                    'he': "כל הכבוד על הצ'ק-אין של היום! 🌟",
-                    'ru': "Молодец, вы выполнили сегодняшнюю отметку! 🌟",
-                    'ar': "أحسنت في تسجيل حضور اليوم! 🌟"
-                }
+            invalidate_checkin_caches(client)
+            therapist_stats.checkins_created(
+                client.therapist_id, [outcome['checkin_date'] for outcome in written if outcome['created']])
+            outbox_relay.kick()
 
-                subject = subjects.get(lang, subjects['en'])
-
-                # Create email with the positive message
-                email_queue = EmailQueue(
-                    to_email=request.current_user.email,
-                    subject=subject,
-                    body=selected_message,
-                    html_body=f"""
-                            <html>
-                            <body style="font-family: Arial, sans-serif; direction: {'rtl' if lang in ['he', 'ar'] else 'ltr'};">
-                                <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                                    <h2 style="color: #4CAF50; text-align: center;">{subject}</h2>
-                                    <p style="font-size: 18px; line-height: 1.6; color: #333;">
-                                        {selected_message}
-                                    </p>
-                                    <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;">
-                                    <p style="color: #666; font-size: 14px; text-align: center;">
-                                        {'המסע הטיפולי שלך' if lang == 'he' else
-                    'Ваш терапевтический путь' if lang == 'ru' else
-                    'رحلتك العلاجية' if lang == 'ar' else
-                    'Your Therapeutic Journey'}
-                                    </p>
-                                </div>
-                            </body>
-                            </html>
-                            """,
-                    status='pending'
-                )
-                db.session.add(email_queue)
-                db.session.commit()
+            log_audit(
+                action='SYNC_CHECKINS',
+                resource_type='checkin',
+                details={
+                    'client_serial': client.client_serial,
+                    'checkin_dates': [outcome['checkin_date'].isoformat() for outcome in written],
+                    'categories_tracked': sum(outcome['categories_tracked'] for outcome in written)
+                },
+                phi_accessed=True
+            )
 
-                # Trigger email processing
-                if celery:
-                    from celery_app import process_email_queue_task
-                    process_email_queue_task.delay()
+        if created_today:
+            queue_checkin_completion_email(request.current_user)
 
-            except Exception as e:
-                logger.error(f"Failed to queue completion email: {e}")
+        summary = {status: 0 for status in ('created', 'updated', 'duplicate', 'rejected')}
+        for result in results:
+            summary[result['status']] += 1
 
-        logger.info('checkin_success', extra={
+        logger.info('checkin_batch_synced', extra={
             'extra_data': {
                 'client_id': client.id,
-                'client_serial': client.client_serial,
-                'checkin_date': checkin_date.isoformat(),
-                'is_update': is_update,
-                'categories_tracked': len(responses_logged),
-                'goals_updated': goals_updated,
+                'entries': len(entries),
+                **summary,
                 'request_id': g.request_id
             },
             'request_id': g.request_id,
@@ -8872,16 +11746,15 @@ def submit_checkin():
 
         return jsonify({
             'success': True,
-            'message': 'Check-in saved successfully'
+            'results': results,
+            'summary': summary
         })
 
     except Exception as e:
         db.session.rollback()
-        logger.error('checkin_error', extra={
+        logger.error('checkin_batch_error', extra={
             'extra_data': {
                 'error': str(e),
-                'client_id': client.id,
-                'checkin_date': checkin_date.isoformat() if checkin_date else None,
                 'request_id': g.request_id
             },
             'request_id': g.request_id,
@@ -8987,83 +11860,145 @@ def get_client_checkin(date_str):
 
 
 
+PROGRESS_RESOLUTIONS = ('day', 'week', 'month')
+
+
+def fetch_progress_pivot(client_id, category_ids, start_date, before, resolution='day', limit=51):
+    """Pivot a client's check-ins and category responses into one row per period.
+
+    Each category becomes a column (c_<id>) via an aggregate FILTER, so the
+    whole page is a single query. Rows are newest first, restricted to
+    start_date <= day < before; coarser resolutions average the daily rows.
+    """
+    day = DailyCheckin.checkin_date
+    daily_columns = [
+        day.label('period'),
+        func.min(DailyCheckin.created_at).label('created_at'),
+        func.max(DailyCheckin.emotional_value).label('emotional'),
+        func.max(DailyCheckin.medication_value).label('medication'),
+        func.max(DailyCheckin.activity_value).label('activity')
+    ] + [
+        func.max(CategoryResponse.value).filter(CategoryResponse.category_id == cat_id).label(f'c_{cat_id}')
+        for cat_id in category_ids
+    ]
+
+    daily = db.session.query(*daily_columns).select_from(DailyCheckin).outerjoin(
+        CategoryResponse, and_(
+            CategoryResponse.client_id == DailyCheckin.client_id,
+            CategoryResponse.response_date == DailyCheckin.checkin_date,
+            CategoryResponse.category_id.in_(category_ids or [-1])
+        )
+    ).filter(
+        DailyCheckin.client_id == client_id,
+        day >= start_date,
+        day < before
+    ).group_by(day)
+
+    if resolution == 'day':
+        return daily.order_by(day.desc()).limit(limit).all()
+
+    daily = daily.subquery()
+    period = func.date_trunc(resolution, daily.c.period).cast(db.Date).label('period')
+    return db.session.query(
+        period,
+        func.count().label('days'),
+        func.avg(daily.c.emotional).label('emotional'),
+        func.avg(daily.c.medication).label('medication'),
+        func.avg(daily.c.activity).label('activity'),
+        *[func.avg(daily.c[f'c_{cat_id}']).label(f'c_{cat_id}') for cat_id in category_ids]
+    ).group_by(period).order_by(period.desc()).limit(limit).all()
+
+
 @app.route('/api/client/progress', methods=['GET'])
 @require_auth(['client'])
 def get_client_progress():
-    """Get client's progress data with pagination for large datasets"""
+    """Get client's progress as one date x category pivot with keyset pagination.
+
+    Query params: days (1-365), per_page (1-100), before (YYYY-MM-DD, exclusive
+    upper bound returned as next_before) and resolution (day, week, month or
+    auto). Coarser resolutions average the daily values per period.
+    """
     try:
         client = request.current_user.client
 
         # Get date range and pagination
         end_date = date.today()
         days = int(request.args.get('days', 30))
-        page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 50))
 
         # Validate parameters
-        page = max(1, page)
         per_page = min(max(1, per_page), 100)
         days = min(max(1, days), 365)  # Max 1 year
 
         start_date = end_date - timedelta(days=days)
 
+        before = request.args.get('before')
+        if before:
+            try:
+                before = datetime.strptime(before, '%Y-%m-%d').date()
+            except ValueError:
+                return jsonify({'error': 'Invalid before date. Use YYYY-MM-DD'}), 400
+        else:
+            before = end_date + timedelta(days=1)
+
+        resolution = request.args.get('resolution', 'day')
+        if resolution == 'auto':
+            resolution = 'day' if days <= 90 else 'week'
+        if resolution not in PROGRESS_RESOLUTIONS:
+            return jsonify({'error': f"Invalid resolution. Use one of: {', '.join(PROGRESS_RESOLUTIONS)}, auto"}), 400
+
         # Log request
         logger.info('get_progress_request', extra={
             'extra_data': {
                 'client_id': client.id,
                 'days': days,
-                'page': page,
+                'before': before.isoformat(),
+                'resolution': resolution,
                 'request_id': g.request_id
             },
             'request_id': g.request_id,
             'user_id': request.current_user.id
         })
 
-        # Get paginated check-ins
-        checkins_query = client.checkins.filter(
-            DailyCheckin.checkin_date.between(start_date, end_date)
-        ).order_by(DailyCheckin.checkin_date.desc())
+        categories = db.session.query(TrackingCategory.id, TrackingCategory.name).join(
+            ClientTrackingPlan, ClientTrackingPlan.category_id == TrackingCategory.id
+        ).filter(
+            ClientTrackingPlan.client_id == client.id,
+            ClientTrackingPlan.is_active == True
+        ).order_by(TrackingCategory.id).all()
 
-        pagination = checkins_query.paginate(page=page, per_page=per_page, error_out=False)
-        checkins = pagination.items if pagination else []
+        rows = fetch_progress_pivot(client.id, [cat_id for cat_id, _ in categories],
+                                    start_date, before, resolution, per_page + 1)
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
 
-        checkin_data = []
-        for checkin in checkins:
-            # Ensure all values are present and valid
-            checkin_data.append({
-                'date': checkin.checkin_date.isoformat(),
-                'time': checkin.created_at.strftime('%H:%M') if checkin.created_at else '00:00',
-                'emotional': checkin.emotional_value if checkin.emotional_value is not None else 0,
-                'medication': checkin.medication_value if checkin.medication_value is not None else 0,
-                'activity': checkin.activity_value if checkin.activity_value is not None else 0
-            })
+        def as_value(value):
+            if value is None:
+                return 0
+            return int(value) if resolution == 'day' else round(float(value), 2)
 
-        # Get category responses (also paginated if needed)
-        category_data = {}
-        try:
-            for plan in client.tracking_plans.filter_by(is_active=True):
-                responses = CategoryResponse.query.filter(
-                    CategoryResponse.client_id == client.id,
-                    CategoryResponse.category_id == plan.category_id,
-                    CategoryResponse.response_date.between(start_date, end_date)
-                ).order_by(CategoryResponse.response_date.desc()).limit(per_page).all()
+        checkin_data = []
+        category_data = {name: [] for _, name in categories}
+        for row in rows:
+            period = row.period.isoformat()
+            entry = {
+                'date': period,
+                'emotional': as_value(row.emotional),
+                'medication': as_value(row.medication),
+                'activity': as_value(row.activity),
+                'categories': {}
+            }
+            if resolution == 'day':
+                entry['time'] = row.created_at.strftime('%H:%M') if row.created_at else '00:00'
+            else:
+                entry['days'] = row.days
 
-                category_data[plan.category.name] = [
-                    {
-                        'date': resp.response_date.isoformat(),
-                        'value': resp.value if resp.value is not None else 0
-                    } for resp in responses
-                ]
-        except Exception as cat_error:
-            # Log but don't fail the whole request
-            logger.warning('get_progress_category_error', extra={
-                'extra_data': {
-                    'error': str(cat_error),
-                    'client_id': client.id,
-                    'request_id': g.request_id
-                }
-            })
-            category_data = {}
+            for cat_id, name in categories:
+                value = getattr(row, f'c_{cat_id}')
+                if value is not None:
+                    entry['categories'][name] = as_value(value)
+                    category_data[name].append({'date': period, 'value': as_value(value)})
+            checkin_data.append(entry)
 
         # Log success
         logger.info('get_progress_success', extra={
@@ -9080,15 +12015,14 @@ def get_client_progress():
             'success': True,
             'progress': {
                 'checkins': checkin_data,
-                'categories': category_data
+                'categories': category_data,
+                'resolution': resolution
             },
             'pagination': {
-                'page': page,
                 'per_page': per_page,
-                'total': pagination.total if pagination else 0,
-                'pages': pagination.pages if pagination else 1,
-                'has_prev': pagination.has_prev if pagination else False,
-                'has_next': pagination.has_next if pagination else False
+                'before': before.isoformat(),
+                'has_next': has_next,
+                'next_before': checkin_data[-1]['date'] if has_next else None
             }
         })
 
@@ -9113,12 +12047,9 @@ def get_client_progress():
                 'categories': {}
             },
             'pagination': {
-                'page': 1,
                 'per_page': 50,
-                'total': 0,
-                'pages': 1,
-                'has_prev': False,
-                'has_next': False
+                'has_next': False,
+                'next_before': None
             }
         }), 200
 
@@ -9205,10 +12136,14 @@ def complete_mission(mission_id):
         if not mission:
             return jsonify({'error': 'Mission not found'}), 404
 
+        was_pending = not mission.mission_completed
         mission.mission_completed = True
         mission.completed_at = datetime.utcnow()
         db.session.commit()
 
+        if was_pending:
+            therapist_stats.mission_completed(mission.therapist_id)
+
         return jsonify({
             'success': True,
             'message': 'Mission completed!'
@@ -9757,6 +12692,9 @@ def update_reminder():
             'user_id': request.current_user.id
         })
 
+        # With an IANA zone the scheduler follows DST; the offset only describes today
+        reminder_timezone = data.get('timezone') if get_zone(data.get('timezone')) else None
+
         # Check if reminder exists
         reminder = client.reminders.filter_by(reminder_type=reminder_type).first()
 
@@ -9764,6 +12702,7 @@ def update_reminder():
             old_time = reminder.reminder_time
             reminder.reminder_time = time_obj
             reminder.local_reminder_time = local_time_str
+            reminder.timezone = reminder_timezone
             reminder.is_active = is_active
             reminder.reminder_email = reminder_email
             reminder.reminder_language = reminder_language
@@ -9785,6 +12724,7 @@ def update_reminder():
                 reminder_type=reminder_type,
                 reminder_time=time_obj,
                 local_reminder_time=local_time_str,
+                timezone=reminder_timezone,
                 reminder_email=reminder_email,
                 reminder_language=reminder_language,
                 is_active=is_active
@@ -9802,6 +12742,7 @@ def update_reminder():
                 'user_id': request.current_user.id
             })
 
+        reminder.schedule_next()
         db.session.commit()
 
         return jsonify({
@@ -9810,7 +12751,9 @@ def update_reminder():
             'debug': {
                 'local_time': f"{hour:02d}:{minute:02d}",
                 'utc_time': str(time_obj),
-                'timezone_offset': timezone_offset
+                'timezone_offset': timezone_offset,
+                'timezone': reminder_timezone,
+                'next_fire_at': reminder.next_fire_at.isoformat() + 'Z'
             }
         })
 
@@ -10922,6 +13865,57 @@ def get_client_week_checkins(week):
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/client/goals/completions', methods=['POST'])
+@require_auth(['client'])
+def update_goal_completions():
+    """Tick several goals and/or days at once.
+
+    Body: {"completions": [{"goal_id": 1, "date": "YYYY-MM-DD", "completed": true}, ...]}
+    """
+    try:
+        client = request.current_user.client
+        entries = (request.json or {}).get('completions')
+
+        if not isinstance(entries, list) or not entries:
+            return jsonify({'error': 'completions must be a non-empty list'}), 400
+        if len(entries) > MAX_GOAL_TICKS:
+            return jsonify({'error': f'Too many completions. Maximum {MAX_GOAL_TICKS} per request.'}), 400
+
+        ticks = []
+        for entry in entries:
+            try:
+                goal_id = int(entry['goal_id'])
+                completion_date = datetime.strptime(entry['date'], '%Y-%m-%d').date()
+            except (KeyError, TypeError, ValueError):
+                return jsonify({'error': 'Each completion needs goal_id and date (YYYY-MM-DD)'}), 400
+            if completion_date > date.today():
+                return jsonify({'error': 'Cannot record completions for future dates'}), 400
+            ticks.append((goal_id, completion_date, bool(entry.get('completed', True))))
+
+        # Only the client's own goals may be ticked
+        goal_ids = {goal_id for goal_id, _, _ in ticks}
+        owned_goals = {row[0] for row in db.session.query(WeeklyGoal.id).filter(
+            WeeklyGoal.client_id == client.id,
+            WeeklyGoal.id.in_(goal_ids)
+        )}
+        if goal_ids - owned_goals:
+            return jsonify({'error': 'Goal not found'}), 404
+
+        updated = GoalGrid.upsert(ticks)
+        db.session.commit()
+
+        invalidate_checkin_caches(client)
+
+        return jsonify({
+            'success': True,
+            'updated': updated
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/client/goals/<week>', methods=['GET'])
 @require_auth(['client'])
 def get_client_week_goals(week):
@@ -10962,19 +13956,13 @@ def get_client_week_goals(week):
 
         # Format response
         goals_data = []
+        grid = GoalGrid.load([goal.id for goal in goals], week_start.date(), 7)
         for goal in goals:
-            # Get completions for the week
-            completions = {}
-            for i in range(7):
-                day = week_start + timedelta(days=i)
-                completion = goal.completions.filter_by(completion_date=day).first()
-                completions[day.isoformat()] = completion.completed if completion else None
-
             goals_data.append({
                 'id': goal.id,
                 'text': goal.goal_text,
                 'week_start': goal.week_start.isoformat(),
-                'completions': completions
+                'completions': grid.as_dict(goal.id)
             })
 
         return jsonify({
@@ -11004,6 +13992,7 @@ def apply_data_retention():
         ).all()
 
         archived_count = 0
+        affected_clients = {checkin.client_id for checkin in old_checkins}
         for checkin in old_checkins:
             # Archive to cold storage (implement based on your needs)
             archive_data = {
@@ -11021,6 +14010,10 @@ def apply_data_retention():
             db.session.delete(checkin)
             archived_count += 1
 
+        # Deleted days can shorten longest streaks, so recount the affected clients
+        db.session.flush()
+        ClientEngagement.rebuild(affected_clients)
+
         db.session.commit()
 
         # Audit log
@@ -11352,7 +14345,7 @@ try:
     from celery_app import celery, send_reminder_test, send_email_task, process_email_queue_task
 
     # Log Celery availability
-    if celery:
+    if celery and not WORKER_MODE:
         logger.info("Celery successfully imported and configured")
 
         # Test Redis connection
@@ -11806,6 +14799,7 @@ def submit_task():
         )
         db.session.add(notification)
         db.session.commit()
+        cache.delete('caseload_overview', assignment.therapist_id)
 
         return jsonify({'success': True})
     except Exception as e:
@@ -11844,12 +14838,25 @@ def request_urgent_session():
             }
         })
 
-        # Optionally send email/SMS to therapist
-        if client.therapist.user.email:
-            # Add your email sending logic here
-            pass
-
         db.session.commit()
+        cache.delete('caseload_overview', client.therapist_id)
+
+        # Crisis requests go out on the critical lane, ahead of any reminder backlog
+        therapist_email = client.therapist.user.email
+        if therapist_email:
+            client_label = sanitize_input(client.client_name or client.client_serial)
+            subject = f"URGENT: Session request from {client_label}"
+            body = f"""Dear {client.therapist.name},
+
+Your client {client_label} has requested an urgent session.
+
+Crisis level: {data.get('crisis_level', 'unknown')}
+Requested at: {datetime.utcnow().strftime('%Y-%m-%d %H:%M')} UTC
+
+Please contact them as soon as possible.
+
+Therapeutic Companion System"""
+            send_email(therapist_email, subject, body, priority='critical')
 
         return jsonify({
             'success': True,
@@ -12046,7 +15053,7 @@ _initialized = False
 
 # Don't initialize on import for production
 # Let init_db.py handle it during deployment
-if not os.environ.get('PRODUCTION'):
+if not os.environ.get('PRODUCTION') and not WORKER_MODE:
     with app.app_context():
         initialize_database()
 
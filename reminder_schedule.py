@@ -0,0 +1,87 @@
+"""
+Reminder fire times in the reminder owner's own time zone.
+
+A reminder is a wall-clock time ("09:45") plus an IANA zone
+("Asia/Jerusalem"). Each reminder row stores the next UTC instant it is due,
+so the scheduler only has to look at reminders that are due. After firing, the
+next instant is worked out again from the wall-clock time. The reminder
+therefore stays at 09:45 local time across DST changes, instead of drifting
+by an hour the way a fixed UTC time does.
+
+DST edge cases follow zoneinfo's fold=0 rule:
+
+  * a local time skipped by a spring-forward jump (02:30 when clocks go
+    02:00 -> 03:00) fires at the instant it would have been without the
+    jump, i.e. 03:30 local
+  * a local time that happens twice on a fall-back night fires once, at the
+    first occurrence
+
+Reminders saved before zones were recorded have no zone; they keep firing
+at their stored UTC time.
+"""
+from datetime import datetime, timedelta, timezone
+from datetime import time as datetime_time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+UTC = timezone.utc
+
+# A reminder this late (worker outage, long deploy) is skipped rather than sent hours off
+MAX_LATENESS = timedelta(hours=2)
+
+
+def get_zone(name):
+    """ZoneInfo for an IANA zone name, or None when it is empty or unknown"""
+    if not name:
+        return None
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def parse_local_time(value):
+    """datetime.time from 'HH:MM' (or a time passed through), None if unparseable"""
+    if isinstance(value, datetime_time):
+        return value
+    try:
+        hour, minute = map(int, str(value).split(':')[:2])
+        return datetime_time(hour, minute)
+    except (TypeError, ValueError):
+        return None
+
+
+def fire_spec(zone_name, local_time, utc_time):
+    """(wall-clock time, zone) a reminder fires at.
+
+    Uses the local time in the stored zone when both are known, otherwise
+    falls back to the stored UTC time, which is how reminders fired before
+    zones were recorded.
+    """
+    zone = get_zone(zone_name)
+    local = parse_local_time(local_time) if zone else None
+    if zone and local:
+        return local, zone
+    return utc_time, UTC
+
+
+def next_fire_at(local_time, zone, after, weekday=None):
+    """First instant strictly after `after` when the clock in zone reads local_time.
+
+    `after` and the result are naive UTC datetimes, like the rest of the
+    schema. weekday (Monday=0) restricts firing to one day of the week.
+    """
+    local_date = after.replace(tzinfo=UTC).astimezone(zone).date()
+    # Eight consecutive days always include a matching day later than `after`
+    for days in range(8):
+        day = local_date + timedelta(days=days)
+        if weekday is not None and day.weekday() != weekday:
+            continue
+        candidate = datetime.combine(day, local_time, tzinfo=zone).astimezone(UTC).replace(tzinfo=None)
+        if candidate > after:
+            return candidate
+
+
+def utc_time_today(local_time, zone, today=None):
+    """UTC wall-clock time equivalent to local_time in zone on the given (local) date"""
+    day = today or datetime.now(zone).date()
+    return datetime.combine(day, local_time, tzinfo=zone).astimezone(UTC).time()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Tests for the Elasticsearch search manager and bulk indexer.
+Drives SearchManager with an in-process fake Elasticsearch client that
+records every ping and bulk call, so no cluster is needed: lazy probing,
+reconnect backoff, the database fallback while the fake is down, bulk
+flush triggers, buffer capping, chunked reindexing and the synchronous
+index_clients_now path used by the outbox relay.
+"""
+
+import os
+import sys
+import json
+import time
+from datetime import date
+from types import SimpleNamespace
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    import elasticsearch
+    import elasticsearch.helpers
+    import elasticsearch.serializer
+    from new_backend import SearchManager, BulkIndexer
+    BACKEND_AVAILABLE = True
+except ImportError:
+    BACKEND_AVAILABLE = False
+    print("Warning: Could not import from new_backend or elasticsearch. Tests will be limited.")
+
+
+# Color codes for terminal output
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    YELLOW = '\033[93m'
+    BLUE = '\033[94m'
+    CYAN = '\033[96m'
+    RESET = '\033[0m'
+
+
+class FakeIndices:
+    def __init__(self, fake):
+        self.fake = fake
+
+    def exists(self, index):
+        return index in self.fake.index_names
+
+    def create(self, index, body=None):
+        self.fake.index_names.add(index)
+
+    def put_settings(self, index, body):
+        self.fake.settings_calls.append(body['index']['refresh_interval'])
+
+    def refresh(self, index):
+        self.fake.refreshes += 1
+
+
+class FakeElasticsearch:
+    """Records ping and bulk calls; .up switches the fake cluster on and off"""
+
+    def __init__(self, up=True, reject=False):
+        self.up = up
+        self.reject = reject
+        self.pings = []
+        self.bulk_calls = []  # (document ids, kwargs) per request
+        self.index_names = set()
+        self.settings_calls = []
+        self.refreshes = 0
+        self.indices = FakeIndices(self)
+        # helpers.bulk serializes actions with the client's transport serializer
+        self.transport = SimpleNamespace(serializer=elasticsearch.serializer.JSONSerializer())
+
+    def ping(self, **kwargs):
+        self.pings.append(time.monotonic())
+        return self.up
+
+    def bulk(self, *args, body=None, **kwargs):
+        if not self.up:
+            raise elasticsearch.ConnectionError('N/A', 'fake cluster is down', None)
+        lines = [json.loads(line) for line in body.splitlines() if line]
+        ids = [line['index']['_id'] for line in lines if 'index' in line]
+        self.bulk_calls.append((ids, kwargs))
+        status = 400 if self.reject else 201
+        item = {'status': status}
+        if self.reject:
+            item['error'] = {'type': 'mapper_parsing_exception'}
+        return {'errors': self.reject, 'items': [{'index': dict(item, _id=doc_id)} for doc_id in ids]}
+
+    def indexed_ids(self):
+        return [doc_id for ids, _ in self.bulk_calls for doc_id in ids]
+
+
+def fake_client(client_id):
+    return SimpleNamespace(
+        id=client_id, client_serial=f'C{client_id:012X}', client_name=None,
+        therapist_id=1, start_date=date(2025, 1, 1), is_active=True
+    )
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+class SearchManagerTester:
+    """Test SearchManager and BulkIndexer against a fake Elasticsearch"""
+
+    def __init__(self):
+        self.test_results = []
+
+    def print_header(self, text):
+        """Print a formatted header"""
+        print(f"\n{Colors.CYAN}{'=' * 60}{Colors.RESET}")
+        print(f"{Colors.CYAN}{text.center(60)}{Colors.RESET}")
+        print(f"{Colors.CYAN}{'=' * 60}{Colors.RESET}\n")
+
+    def record(self, name, passed, detail=''):
+        self.test_results.append((name, passed))
+        color = Colors.GREEN if passed else Colors.RED
+        mark = '✓' if passed else '✗'
+        print(f"{color}{mark} {name}{Colors.RESET} {detail}")
+
+    def manager(self, fake, batch_size=500, flush_interval=60.0):
+        manager = SearchManager(client=fake)
+        manager.RECONNECT_MIN_DELAY = 0.05
+        manager.RECONNECT_MAX_DELAY = 0.4
+        manager.indexer = BulkIndexer(lambda: manager.es, on_failure=manager.mark_unavailable,
+                                      batch_size=batch_size, flush_interval=flush_interval)
+        return manager
+
+    def test_lazy_probe(self):
+        """Nothing connects until .es is first used, and then only once"""
+        print(f"{Colors.YELLOW}Testing lazy probe{Colors.RESET}")
+        fake = FakeElasticsearch()
+        manager = self.manager(fake)
+        self.record('No ping at construction', not fake.pings)
+        manager.es
+        manager.es
+        self.record('One ping on first use', len(fake.pings) == 1, f"({len(fake.pings)} pings)")
+        self.record('Indices created on connect', {'clients', 'checkins'} <= fake.index_names)
+
+    def test_fallback_and_backoff(self):
+        """While the fake is down .es is None, writes stay buffered and reconnects back off"""
+        print(f"\n{Colors.YELLOW}Testing fallback and reconnect backoff{Colors.RESET}")
+        fake = FakeElasticsearch(up=False)
+        manager = self.manager(fake, flush_interval=0.1)
+        self.record('Search falls back while down', manager.es is None)
+
+        manager.index_client(fake_client(1))
+        time.sleep(0.3)
+        self.record('Write is buffered, not sent', len(manager.indexer) == 1 and not fake.bulk_calls)
+
+        wait_for(lambda: len(fake.pings) >= 4)
+        gaps = [later - earlier for earlier, later in zip(fake.pings[1:], fake.pings[2:])]
+        self.record('Reconnect delay grows', len(gaps) >= 2 and all(b > a for a, b in zip(gaps, gaps[1:])),
+                    f"(gaps {', '.join(f'{gap:.2f}s' for gap in gaps)})")
+
+        fake.up = True
+        self.record('Reconnects once the fake is up', wait_for(lambda: manager._es is not None))
+        self.record('Buffered write is flushed after reconnect', wait_for(lambda: fake.indexed_ids() == [1]))
+
+    def test_flush_triggers(self):
+        """A full batch flushes at once; a partial one waits for the interval"""
+        print(f"\n{Colors.YELLOW}Testing flush triggers{Colors.RESET}")
+        fake = FakeElasticsearch()
+        manager = self.manager(fake, batch_size=5, flush_interval=30.0)
+        for client_id in range(5):
+            manager.index_client(fake_client(client_id))
+        self.record('Full batch flushes without waiting for the interval',
+                    wait_for(lambda: len(fake.indexed_ids()) == 5, timeout=1.0),
+                    f"({len(fake.bulk_calls)} bulk call(s))")
+
+        fake = FakeElasticsearch()
+        manager = self.manager(fake, batch_size=500, flush_interval=0.2)
+        manager.index_client(fake_client(1))
+        self.record('Partial batch flushes on the interval', wait_for(lambda: fake.indexed_ids() == [1]))
+        self.record('No refresh=True on writes',
+                    all('refresh' not in kwargs and 'refresh' not in (kwargs.get('params') or {})
+                        for _, kwargs in fake.bulk_calls))
+
+    def test_buffer_cap(self):
+        """Past MAX_BUFFER the oldest actions are dropped"""
+        print(f"\n{Colors.YELLOW}Testing buffer cap{Colors.RESET}")
+        fake = FakeElasticsearch(up=False)
+        manager = self.manager(fake, flush_interval=60.0)
+        manager.indexer.MAX_BUFFER = 3
+        for client_id in range(5):
+            manager.index_client(fake_client(client_id))
+        kept = [action['_id'] for action in manager.indexer._buffer]
+        self.record('Buffer stays at MAX_BUFFER', kept == [2, 3, 4], f"(kept {kept})")
+        self.record('Dropped actions are counted', manager.indexer.stats['dropped'] == 2)
+
+    def test_reindex(self):
+        """Reindex sends chunk-sized bulk requests with refresh off, then refreshes once"""
+        print(f"\n{Colors.YELLOW}Testing chunked reindex{Colors.RESET}")
+        fake = FakeElasticsearch()
+        manager = self.manager(fake)
+
+        def actions(chunk_size):
+            for client_id in range(7):
+                yield {'_index': 'clients', '_id': client_id,
+                       '_source': SearchManager.client_document(fake_client(client_id))}
+
+        manager._reindex_actions = actions
+        indexed, failed = manager.reindex_clients(chunk_size=3)
+        self.record('Every document indexed', (indexed, failed) == (7, 0), f"({indexed} indexed, {failed} failed)")
+        self.record('One bulk request per chunk', [len(ids) for ids, _ in fake.bulk_calls] == [3, 3, 1])
+        self.record('Refresh disabled, then restored',
+                    fake.settings_calls == ['-1', manager.refresh_interval], f"({fake.settings_calls})")
+        self.record('Single refresh at the end', fake.refreshes == 1)
+
+    def test_index_clients_now(self):
+        """The synchronous path raises instead of buffering, so the outbox batch is retried"""
+        print(f"\n{Colors.YELLOW}Testing index_clients_now{Colors.RESET}")
+        clients = [fake_client(1), fake_client(2)]
+        stats = {1: {'checkin_count': 3}, 2: {'checkin_count': 0}}
+
+        fake = FakeElasticsearch()
+        manager = self.manager(fake)
+        self.record('Sends the batch synchronously', manager.index_clients_now(clients, stats) == 2
+                    and fake.indexed_ids() == [1, 2] and len(manager.indexer) == 0)
+
+        fake = FakeElasticsearch(reject=True)
+        manager = self.manager(fake)
+        try:
+            manager.index_clients_now(clients, stats)
+            raised = None
+        except Exception as e:
+            raised = e
+        self.record('Rejected documents raise RuntimeError', type(raised) is RuntimeError, f"({raised!r})")
+
+        fake = FakeElasticsearch()
+        manager = self.manager(fake)
+        manager.es
+        fake.up = False
+        try:
+            manager.index_clients_now(clients, stats)
+            raised = None
+        except Exception as e:
+            raised = e
+        self.record('Lost connection raises ConnectionError', isinstance(raised, ConnectionError), f"({raised!r})")
+        self.record('Lost connection marks Elasticsearch unavailable', manager._es is None)
+
+        try:
+            manager.index_clients_now(clients, stats)
+            raised = None
+        except Exception as e:
+            raised = e
+        self.record('Unavailable Elasticsearch raises ConnectionError', isinstance(raised, ConnectionError))
+
+    def run_all_tests(self):
+        """Run all search manager tests"""
+        self.print_header("SEARCH MANAGER TESTS")
+
+        if not BACKEND_AVAILABLE:
+            print(f"{Colors.RED}Cannot run search tests - backend not available{Colors.RESET}")
+            print("Make sure new_backend.py and the elasticsearch package are available")
+            return
+
+        self.test_lazy_probe()
+        self.test_fallback_and_backoff()
+        self.test_flush_triggers()
+        self.test_buffer_cap()
+        self.test_reindex()
+        self.test_index_clients_now()
+
+        passed = sum(1 for _, ok in self.test_results if ok)
+        color = Colors.GREEN if passed == len(self.test_results) else Colors.RED
+        print(f"\n{color}{passed}/{len(self.test_results)} checks passed{Colors.RESET}")
+
+
+if __name__ == "__main__":
+    SearchManagerTester().run_all_tests()
@@ -0,0 +1,297 @@
+"""
+Pooled SMTP delivery.
+
+Each process keeps a small pool of authenticated SMTP sessions and reuses
+them across messages, so a batch pays for one TCP connect, STARTTLS and
+login instead of one per message. Idle sessions are checked with NOOP
+before reuse, sessions are recycled after max_messages or max_age, and a
+send that hits a dropped connection, a 421 or a timeout is retried once on
+a fresh session.
+
+Settings come from the same environment variables the rest of the app uses
+(SMTP_SERVER, SMTP_PORT, SYSTEM_EMAIL, SYSTEM_EMAIL_PASSWORD).
+
+Benchmark against a local sink (needs aiosmtpd):
+
+    python smtp_delivery.py [messages]
+"""
+import os
+import socket
+import smtplib
+import threading
+import time
+from collections import namedtuple
+
+SmtpSettings = namedtuple('SmtpSettings', ['host', 'port', 'username', 'password', 'use_tls', 'timeout'])
+
+# Errors after which the session is unusable but the message itself is fine to retry
+RETRYABLE_ERRORS = (smtplib.SMTPServerDisconnected, socket.timeout, ConnectionError)
+
+
+class Skipped(Exception):
+    """Recorded for a message that send_many's before_send hook declined to send"""
+
+
+def settings_from_env():
+    return SmtpSettings(
+        host=os.environ.get('SMTP_SERVER', 'smtp.gmail.com'),
+        port=int(os.environ.get('SMTP_PORT', 587)),
+        username=os.environ.get('SYSTEM_EMAIL'),
+        password=os.environ.get('SYSTEM_EMAIL_PASSWORD'),
+        use_tls=os.environ.get('SMTP_USE_TLS', 'true').lower() != 'false',
+        timeout=float(os.environ.get('SMTP_TIMEOUT', 30))
+    )
+
+
+def is_retryable(error):
+    """Whether a send failure came from the session rather than the message"""
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code == 421
+
+
+def is_throttled(error):
+    """Whether the provider answered with a 4xx, i.e. try again later at a slower rate"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return any(400 <= code < 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and 400 <= error.smtp_code < 500
+
+
+class PooledSession:
+    """One open SMTP session plus the bookkeeping the pool needs to recycle it"""
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.opened_at = time.monotonic()
+        self.last_used = self.opened_at
+        self.sent = 0
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except Exception:
+            try:
+                self.smtp.close()
+            except Exception:
+                pass
+
+
+class SMTPPool:
+    """Per-process pool of authenticated SMTP sessions"""
+
+    def __init__(self, settings=None, max_size=4, keepalive_after=30, max_messages=100, max_age=300):
+        self.settings = settings or settings_from_env()
+        self.max_size = max_size
+        self.keepalive_after = keepalive_after
+        self.max_messages = max_messages
+        self.max_age = max_age
+        self._idle = []
+        self._lock = threading.Lock()
+        self._available = threading.Semaphore(max_size)
+        self._pid = os.getpid()
+        self.stats = {'opened': 0, 'reused': 0, 'sent': 0, 'reconnects': 0}
+
+    def _open(self):
+        settings = self.settings
+        smtp = smtplib.SMTP(settings.host, settings.port, timeout=settings.timeout)
+        try:
+            smtp.ehlo()
+            if settings.use_tls:
+                smtp.starttls()
+                smtp.ehlo()
+            if settings.username and settings.password:
+                smtp.login(settings.username, settings.password)
+        except Exception:
+            smtp.close()
+            raise
+        self.stats['opened'] += 1
+        return PooledSession(smtp)
+
+    def _usable(self, session):
+        now = time.monotonic()
+        if session.sent >= self.max_messages or now - session.opened_at >= self.max_age:
+            return False
+        if now - session.last_used >= self.keepalive_after:
+            try:
+                return session.smtp.noop()[0] == 250
+            except Exception:
+                return False
+        return True
+
+    def _check_fork(self):
+        # Sockets inherited across fork are shared with the parent; never reuse them
+        if self._pid != os.getpid():
+            with self._lock:
+                self._idle = []
+                self._available = threading.Semaphore(self.max_size)
+                self._pid = os.getpid()
+
+    def acquire(self):
+        self._check_fork()
+        self._available.acquire()
+        try:
+            while True:
+                with self._lock:
+                    session = self._idle.pop() if self._idle else None
+                if session is None:
+                    return self._open()
+                if self._usable(session):
+                    self.stats['reused'] += 1
+                    return session
+                session.close()
+        except Exception:
+            self._available.release()
+            raise
+
+    def release(self, session, broken=False):
+        session.last_used = time.monotonic()
+        if broken or session.sent >= self.max_messages:
+            session.close()
+        else:
+            with self._lock:
+                self._idle.append(session)
+        self._available.release()
+
+    def _send_on(self, session, message, from_addr=None, to_addrs=None):
+        if from_addr is None and 'From' not in message:
+            from_addr = self.settings.username
+        session.smtp.send_message(message, from_addr=from_addr, to_addrs=to_addrs)
+        session.sent += 1
+        self.stats['sent'] += 1
+
+    def send(self, message, from_addr=None, to_addrs=None):
+        """Send one message, retrying once on a fresh session if the pooled one had gone bad"""
+        self.send_many([message], from_addr=from_addr, to_addrs=to_addrs, raise_errors=True)
+
+    def send_many(self, messages, from_addr=None, to_addrs=None, raise_errors=False, before_send=None):
+        """Send messages over as few sessions as possible.
+
+        Returns one error per message (None on success). A session failure
+        reconnects and retries that message once; message-level rejections
+        are recorded and the batch carries on. A failed connect or login
+        ends the batch: the server is down or the credentials are wrong, so
+        that error is returned for every message not yet sent rather than
+        reconnecting once per message. before_send, if given, is called with
+        each message's index just before it goes out; returning False
+        records Skipped for that message instead of sending it.
+        """
+        errors = []
+        session = None
+        try:
+            for index, message in enumerate(messages):
+                if before_send is not None and not before_send(index):
+                    errors.append(Skipped())
+                    continue
+                error = None
+                connect_error = None
+                for attempt in range(2):
+                    try:
+                        if session is not None and session.sent >= self.max_messages:
+                            self.release(session)
+                            session = None
+                        if session is None:
+                            try:
+                                session = self.acquire()
+                            except Exception as e:
+                                connect_error = e
+                                raise
+                        self._send_on(session, message, from_addr, to_addrs)
+                        error = None
+                        break
+                    except Exception as e:
+                        error = e
+                        if connect_error is None and attempt == 0 and is_retryable(e):
+                            if session is not None:
+                                self.release(session, broken=True)
+                                session = None
+                            self.stats['reconnects'] += 1
+                            continue
+                        break
+                if error is not None and raise_errors:
+                    raise error
+                if connect_error is not None:
+                    errors.extend([connect_error] * (len(messages) - index))
+                    break
+                errors.append(error)
+        finally:
+            if session is not None:
+                self.release(session)
+        return errors
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            session.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The process-wide pool, created on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SMTPPool(max_size=int(os.environ.get('SMTP_POOL_SIZE', 4)))
+    return _pool
+
+
+def send_message(message, from_addr=None, to_addrs=None):
+    get_pool().send(message, from_addr=from_addr, to_addrs=to_addrs)
+
+
+def send_messages(messages, from_addr=None, before_send=None):
+    return get_pool().send_many(messages, from_addr=from_addr, before_send=before_send)
+
+
+# ============= BENCHMARK =============
+
+def run_benchmark(messages=200):
+    from email.mime.text import MIMEText
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.handlers import Sink
+
+    controller = Controller(Sink(), hostname='127.0.0.1', port=0)
+    controller.start()
+    try:
+        port = controller.server.sockets[0].getsockname()[1]
+        settings = SmtpSettings('127.0.0.1', port, None, None, False, 10)
+
+        def make(i):
+            msg = MIMEText(f"Benchmark message {i}")
+            msg['From'] = 'bench@localhost'
+            msg['To'] = f"user{i}@localhost"
+            msg['Subject'] = f"Benchmark {i}"
+            return msg
+
+        batch = [make(i) for i in range(messages)]
+
+        started = time.perf_counter()
+        for msg in batch:
+            smtp = smtplib.SMTP(settings.host, settings.port, timeout=settings.timeout)
+            smtp.ehlo()
+            smtp.send_message(msg)
+            smtp.quit()
+        fresh = time.perf_counter() - started
+
+        pool = SMTPPool(settings)
+        started = time.perf_counter()
+        errors = pool.send_many(batch)
+        pooled = time.perf_counter() - started
+        pool.close()
+
+        print(f"{messages} messages to a local sink (no TLS, so real savings are larger)")
+        print(f"  connection per message: {fresh * 1000:8.1f} ms ({messages / fresh:,.0f} msg/s)")
+        print(f"  pooled session:         {pooled * 1000:8.1f} ms ({messages / pooled:,.0f} msg/s), "
+              f"{pool.stats['opened']} connection(s), {sum(e is not None for e in errors)} errors")
+    finally:
+        controller.stop()
+
+
+if __name__ == '__main__':
+    import sys
+
+    run_benchmark(*(int(arg) for arg in sys.argv[1:2]))
@@ -6,5 +6,7 @@ echo "Waiting for database..."
 sleep 5
 
 # Start Celery worker
-echo "Starting Celery worker..."
-exec celery -A celery_app worker --loglevel=INFO --max-tasks-per-child=50 --concurrency=1 --without-gossip --without-mingle --without-heartbeat
\ No newline at end of file
+# Consumes every queue by default; set CELERY_QUEUES=mail_critical to run a dedicated critical-mail worker
+CELERY_QUEUES=${CELERY_QUEUES:-celery,mail_critical,mail_transactional,mail_bulk}
+echo "Starting Celery worker on queues: $CELERY_QUEUES"
+exec celery -A celery_app worker -Q "$CELERY_QUEUES" --loglevel=INFO --max-tasks-per-child=50 --concurrency=1 --without-gossip --without-mingle --without-heartbeat
\ No newline at end of file
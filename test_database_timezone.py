@@ -10,6 +10,7 @@ import sys
 from datetime import datetime, timedelta
 from datetime import time as datetime_time  # Rename to avoid conflict
 import time  # Import time module for sleep if needed
+from reminder_schedule import UTC, fire_spec, next_fire_at
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -280,9 +281,97 @@ WHERE service = 'email' AND is_open = true;
         print("=" * 60)
         print(f"\n{Colors.YELLOW}Note: Review and test these queries before running in production!{Colors.RESET}")
     
+    def test_dst_transitions(self):
+        """Check next-fire computation across DST changes (no database needed)"""
+        print(f"\n{Colors.YELLOW}Testing Reminder Scheduling Across DST{Colors.RESET}")
+
+        # (zone, local time, after (UTC), expected next fire (UTC), description)
+        cases = [
+            ('Asia/Jerusalem', '09:00', datetime(2026, 3, 26, 6, 0), datetime(2026, 3, 26, 7, 0),
+             'Jerusalem winter: 09:00 IST is 07:00 UTC'),
+            ('Asia/Jerusalem', '09:00', datetime(2026, 3, 26, 8, 0), datetime(2026, 3, 27, 6, 0),
+             'Jerusalem DST starts Mar 27: 09:00 IDT is 06:00 UTC'),
+            ('Asia/Jerusalem', '09:00', datetime(2026, 10, 24, 7, 0), datetime(2026, 10, 25, 7, 0),
+             'Jerusalem DST ends Oct 25: back to 07:00 UTC'),
+            ('America/New_York', '09:00', datetime(2026, 3, 7, 15, 0), datetime(2026, 3, 8, 13, 0),
+             'New York DST starts Mar 8: 09:00 EDT is 13:00 UTC'),
+            ('America/New_York', '02:30', datetime(2026, 3, 8, 0, 0), datetime(2026, 3, 8, 7, 30),
+             'Skipped 02:30 fires when it would have been (03:30 EDT)'),
+            ('America/New_York', '01:30', datetime(2026, 11, 1, 4, 0), datetime(2026, 11, 1, 5, 30),
+             'Repeated 01:30 fires at its first occurrence (EDT)'),
+            ('America/New_York', '01:30', datetime(2026, 11, 1, 5, 30), datetime(2026, 11, 2, 6, 30),
+             'Repeated 01:30 does not fire a second time that night'),
+            ('Europe/London', '23:30', datetime(2026, 3, 28, 23, 45), datetime(2026, 3, 29, 22, 30),
+             'London DST starts Mar 29: 23:30 BST is 22:30 UTC'),
+            ('Australia/Sydney', '08:00', datetime(2026, 4, 3, 20, 0), datetime(2026, 4, 3, 21, 0),
+             'Sydney summer: 08:00 AEDT is 21:00 UTC the day before'),
+            ('Australia/Sydney', '08:00', datetime(2026, 4, 3, 21, 0), datetime(2026, 4, 4, 22, 0),
+             'Sydney DST ends Apr 5: 08:00 AEST is 22:00 UTC the day before'),
+        ]
+
+        for zone_name, local_time, after, expected, description in cases:
+            local, zone = fire_spec(zone_name, local_time, None)
+            actual = next_fire_at(local, zone, after)
+            passed = actual == expected
+            self.test_results.append((description, passed))
+            if passed:
+                print(f"{Colors.GREEN}✓ {description}{Colors.RESET}")
+            else:
+                print(f"{Colors.RED}✗ {description}: expected {expected}, got {actual}{Colors.RESET}")
+
+        # A reminder must fire once per local day across a whole DST change, never twice or zero times
+        for zone_name in ('Asia/Jerusalem', 'America/New_York', 'Europe/London', 'Australia/Sydney'):
+            local, zone = fire_spec(zone_name, '09:00', None)
+            fire = datetime(2026, 1, 1)
+            local_days = []
+            while fire < datetime(2027, 1, 1):
+                fire = next_fire_at(local, zone, fire)
+                local_days.append(fire.replace(tzinfo=UTC).astimezone(zone))
+            gaps = {(b.date() - a.date()).days for a, b in zip(local_days, local_days[1:])}
+            wall_clock = {d.strftime('%H:%M') for d in local_days}
+            passed = gaps == {1} and wall_clock == {'09:00'}
+            self.test_results.append((f"{zone_name} fires daily at 09:00 all year", passed))
+            color = Colors.GREEN if passed else Colors.RED
+            print(f"{color}{'✓' if passed else '✗'} {zone_name}: {len(local_days)} fires, "
+                  f"day gaps {sorted(gaps)}, local times {sorted(wall_clock)}{Colors.RESET}")
+
+        # Reminders without a known zone keep their stored UTC time
+        local, zone = fire_spec(None, '09:45', datetime_time(6, 45))
+        passed = next_fire_at(local, zone, datetime(2026, 3, 27, 0, 0)) == datetime(2026, 3, 27, 6, 45)
+        self.test_results.append(('Legacy reminder keeps its UTC time', passed))
+        print(f"{Colors.GREEN if passed else Colors.RED}{'✓' if passed else '✗'} "
+              f"Legacy reminder keeps its UTC time{Colors.RESET}")
+
+    def check_due_reminders(self):
+        """Show what the minute scheduler will pick up next"""
+        print(f"\n{Colors.YELLOW}Checking Reminder Due Index{Colors.RESET}")
+
+        with app.app_context():
+            now = datetime.utcnow()
+            base = Reminder.query.filter(
+                Reminder.reminder_type == 'daily_checkin',
+                Reminder.is_active == True
+            )
+            unscheduled = base.filter(Reminder.next_fire_at == None).count()
+            overdue = base.filter(Reminder.next_fire_at < now - timedelta(minutes=5)).count()
+            zoned = base.filter(Reminder.timezone != None).count()
+            upcoming = base.filter(Reminder.next_fire_at >= now).order_by(Reminder.next_fire_at).limit(5).all()
+
+            print(f"Reminders with an IANA timezone: {zoned}")
+            color = Colors.RED if unscheduled else Colors.GREEN
+            print(f"{color}Unscheduled reminders (next_fire_at NULL): {unscheduled}{Colors.RESET}")
+            color = Colors.RED if overdue else Colors.GREEN
+            print(f"{color}Overdue by more than 5 minutes: {overdue}{Colors.RESET}")
+            for reminder in upcoming:
+                print(f"  - next {reminder.next_fire_at} UTC: {reminder.local_reminder_time} "
+                      f"{reminder.timezone or '(fixed UTC)'}")
+
     def run_all_tests(self):
         """Run all database timezone tests"""
         self.print_header("DATABASE TIMEZONE TESTS")
+
+        # Pure scheduling checks run even without the backend
+        self.test_dst_transitions()
         
         if not BACKEND_AVAILABLE:
             print(f"{Colors.RED}Cannot run database tests - backend not available{Colors.RESET}")
@@ -295,6 +384,7 @@ WHERE service = 'email' AND is_open = true;
         self.test_celery_hour_matching()
         self.test_common_issues()
         self.check_reminder_distribution()
+        self.check_due_reminders()
         self.generate_fix_sql()
 
 if __name__ == "__main__":